@@ -1,6 +1,7 @@
 ﻿from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from .models import User
+from appointments.models import Doctor
 
 
 @admin.register(User)
@@ -49,13 +50,10 @@ class UserAdmin(BaseUserAdmin):
             user.is_active = True
             user.save()
             
-            # Update doctor profile if exists
-            try:
-                if hasattr(user, 'doctor'):
-                    user.doctor.is_available = True
-                    user.doctor.save()
-            except Exception as e:
-                print(f"Error updating doctor profile: {e}")
+            # Make sure the doctor record exists and is bookable
+            doctor = Doctor.ensure_for_user(user)
+            doctor.is_available = True
+            doctor.save(update_fields=['is_available', 'updated_at'])
             
             count += 1
         
@@ -1,25 +1,19 @@
 # Context processor for notifications and messages
-from notifications.models import Notification
-from appointments.models import AppointmentMessage
+from notifications import pubsub, services
 
 def notification_context(request):
     if request.user.is_authenticated:
-        # Unread notifications
-        notifications = Notification.objects.filter(user=request.user, is_read=False)[:5]
-        unread_notifications_count = Notification.objects.filter(user=request.user, is_read=False).count()
-
-        # Unread messages count
-        unread_messages_count = AppointmentMessage.objects.filter(
-            recipient=request.user,
-            is_read=False
-        ).count()
+        # Unread notifications (a queryset, so it only hits the database if a template iterates it)
+        notifications = services.recent_unread(request.user)
 
+        # Badge counts come from the cached per-user counters
         return {
             'recent_notifications': notifications,
-            'unread_notifications_count': unread_notifications_count,
-            'unread_messages_count': unread_messages_count
+            'unread_notifications_count': services.unread_count(request.user),
+            'unread_messages_count': services.unread_message_count(request.user),
+            'live_events': pubsub.live_events_enabled(),
         }
     return {
         'unread_notifications_count': 0,
         'unread_messages_count': 0
-    }
\ No newline at end of file
+    }
@@ -6,8 +6,9 @@ from django.contrib import messages
 from django.db.models import Q
 from .forms import UserRegistrationForm, UserLoginForm, ProfileUpdateForm
 from .models import User
-from appointments.models import Appointment
-from notifications.models import Notification
+from appointments import queries
+from appointments.models import Doctor
+from medicalapp.pagination import paginate_keyset
 
 # Home View
 def home_view(request):
@@ -77,6 +78,8 @@ def login_view(request):
                     login(request, user)
                     messages.success(request, f'Welcome back, {user.get_full_name()}!')
                     if user.role == 'doctor':
+                        # Create the doctor record here so doctor pages never write on GET
+                        Doctor.ensure_for_user(user)
                         return redirect('doctors:dashboard')
                     elif user.role == 'patient':
                         return redirect('patient_dashboard')
@@ -103,18 +106,10 @@ def patient_dashboard(request):
     from datetime import date
     
     # Get upcoming appointments (confirmed or pending, future dates)
-    upcoming_appointments = Appointment.objects.filter(
-        patient=request.user,
-        date__gte=date.today(),
-        status__in=['confirmed', 'pending']
-    ).select_related('doctor', 'doctor__user').order_by('date', 'time')[:5]
+    upcoming_appointments = queries.patient_upcoming(request.user, date.today())[:5]
     
     # Get recent completed appointments (not acknowledged yet)
-    completed_appointments = Appointment.objects.filter(
-        patient=request.user,
-        status='completed',
-        patient_acknowledged=False
-    ).select_related('doctor', 'doctor__user').order_by('-date', '-time')[:5]
+    completed_appointments = queries.patient_unacknowledged(request.user)[:5]
     
     # Calculate BMI if metrics are available
     bmi = request.user.calculate_bmi()
@@ -176,7 +171,6 @@ def admin_dashboard(request):
     
     # Import models
     from appointments.models import Appointment, Doctor
-    from doctors.models import DoctorProfile
     from django.db.models import Count
     from datetime import date, timedelta
     
@@ -186,8 +180,8 @@ def admin_dashboard(request):
     total_patients = User.objects.filter(role='patient').count()
     pending_appointments = Appointment.objects.filter(status='pending').count()
     
-    # Get all doctors with their profiles
-    all_doctors = User.objects.filter(role='doctor', is_approved=True).select_related('doctor', 'doctor_profile')
+    # Get all doctors with their doctor records
+    all_doctors = User.objects.filter(role='doctor', is_approved=True).select_related('doctor')
     
     # Recent Appointments (Real data)
     recent_appointments = Appointment.objects.select_related(
@@ -196,9 +190,7 @@ def admin_dashboard(request):
     
     # Today's Schedule (Real data)
     today = date.today()
-    today_schedule = Appointment.objects.filter(
-        date=today
-    ).select_related('patient', 'doctor', 'doctor__user').order_by('time')
+    today_schedule = queries.day_schedule(today)
     
     # Appointments by Status (Real data)
     appointments_by_status = Appointment.objects.values('status').annotate(
@@ -227,7 +219,7 @@ def admin_create_doctor(request):
         return redirect('home')
     
     from appointments.models import Doctor
-    from doctors.models import DoctorProfile, DoctorSpecialization
+    from doctors.models import DoctorSpecialization
     
     specializations = DoctorSpecialization.objects.filter(is_active=True)
     
@@ -264,21 +256,13 @@ def admin_create_doctor(request):
         
         # Create Doctor instance
         Doctor.objects.create(
-            user=doctor_user,
-            specialization=specialization,
-            license_number=license_number,
-            consultation_fee=consultation_fee,
-            bio='Professional healthcare provider'
-        )
-        
-        # Create DoctorProfile
-        DoctorProfile.objects.create(
             user=doctor_user,
             specialization=specialization,
             license_number=license_number or f'LIC-{doctor_user.id}',
+            consultation_fee=consultation_fee,
+            bio='Professional healthcare provider',
             years_of_experience=0,
             education='To be updated',
-            consultation_fee=consultation_fee,
             is_available=True
         )
         
@@ -299,25 +283,12 @@ def admin_edit_doctor(request, doctor_id):
         return redirect('home')
     
     from appointments.models import Doctor
-    from doctors.models import DoctorProfile, DoctorSpecialization
+    from doctors.models import DoctorSpecialization
     
     specializations = DoctorSpecialization.objects.filter(is_active=True)
     
     doctor_user = get_object_or_404(User, id=doctor_id, role='doctor')
-    doctor, _ = Doctor.objects.get_or_create(user=doctor_user, defaults={
-        'specialization': 'General Practice',
-        'bio': 'Professional healthcare provider',
-        'license_number': f'LIC-{doctor_user.id}',
-        'consultation_fee': 500.00
-    })
-    doctor_profile, _ = DoctorProfile.objects.get_or_create(user=doctor_user, defaults={
-        'specialization': doctor.specialization,
-        'license_number': doctor.license_number,
-        'years_of_experience': 0,
-        'education': 'To be updated',
-        'consultation_fee': doctor.consultation_fee,
-        'is_available': True
-    })
+    doctor = Doctor.ensure_for_user(doctor_user)
     current_specialization = specializations.filter(name=doctor.specialization).first()
     
     if request.method == 'POST':
@@ -336,14 +307,11 @@ def admin_edit_doctor(request, doctor_id):
         doctor.consultation_fee = consultation_fee
         doctor.license_number = request.POST.get('license_number', '')
         doctor.bio = request.POST.get('bio', '')
-        doctor.save()
-        
-        # Sync with DoctorProfile
-        doctor_profile.specialization = doctor.specialization
-        doctor_profile.consultation_fee = doctor.consultation_fee
-        doctor_profile.license_number = doctor.license_number
-        doctor_profile.is_available = request.POST.get('is_available') == 'on'
-        doctor_profile.save()
+        doctor.is_available = request.POST.get('is_available') == 'on'
+        # Only the edited columns: ratings may have changed since the row was loaded
+        doctor.save(update_fields=[
+            'specialization', 'consultation_fee', 'license_number', 'bio', 'is_available', 'updated_at',
+        ])
         
         messages.success(request, 'Doctor details updated successfully.')
         return redirect('admin_dashboard')
@@ -351,7 +319,6 @@ def admin_edit_doctor(request, doctor_id):
     context = {
         'doctor_user': doctor_user,
         'doctor': doctor,
-        'doctor_profile': doctor_profile,
         'title': 'Edit Doctor',
         'specializations': specializations,
         'current_specialization_slug': current_specialization.slug if current_specialization else ''
@@ -395,20 +362,6 @@ def admin_update_account(request):
     
     return render(request, 'pages/admin/update_account.html', {'title': 'Update Account'})
 
-@login_required
-def notification_list(request):
-    """View all notifications for the logged-in user"""
-    notifications = Notification.objects.filter(user=request.user).order_by('-created_at')
-
-    # Mark as read when viewing
-    notifications.filter(is_read=False).update(is_read=True)
-
-    context = {
-        'notifications': notifications,
-        'title': 'Notifications'
-    }
-    return render(request, 'pages/notifications/notification_list.html', context)
-
 
 @login_required
 def admin_appointments_list(request):
@@ -417,20 +370,12 @@ def admin_appointments_list(request):
         messages.error(request, 'Access denied. Admin only.')
         return redirect('home')
 
-    from appointments.models import Appointment
-
-    # Get all appointments
-    appointments = Appointment.objects.all().select_related(
-        'patient', 'doctor', 'doctor__user'
-    ).order_by('-date', '-time')
-
-    # Filter by status if provided
+    # All appointments, filtered by status if provided
     status_filter = request.GET.get('status')
-    if status_filter:
-        appointments = appointments.filter(status=status_filter)
-
+    page = paginate_keyset(request, queries.all_appointments(status=status_filter))
     context = {
-        'appointments': appointments,
+        'appointments': page,
+        'page_obj': page,
         'current_status': status_filter,
         'is_admin': True,
         'title': 'All Appointments'
@@ -0,0 +1,186 @@
+"""Per-doctor, per-day availability bitmaps for "first available" searches.
+
+``DoctorAvailability.free_slots`` caches the output of the slot engine
+(``appointments.slots``) for one doctor and day as an integer bitmap, so
+finding the earliest free slot among many doctors is a scan over a few
+small rows instead of expanding schedules and bookings for each of them.
+
+Rows are written by ``manage.py build_availability`` (run daily, so the
+search window stays covered) and by schedule edits, which rebuild the
+doctor's upcoming rows. Searches only read: a doctor or day without a row
+is computed in memory for that search, so anonymous traffic never writes.
+Signals keep existing rows current: taking a slot clears its bits with a
+single UPDATE and releasing one recomputes just that doctor and day. The
+bitmap is a search index only; bookings are still validated against the
+slot engine.
+"""
+from collections import Counter
+from datetime import datetime, time, timedelta
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Doctor, DoctorAvailability
+from .slots import SLOT_MINUTES, bookings_for, expand_day, weekly_hours_for
+
+# Signed 64-bit column; slots shorter than 23 minutes would not fit a day
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+if SLOTS_PER_DAY >= 64:
+    raise ImproperlyConfigured('APPOINTMENT_SLOT_MINUTES is too short for the availability bitmap')
+
+SEARCH_DAYS = 30
+
+
+def to_bitmap(minutes):
+    bits = 0
+    for minute in minutes:
+        bits |= 1 << (minute // SLOT_MINUTES)
+    return bits
+
+
+def occupied_bits(start):
+    """Bits of every grid slot a booking starting at `start` overlaps"""
+    minute = start.hour * 60 + start.minute
+    first = minute // SLOT_MINUTES
+    last = min((minute + SLOT_MINUTES - 1) // SLOT_MINUTES, SLOTS_PER_DAY - 1)
+    return ((1 << (last - first + 1)) - 1) << first
+
+
+def _compute(doctor_ids, start_date, end_date):
+    """{(doctor_id, date): bitmap} for every doctor and day in the range"""
+    user_ids = dict(Doctor.objects.filter(pk__in=doctor_ids).values_list('pk', 'user_id'))
+    hours = weekly_hours_for(list(user_ids.values()))
+    booked = bookings_for(list(user_ids), start_date, end_date)
+
+    bitmaps = {}
+    for doctor_id, user_id in user_ids.items():
+        weekly = hours[user_id]
+        day = start_date
+        while day <= end_date:
+            free = expand_day(weekly.get(day.weekday(), ()), booked.get((doctor_id, day)))
+            bitmaps[doctor_id, day] = to_bitmap(free)
+            day += timedelta(days=1)
+    return bitmaps
+
+
+def _incomplete(doctor_ids, keys, start_date, end_date):
+    """Doctors missing a row for some day of the range"""
+    days = (end_date - start_date).days + 1
+    rows_per_doctor = Counter(doctor_id for doctor_id, _day in keys)
+    return [doctor_id for doctor_id in doctor_ids if rows_per_doctor[doctor_id] < days]
+
+
+def ensure_bitmaps(doctor_ids, start_date, end_date):
+    """Create the missing rows for these doctors and days"""
+    existing = set(DoctorAvailability.objects.filter(
+        doctor_id__in=doctor_ids, date__range=(start_date, end_date)
+    ).values_list('doctor_id', 'date'))
+
+    missing = _incomplete(doctor_ids, existing, start_date, end_date)
+    if not missing:
+        return
+
+    DoctorAvailability.objects.bulk_create(
+        [
+            DoctorAvailability(doctor_id=doctor_id, date=day, free_slots=bits)
+            for (doctor_id, day), bits in _compute(missing, start_date, end_date).items()
+            if (doctor_id, day) not in existing
+        ],
+        ignore_conflicts=True,
+    )
+
+
+# Incremental maintenance
+
+def slot_taken(doctor_id, day, start):
+    """Clear the bits a new active booking occupies"""
+    DoctorAvailability.objects.filter(doctor_id=doctor_id, date=day).update(
+        free_slots=F('free_slots').bitand(~occupied_bits(start))
+    )
+
+
+def slot_released(doctor_id, day):
+    """Recompute one day after a booking is cancelled, moved or deleted"""
+    if DoctorAvailability.objects.filter(doctor_id=doctor_id, date=day).exists():
+        bits = _compute([doctor_id], day, day).get((doctor_id, day), 0)
+        DoctorAvailability.objects.filter(doctor_id=doctor_id, date=day).update(free_slots=bits)
+
+
+def schedule_changed(user_id):
+    """Rebuild a doctor's rows for the search window from today"""
+    today = timezone.localdate()
+    DoctorAvailability.objects.filter(doctor__user_id=user_id, date__gte=today).delete()
+    doctor_ids = list(Doctor.objects.filter(user_id=user_id).values_list('pk', flat=True))
+    if doctor_ids:
+        ensure_bitmaps(doctor_ids, today, today + timedelta(days=SEARCH_DAYS - 1))
+
+
+def _bitmaps(doctor_ids, start_date, end_date):
+    """{(doctor_id, date): bitmap} from the stored rows, computing (not storing) any that are missing"""
+    bitmaps = {
+        (doctor_id, day): bits
+        for doctor_id, day, bits in DoctorAvailability.objects.filter(
+            doctor_id__in=doctor_ids, date__range=(start_date, end_date)
+        ).values_list('doctor_id', 'date', 'free_slots')
+    }
+    missing = _incomplete(doctor_ids, bitmaps, start_date, end_date)
+    if missing:
+        for key, bits in _compute(missing, start_date, end_date).items():
+            bitmaps.setdefault(key, bits)
+    return bitmaps
+
+
+# Search
+
+def find_first_available(doctors, after=None, days=SEARCH_DAYS, limit=5):
+    """Earliest free slot of each matching doctor, soonest first
+
+    ``doctors`` is a Doctor queryset (already filtered by specialization and
+    availability); ``after`` is a future date or an aware datetime and
+    defaults to now. Returns up to ``limit`` (doctor, date, time) tuples.
+    """
+    now = timezone.localtime()
+    if isinstance(after, datetime):
+        now = max(now, timezone.localtime(after))
+    elif after is not None and after > now.date():
+        now = None
+
+    if now is None:
+        start_date, first_free = after, 0
+    else:
+        # Slots must start after the current minute
+        start_date, first_free = now.date(), now.hour * 60 + now.minute + 1
+    end_date = start_date + timedelta(days=days - 1)
+
+    doctor_ids = list(doctors.values_list('pk', flat=True))
+    if not doctor_ids:
+        return []
+    bitmaps = _bitmaps(doctor_ids, start_date, end_date)
+    rows = sorted((day, doctor_id, bits) for (doctor_id, day), bits in bitmaps.items() if bits)
+
+    # Clears the first day's slots that start before `first_free`
+    first_day_mask = ~((1 << -(-first_free // SLOT_MINUTES)) - 1)
+
+    earliest = {}
+    cutoff = None
+    for day, doctor_id, bits in rows:
+        # Rows come by date, so nothing after the day that filled the list can rank
+        if cutoff is not None and day > cutoff:
+            break
+        if doctor_id in earliest:
+            continue
+        if day == start_date:
+            bits &= first_day_mask
+        if bits:
+            # Lowest set bit is the earliest free slot of the day
+            earliest[doctor_id] = (day, ((bits & -bits).bit_length() - 1) * SLOT_MINUTES)
+            if len(earliest) == limit:
+                cutoff = day
+
+    ranked = sorted(earliest.items(), key=lambda item: (item[1], item[0]))[:limit]
+    doctors_by_id = Doctor.objects.select_related('user').in_bulk([doctor_id for doctor_id, _ in ranked])
+    return [
+        (doctors_by_id[doctor_id], day, time(minute // 60, minute % 60))
+        for doctor_id, (day, minute) in ranked
+    ]
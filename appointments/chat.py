@@ -0,0 +1,206 @@
+"""Live appointment chat over WebSockets.
+
+``medicalapp.asgi`` routes ``/ws/appointments/<id>/chat/`` here. The
+socket is authenticated from the Django session cookie, and the appointment
+must pass the same participant check as the thread view
+(``views._get_appointment_for_user``).
+
+Each appointment has a ``notifications.pubsub`` topic acting as the chat's
+channel layer: in-process by default, Redis when ``NOTIFICATION_BROKER``
+says so. Client frames are JSON objects:
+
+* ``{"type": "message", "message": "..."}`` saves an ``AppointmentMessage``;
+  the post_save signal publishes it to the topic on commit, so messages
+  sent through the HTML form reach open sockets too.
+* ``{"type": "typing"}`` tells the other participant someone is typing.
+* ``{"type": "read", "last_id": N}`` marks messages up to ``N`` read;
+  ``conversations.mark_read()`` tells the sender, as it does for reads
+  through the thread page.
+
+Every event on the topic is forwarded to the socket as
+``{"type": event, ...data}``, with ``mine`` added to messages.
+"""
+import asyncio
+import json
+from functools import wraps
+from importlib import import_module
+from urllib.parse import urlsplit
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.db import close_old_connections
+from django.http import Http404, HttpRequest
+from django.http.cookie import parse_cookie
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.formats import date_format
+
+from notifications import pubsub
+from . import conversations
+
+MESSAGE = 'message'
+TYPING = 'typing'
+READ = 'read'
+
+MESSAGE_MAX_LENGTH = 5000
+
+# Close codes: not logged in or cross-site, and no such appointment for this user
+FORBIDDEN = 4403
+NOT_FOUND = 4404
+
+
+def topic(appointment_id):
+    return f'appointment:{appointment_id}'
+
+
+def message_data(message):
+    """JSON form of a message, shared by the socket and the "since id" endpoint"""
+    return {
+        'id': message.id,
+        'sender_id': message.sender_id,
+        'sender': message.sender.get_full_name(),
+        'message': message.message,
+        'is_read': message.is_read,
+        'created_at': message.created_at.isoformat(),
+        'time': date_format(timezone.localtime(message.created_at), 'M d, h:i A'),
+        'delete_url': reverse('appointments:delete_message', args=[message.id]),
+    }
+
+
+def database(func):
+    """sync_to_async for ORM work, dropping stale connections around it as a request would"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(wrapper)
+
+
+def _headers(scope):
+    return {name.decode('latin-1'): value.decode('latin-1') for name, value in scope.get('headers', [])}
+
+
+def _same_origin(headers):
+    """Browsers always send Origin on WebSockets; refuse other sites' pages"""
+    origin = headers.get('origin')
+    return origin is None or urlsplit(origin).netloc == headers.get('host')
+
+
+@database
+def _authenticate(headers):
+    request = HttpRequest()
+    session_key = parse_cookie(headers.get('cookie', '')).get(settings.SESSION_COOKIE_NAME)
+    request.session = import_module(settings.SESSION_ENGINE).SessionStore(session_key)
+    return get_user(request)
+
+
+@database
+def _get_appointment(appointment_id, user):
+    from .views import _get_appointment_for_user
+    try:
+        return _get_appointment_for_user(appointment_id, user)
+    except Http404:
+        return None
+
+
+@database
+def _save_message(appointment, user, text):
+    from .models import AppointmentMessage
+
+    recipient_id = appointment.doctor.user_id if user.pk == appointment.patient_id else appointment.patient_id
+    AppointmentMessage.objects.create(appointment=appointment, sender=user, recipient_id=recipient_id, message=text)
+
+
+# Broker publishes can be network round trips (Redis); keep them off the event loop
+_send = sync_to_async(pubsub.send, thread_sensitive=False)
+
+
+@database
+def _mark_read(appointment, user, last_id):
+    conversations.mark_read(appointment, user, ids=(0, last_id))
+
+
+class ChatSocket:
+    """One participant's connection to an appointment's chat"""
+
+    def __init__(self, scope, receive, send, appointment_id):
+        self.scope, self.receive, self.send = scope, receive, send
+        self.appointment_id = appointment_id
+        self.user = self.appointment = None
+
+    async def close(self, code=1000):
+        await self.send({'type': 'websocket.close', 'code': code})
+
+    async def send_json(self, data):
+        await self.send({'type': 'websocket.send', 'text': json.dumps(data)})
+
+    async def run(self):
+        if (await self.receive())['type'] != 'websocket.connect':
+            return
+        headers = _headers(self.scope)
+        self.user = await _authenticate(headers)
+        if not self.user.is_authenticated or not _same_origin(headers):
+            return await self.close(FORBIDDEN)
+        self.appointment = await _get_appointment(self.appointment_id, self.user)
+        if self.appointment is None:
+            return await self.close(NOT_FOUND)
+        await self.send({'type': 'websocket.accept'})
+
+        async with pubsub.get_broker().subscribe(topic(self.appointment_id)) as queue:
+            incoming = asyncio.ensure_future(self.receive())
+            outgoing = asyncio.ensure_future(queue.get())
+            try:
+                while True:
+                    done, _pending = await asyncio.wait({incoming, outgoing}, return_when=asyncio.FIRST_COMPLETED)
+                    if outgoing in done:
+                        await self.forward(*outgoing.result())
+                        outgoing = asyncio.ensure_future(queue.get())
+                    if incoming in done:
+                        frame = incoming.result()
+                        if frame['type'] == 'websocket.disconnect':
+                            break
+                        await self.handle(frame.get('text') or '')
+                        incoming = asyncio.ensure_future(self.receive())
+            finally:
+                incoming.cancel()
+                outgoing.cancel()
+
+    async def handle(self, text):
+        try:
+            frame = json.loads(text)
+            kind = frame['type']
+        except (ValueError, TypeError, KeyError):
+            return await self.send_json({'type': 'error', 'error': 'Invalid frame'})
+
+        if kind == MESSAGE:
+            message = str(frame.get('message', '')).strip()
+            if not message or len(message) > MESSAGE_MAX_LENGTH:
+                return await self.send_json({'type': 'error', 'error': 'Please enter a message before sending.'})
+            await _save_message(self.appointment, self.user, message)
+        elif kind == TYPING:
+            await _send(topic(self.appointment_id), TYPING, {
+                'user_id': self.user.pk, 'name': self.user.get_full_name(),
+            })
+        elif kind == READ:
+            try:
+                last_id = int(frame['last_id'])
+            except (KeyError, TypeError, ValueError):
+                return
+            # Publishes the read receipt when anything was unread
+            await _mark_read(self.appointment, self.user, last_id)
+
+    async def forward(self, event, data):
+        if event == MESSAGE:
+            data = {**data, 'mine': data['sender_id'] == self.user.pk}
+        elif data.get('user_id') == self.user.pk:
+            # Our own typing and read events
+            return
+        await self.send_json({'type': event, **data})
+
+
+async def serve(scope, receive, send, appointment_id):
+    await ChatSocket(scope, receive, send, appointment_id).run()
@@ -0,0 +1,143 @@
+"""Conversation summaries behind the messages inbox.
+
+Each appointment with messages has one ``Conversation`` row holding the
+last message, a preview and each participant's unread count, so an inbox
+page is a single indexed query instead of a pass over every message.
+
+``appointments.signals`` keeps the rows current: a new message is applied
+as one ``UPDATE`` that bumps the counts and, unless the summary already
+shows a later message, replaces the last message; deletes and reads,
+which are rarer, recount the thread through ``msg_appointment_created_idx``. Both run in
+the transaction that changed the message. Threads are marked read in
+bulk with ``mark_read()``, which refreshes the summary itself.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, Max, Q, Value, When
+
+from notifications import pubsub, services
+
+PREVIEW_LENGTH = 200
+
+
+def _preview(text):
+    return text if len(text) <= PREVIEW_LENGTH else text[:PREVIEW_LENGTH - 1] + '…'
+
+
+def message_added(message):
+    """Apply a new message to its conversation's summary"""
+    from .models import Conversation
+
+    unread = 0 if message.is_read else 1
+    to_patient = Q(patient_id=message.recipient_id)
+    # A message saved late with an older created_at must not become the last one
+    is_latest = Q(last_message_at__lte=message.created_at)
+
+    def latest(field, value):
+        return Case(
+            When(is_latest, then=Value(value)), default=F(field),
+            output_field=Conversation._meta.get_field(field),
+        )
+
+    updated = Conversation.objects.filter(appointment_id=message.appointment_id).update(
+        last_message=latest('last_message', message.pk),
+        last_sender=latest('last_sender', message.sender_id),
+        last_message_at=latest('last_message_at', message.created_at),
+        preview=latest('preview', _preview(message.message)),
+        message_count=F('message_count') + 1,
+        patient_unread=F('patient_unread') + Case(When(to_patient, then=Value(unread)), default=Value(0)),
+        doctor_unread=F('doctor_unread') + Case(When(to_patient, then=Value(0)), default=Value(unread)),
+    )
+    if not updated:
+        # First message of the thread
+        refresh(message.appointment_id)
+
+
+def newest_messages(appointment_id):
+    """A thread's messages, newest first; its summary shows the first"""
+    from .models import AppointmentMessage
+    return AppointmentMessage.objects.filter(appointment_id=appointment_id).order_by('-created_at', '-id')
+
+
+def refresh(appointment_id):
+    """Recount a conversation's summary from its messages"""
+    from .models import Appointment, AppointmentMessage, Conversation
+
+    thread = AppointmentMessage.objects.filter(appointment_id=appointment_id)
+    last = newest_messages(appointment_id).first()
+    if last is None:
+        Conversation.objects.filter(appointment_id=appointment_id).delete()
+        return
+
+    appointment = Appointment.objects.only('patient_id', 'doctor_id').get(pk=appointment_id)
+    stats = thread.aggregate(
+        total=Count('id'),
+        patient_unread=Count('id', filter=Q(is_read=False, recipient_id=appointment.patient_id)),
+        doctor_unread=Count('id', filter=Q(is_read=False) & ~Q(recipient_id=appointment.patient_id)),
+    )
+    defaults = {
+        'patient_id': appointment.patient_id,
+        'doctor_id': appointment.doctor_id,
+        'last_message': last,
+        'last_sender_id': last.sender_id,
+        'last_message_at': last.created_at,
+        'preview': _preview(last.message),
+        'message_count': stats['total'],
+        'patient_unread': stats['patient_unread'],
+        'doctor_unread': stats['doctor_unread'],
+    }
+    try:
+        with transaction.atomic():
+            Conversation.objects.update_or_create(appointment_id=appointment_id, defaults=defaults)
+    except IntegrityError:
+        # Created concurrently; this recount is at least as fresh
+        Conversation.objects.filter(appointment_id=appointment_id).update(**defaults)
+
+
+def unread_for(appointment, user):
+    """How many messages in a thread are unread by ``user``, from the summary"""
+    from .models import Conversation
+
+    field = 'patient_unread' if user.pk == appointment.patient_id else 'doctor_unread'
+    return Conversation.objects.filter(appointment_id=appointment.pk).values_list(field, flat=True).first() or 0
+
+
+def mark_read(appointment, user, ids=None):
+    """Mark a thread's messages to ``user`` read, only ids in ``(after, upto]`` if given; returns the count
+
+    Open chat sockets are told, so the sender sees a read receipt.
+    """
+    from . import chat
+    from .models import AppointmentMessage
+
+    unread = AppointmentMessage.objects.filter(appointment_id=appointment.pk, recipient=user, is_read=False)
+    if ids is not None:
+        unread = unread.filter(id__gt=ids[0], id__lte=ids[1])
+    with transaction.atomic():
+        last_id = unread.aggregate(last_id=Max('id'))['last_id']
+        marked = unread.update(is_read=True)
+        if marked:
+            refresh(appointment.pk)
+            pubsub.publish(chat.topic(appointment.pk), chat.READ, {'user_id': user.pk, 'last_id': last_id})
+    # Bulk update skips signals, so adjust the badge counter directly
+    services.adjust_unread_messages(user, -marked)
+    return marked
+
+
+def doctor_changed(appointment):
+    from .models import Conversation
+    Conversation.objects.filter(appointment_id=appointment.pk).update(doctor_id=appointment.doctor_id)
+
+
+def inbox(user):
+    """A user's conversations, newest first, with ``unread_count`` for that user"""
+    from .models import Conversation
+
+    if user.role == 'patient':
+        conversations = Conversation.objects.filter(patient=user).annotate(unread_count=F('patient_unread'))
+    elif user.role == 'doctor':
+        conversations = Conversation.objects.filter(doctor__user=user).annotate(unread_count=F('doctor_unread'))
+    else:
+        conversations = Conversation.objects.none()
+    return conversations.select_related(
+        'appointment', 'appointment__patient', 'doctor__user', 'last_sender'
+    ).order_by('-last_message_at', '-id')
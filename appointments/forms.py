@@ -1,7 +1,12 @@
 ﻿# appointments/forms.py
 from django import forms
 from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.utils import timezone
 from .models import Appointment, Doctor, DoctorRating
+from .slots import SLOT_MINUTES, is_slot_available
+
+SLOT_TAKEN_MESSAGE = 'This time slot has just been booked. Please choose another.'
 
 class AppointmentForm(forms.ModelForm):
     class Meta:
@@ -16,6 +21,7 @@ class AppointmentForm(forms.ModelForm):
             'time': forms.TimeInput(attrs={
                 'type': 'time',
                 'class': 'form-control',
+                'step': SLOT_MINUTES * 60,
                 'required': True
             }),
             'reason': forms.Textarea(attrs={
@@ -42,6 +48,36 @@ class AppointmentForm(forms.ModelForm):
         self.fields['doctor'].queryset = Doctor.objects.all()
         self.fields['doctor'].label_from_instance = lambda obj: f"Dr. {obj.user.get_full_name()} - {obj.specialization}"
 
+    def clean(self):
+        cleaned_data = super().clean()
+        doctor = cleaned_data.get('doctor')
+        date = cleaned_data.get('date')
+        time = cleaned_data.get('time')
+
+        if doctor and date and time:
+            if date < timezone.localdate():
+                self.add_error('date', 'Please choose a date in the future.')
+            elif not is_slot_available(doctor, date, time, exclude=self.instance.pk):
+                self.add_error('time', 'This time slot is not available. Please choose another.')
+
+        return cleaned_data
+
+    def claim_slot(self, appointment):
+        """Save the appointment if its slot is still free, else add a form error"""
+        try:
+            with transaction.atomic():
+                # Serialise bookings per doctor where the database supports row locks
+                Doctor.objects.select_for_update().filter(pk=appointment.doctor_id).exists()
+                if is_slot_available(appointment.doctor, appointment.date, appointment.time,
+                                     exclude=appointment.pk):
+                    appointment.save()
+                    return True
+        except IntegrityError:
+            # Lost the race: the partial unique constraint rejected the insert
+            pass
+        self.add_error('time', SLOT_TAKEN_MESSAGE)
+        return False
+
 
 class UserRegistrationForm(forms.ModelForm):
     password = forms.CharField(widget=forms.PasswordInput(attrs={
@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from appointments.availability import SEARCH_DAYS, ensure_bitmaps
+from appointments.models import Doctor, DoctorAvailability
+
+
+class Command(BaseCommand):
+    help = 'Create the missing availability bitmaps for the search window and drop past ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=SEARCH_DAYS, help='Days to cover from today')
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        removed, _ = DoctorAvailability.objects.filter(date__lt=today).delete()
+        doctor_ids = list(Doctor.objects.values_list('pk', flat=True))
+        before = DoctorAvailability.objects.count()
+        if doctor_ids:
+            ensure_bitmaps(doctor_ids, today, today + timedelta(days=options['days'] - 1))
+        created = DoctorAvailability.objects.count() - before
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {created} availability row(s), removed {removed} past row(s).'
+        ))
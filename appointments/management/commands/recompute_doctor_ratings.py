@@ -0,0 +1,49 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Avg, Count, Q
+from appointments.models import Doctor, DoctorRating
+from doctors import caching
+from doctors.middleware import cache_key
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored rating average, count and histogram for every doctor'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctor', type=int, help='Only recompute this doctor id')
+
+    def handle(self, *args, **options):
+        ratings = DoctorRating.objects.all()
+        doctors = Doctor.objects.all()
+        if options['doctor']:
+            ratings = ratings.filter(doctor_id=options['doctor'])
+            doctors = doctors.filter(pk=options['doctor'])
+
+        # One grouped query for every doctor that has ratings
+        stats = {
+            row['doctor']: row
+            for row in ratings.values('doctor').annotate(
+                average=Avg('rating'),
+                total=Count('id'),
+                **{f'stars_{i}': Count('id', filter=Q(rating=i)) for i in range(1, 6)}
+            ).order_by()
+        }
+
+        updated = []
+        for doctor in doctors.only('id', 'user_id'):
+            row = stats.get(doctor.id, {})
+            doctor.average_rating = row.get('average') or 0.0
+            doctor.rating_count = row.get('total', 0)
+            for i in range(1, 6):
+                setattr(doctor, f'rating_{i}_count', row.get(f'stars_{i}', 0))
+            updated.append(doctor)
+
+        with transaction.atomic():
+            Doctor.objects.bulk_update(updated, Doctor.RATING_FIELDS, batch_size=500)
+
+        # bulk_update sends no signals, so drop the cached copies here
+        caching.bump_version()
+        cache.delete_many([cache_key(doctor.user_id) for doctor in updated])
+
+        self.stdout.write(self.style.SUCCESS(f'Recomputed ratings for {len(updated)} doctor(s).'))
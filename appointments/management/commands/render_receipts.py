@@ -0,0 +1,35 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from appointments import receipts
+
+
+class Command(BaseCommand):
+    help = 'Render and cache the PDF receipts for a date range (default: this month so far), e.g. at month end'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat, help='First appointment date, YYYY-MM-DD')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last appointment date, YYYY-MM-DD')
+        parser.add_argument('--workers', type=int, help='Render processes (default: RECEIPT_RENDER_WORKERS)')
+        parser.add_argument('--zip', action='store_true', help='Also write a ZIP for the admin receipt exports page')
+        parser.add_argument('--lock-token', help='Export lock taken for this run by the admin page')
+
+    def handle(self, *args, **options):
+        end = options['end'] or timezone.localdate()
+        start = options['start'] or end.replace(day=1)
+        if end < start:
+            raise CommandError('--end must not be before --start.')
+
+        if options['zip']:
+            try:
+                path, count = receipts.build_export(
+                    start, end, workers=options['workers'], lock_token=options['lock_token']
+                )
+            except receipts.ExportRunning as running:
+                raise CommandError(f'An export is already running ({running}).')
+            self.stdout.write(self.style.SUCCESS(f'Wrote {count} receipt(s) from {start} to {end} to {path}.'))
+            return
+
+        count = sum(1 for _receipt in receipts.render_batch(receipts.for_dates(start, end), workers=options['workers']))
+        self.stdout.write(self.style.SUCCESS(f'{count} receipt(s) from {start} to {end} are cached.'))
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from appointments.reminders import send_due_reminders
+
+
+class Command(BaseCommand):
+    help = 'Send the appointment reminders that are due; run from cron or with --loop'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep running, checking every --interval seconds')
+        parser.add_argument('--interval', type=int, default=60, help='Seconds between checks with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            sent = send_due_reminders()
+            if sent or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f'Sent {sent} reminder(s).'))
+            if not options['loop']:
+                return
+            close_old_connections()
+            time.sleep(options['interval'])
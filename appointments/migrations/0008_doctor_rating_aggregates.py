@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:09
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, Q
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0007_appointment_acknowledged_fields'),
+    ]
+
+    def backfill_rating_aggregates(apps, schema_editor):
+        Doctor = apps.get_model('appointments', 'Doctor')
+        DoctorRating = apps.get_model('appointments', 'DoctorRating')
+        stats = DoctorRating.objects.values('doctor').annotate(
+            average=Avg('rating'),
+            total=Count('id'),
+            **{f'stars_{i}': Count('id', filter=Q(rating=i)) for i in range(1, 6)}
+        ).order_by()
+        for row in stats:
+            Doctor.objects.filter(pk=row['doctor']).update(
+                average_rating=row['average'] or 0.0,
+                rating_count=row['total'],
+                **{f'rating_{i}_count': row[f'stars_{i}'] for i in range(1, 6)}
+            )
+
+    operations = [
+        migrations.AddField(
+            model_name='doctor',
+            name='average_rating',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='doctor',
+            name='rating_1_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='doctor',
+            name='rating_2_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='doctor',
+            name='rating_3_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='doctor',
+            name='rating_4_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='doctor',
+            name='rating_5_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='doctor',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,113 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:16
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0008_doctor_rating_aggregates'),
+        ('doctors', '0004_doctor_search_index'),
+    ]
+
+    def merge_doctor_profiles(apps, schema_editor):
+        """Fold every DoctorProfile into the Doctor row for the same user"""
+        Doctor = apps.get_model('appointments', 'Doctor')
+        DoctorProfile = apps.get_model('doctors', 'DoctorProfile')
+        doctors = {doctor.user_id: doctor for doctor in Doctor.objects.all()}
+        for profile in DoctorProfile.objects.all():
+            doctor = doctors.get(profile.user_id)
+            if doctor is None:
+                Doctor.objects.create(
+                    user_id=profile.user_id,
+                    specialization=profile.specialization,
+                    bio=profile.bio or '',
+                    license_number=profile.license_number,
+                    consultation_fee=profile.consultation_fee,
+                    years_of_experience=profile.years_of_experience,
+                    education=profile.education,
+                    is_available=profile.is_available,
+                    created_at=profile.created_at,
+                )
+                continue
+            # Doctor is the copy the views kept up to date; the profile only
+            # fills in fields Doctor never had or left blank
+            doctor.years_of_experience = profile.years_of_experience
+            doctor.education = profile.education
+            doctor.is_available = profile.is_available
+            doctor.created_at = min(doctor.created_at, profile.created_at)
+            doctor.specialization = doctor.specialization or profile.specialization
+            doctor.bio = doctor.bio or profile.bio or ''
+            doctor.license_number = doctor.license_number or profile.license_number
+            doctor.save()
+
+        # Only doctors with an available profile were listed before the merge;
+        # keep the rest hidden rather than taking the field's default
+        Doctor.objects.exclude(
+            user_id__in=DoctorProfile.objects.values('user_id')
+        ).update(is_available=False)
+
+    def split_doctor_profiles(apps, schema_editor):
+        Doctor = apps.get_model('appointments', 'Doctor')
+        DoctorProfile = apps.get_model('doctors', 'DoctorProfile')
+        used_licenses = set()
+        for doctor in Doctor.objects.all():
+            license_number = doctor.license_number or f'LIC-{doctor.user_id}'
+            if license_number in used_licenses:
+                license_number = f'{license_number}-{doctor.user_id}'
+            used_licenses.add(license_number)
+            DoctorProfile.objects.update_or_create(user_id=doctor.user_id, defaults={
+                'specialization': doctor.specialization,
+                'license_number': license_number,
+                'years_of_experience': doctor.years_of_experience,
+                'education': doctor.education,
+                'consultation_fee': doctor.consultation_fee,
+                'bio': doctor.bio,
+                'is_available': doctor.is_available,
+            })
+
+    operations = [
+        migrations.AddField(
+            model_name='doctor',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='doctor',
+            name='education',
+            field=models.TextField(blank=True, help_text='Educational background'),
+        ),
+        migrations.AddField(
+            model_name='doctor',
+            name='is_available',
+            field=models.BooleanField(default=True, help_text='Currently accepting patients'),
+        ),
+        migrations.AddField(
+            model_name='doctor',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='doctor',
+            name='years_of_experience',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='doctor',
+            name='bio',
+            field=models.TextField(help_text='Professional biography'),
+        ),
+        migrations.AlterField(
+            model_name='doctor',
+            name='license_number',
+            field=models.CharField(help_text='Medical license number', max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='doctor',
+            name='specialization',
+            field=models.CharField(help_text='Medical specialization', max_length=200),
+        ),
+        migrations.RunPython(merge_doctor_profiles, split_doctor_profiles),
+    ]
@@ -0,0 +1,44 @@
+# Every doctor user gets a Doctor record up front, so doctor pages can
+# resolve request.doctor without creating rows on GET requests. Also
+# indexes doctors created by migrations for the directory search.
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0009_merge_doctor_profile'),
+        ('accounts', '0005_user_profile_picture'),
+    ]
+
+    def create_missing_doctors(apps, schema_editor):
+        User = apps.get_model('accounts', 'User')
+        Doctor = apps.get_model('appointments', 'Doctor')
+        missing = User.objects.filter(role='doctor', doctor__isnull=True)
+        Doctor.objects.bulk_create([
+            Doctor(
+                user=user,
+                specialization='General Practice',
+                bio='Professional healthcare provider',
+                license_number=f'LIC-{user.id}',
+                education='To be updated',
+                consultation_fee=500.00,
+                # Doctors without a record were never listed; keep them hidden
+                is_available=False,
+            )
+            for user in missing
+        ])
+
+        # Historical models send no signals, so index new rows directly
+        if schema_editor.connection.vendor == 'sqlite':
+            schema_editor.execute(
+                "INSERT INTO doctors_doctor_search (rowid, name, specialization, bio, education) "
+                "SELECT d.id, u.first_name || ' ' || u.last_name, d.specialization, d.bio, d.education "
+                "FROM appointments_doctor d JOIN accounts_user u ON u.id = d.user_id "
+                "WHERE d.id NOT IN (SELECT rowid FROM doctors_doctor_search)"
+            )
+
+    operations = [
+        migrations.RunPython(create_missing_doctors, migrations.RunPython.noop),
+    ]
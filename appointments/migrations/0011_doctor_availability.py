@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0010_backfill_doctor_records'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorAvailability',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('free_slots', models.BigIntegerField(default=0)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='availability', to='appointments.doctor')),
+            ],
+            options={
+                'verbose_name_plural': 'Doctor availability',
+                'unique_together': {('doctor', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:25
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0011_doctor_availability'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    def cancel_duplicate_bookings(apps, schema_editor):
+        # Double bookings made before the constraint existed: keep the earliest
+        Appointment = apps.get_model('appointments', 'Appointment')
+        active = Appointment.objects.filter(status__in=['pending', 'confirmed'])
+        duplicates = active.values('doctor', 'date', 'time').annotate(
+            first=Min('id'), total=Count('id')
+        ).filter(total__gt=1).order_by()
+        for slot in duplicates:
+            active.filter(
+                doctor=slot['doctor'], date=slot['date'], time=slot['time']
+            ).exclude(pk=slot['first']).update(status='cancelled')
+
+    operations = [
+        migrations.RunPython(cancel_duplicate_bookings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['pending', 'confirmed'])), fields=('doctor', 'date', 'time'), name='unique_active_appointment_slot', violation_error_message='This time slot has just been booked. Please choose another.'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0012_unique_active_appointment_slot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['doctor', 'date', 'time'], name='appt_doctor_date_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['patient', 'status', 'date'], name='appt_patient_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['date', 'time'], name='appt_date_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['status', 'date'], name='appt_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointmentmessage',
+            index=models.Index(condition=models.Q(('is_read', False)), fields=['recipient'], name='msg_recipient_unread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointmentmessage',
+            index=models.Index(fields=['appointment', 'created_at'], name='msg_appointment_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='doctorrating',
+            index=models.Index(fields=['doctor', '-created_at'], name='rating_doctor_created_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:34
+
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0013_hot_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    def schedule_upcoming_reminders(apps, schema_editor):
+        # The first reminder opens at the widest window before the start
+        # (as appointments.reminders.next_due with nothing sent yet)
+        windows = getattr(settings, 'APPOINTMENT_REMINDER_WINDOWS', [24 * 60, 60])
+        if not windows:
+            return
+        lead = timedelta(minutes=max(windows))
+        Appointment = apps.get_model('appointments', 'Appointment')
+        upcoming = Appointment.objects.filter(status='confirmed', date__gte=timezone.localdate())
+        scheduled = []
+        for appointment in upcoming.only('id', 'date', 'time').iterator(chunk_size=500):
+            starts_at = timezone.make_aware(datetime.combine(appointment.date, appointment.time))
+            appointment.reminder_due_at = starts_at - lead
+            scheduled.append(appointment)
+        Appointment.objects.bulk_update(scheduled, ['reminder_due_at'], batch_size=500)
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='reminder_due_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='reminder_sent_window',
+            field=models.PositiveIntegerField(blank=True, editable=False, help_text='Minutes before the appointment of the last reminder sent', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('reminder_due_at__isnull', False)), fields=['reminder_due_at'], name='appt_reminder_due_idx'),
+        ),
+        migrations.RunPython(schedule_upcoming_reminders, migrations.RunPython.noop),
+    ]
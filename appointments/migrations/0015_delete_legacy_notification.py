@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:41
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0014_appointment_reminders'),
+        # Its rows are copied into notifications.Notification first
+        ('notifications', '0005_merge_legacy_notifications'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='Notification',
+        ),
+    ]
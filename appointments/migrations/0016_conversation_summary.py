@@ -0,0 +1,78 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Q, Subquery
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0015_delete_legacy_notification'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    def summarise_existing_threads(apps, schema_editor):
+        AppointmentMessage = apps.get_model('appointments', 'AppointmentMessage')
+        Conversation = apps.get_model('appointments', 'Conversation')
+        to_patient = Q(recipient=F('appointment__patient'))
+        # Same choice of last message as conversations.refresh()
+        last_message = AppointmentMessage.objects.filter(
+            appointment=OuterRef('appointment'),
+        ).order_by('-created_at', '-id').values('id')[:1]
+        threads = AppointmentMessage.objects.values(
+            'appointment', 'appointment__patient', 'appointment__doctor',
+        ).annotate(
+            last_id=Subquery(last_message),
+            total=Count('id'),
+            patient_unread=Count('id', filter=Q(is_read=False) & to_patient),
+            doctor_unread=Count('id', filter=Q(is_read=False) & ~to_patient),
+        ).order_by('appointment')
+
+        def preview(text):
+            # conversations._preview() as of this migration
+            return text if len(text) <= 200 else text[:199] + '…'
+
+        for offset in range(0, threads.count(), 500):
+            batch = list(threads[offset:offset + 500])
+            last = AppointmentMessage.objects.in_bulk([thread['last_id'] for thread in batch])
+            Conversation.objects.bulk_create([
+                Conversation(
+                    appointment_id=thread['appointment'],
+                    patient_id=thread['appointment__patient'],
+                    doctor_id=thread['appointment__doctor'],
+                    last_message_id=thread['last_id'],
+                    last_sender_id=last[thread['last_id']].sender_id,
+                    last_message_at=last[thread['last_id']].created_at,
+                    preview=preview(last[thread['last_id']].message),
+                    message_count=thread['total'],
+                    patient_unread=thread['patient_unread'],
+                    doctor_unread=thread['doctor_unread'],
+                )
+                for thread in batch
+            ])
+
+    operations = [
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_message_at', models.DateTimeField()),
+                ('preview', models.CharField(blank=True, max_length=200)),
+                ('message_count', models.PositiveIntegerField(default=0)),
+                ('patient_unread', models.PositiveIntegerField(default=0)),
+                ('doctor_unread', models.PositiveIntegerField(default=0)),
+                ('appointment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='conversation', to='appointments.appointment')),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversations', to='appointments.doctor')),
+                ('last_message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='appointments.appointmentmessage')),
+                ('last_sender', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='patient_conversations', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-last_message_at'],
+                'indexes': [models.Index(fields=['patient', '-last_message_at'], name='conv_patient_recent_idx'), models.Index(fields=['doctor', '-last_message_at'], name='conv_doctor_recent_idx')],
+            },
+        ),
+        migrations.RunPython(summarise_existing_threads, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0016_conversation_summary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointmentmessage',
+            index=models.Index(fields=['appointment', 'id'], name='msg_appointment_id_idx'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:20
+
+from django.db import migrations
+
+# External-content FTS5 index over appointments_appointmentmessage.message,
+# kept in step by triggers; see appointments.search
+CREATE_INDEX = [
+    """
+    CREATE VIRTUAL TABLE appointments_message_fts USING fts5(
+        message,
+        content='appointments_appointmentmessage',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER appointments_message_fts_insert AFTER INSERT ON appointments_appointmentmessage BEGIN
+        INSERT INTO appointments_message_fts(rowid, message) VALUES (new.id, new.message);
+    END
+    """,
+    """
+    CREATE TRIGGER appointments_message_fts_delete AFTER DELETE ON appointments_appointmentmessage BEGIN
+        INSERT INTO appointments_message_fts(appointments_message_fts, rowid, message)
+        VALUES ('delete', old.id, old.message);
+    END
+    """,
+    """
+    CREATE TRIGGER appointments_message_fts_update AFTER UPDATE OF message ON appointments_appointmentmessage BEGIN
+        INSERT INTO appointments_message_fts(appointments_message_fts, rowid, message)
+        VALUES ('delete', old.id, old.message);
+        INSERT INTO appointments_message_fts(rowid, message) VALUES (new.id, new.message);
+    END
+    """,
+    # Index the messages already there
+    "INSERT INTO appointments_message_fts(appointments_message_fts) VALUES ('rebuild')",
+]
+
+DROP_INDEX = [
+    'DROP TRIGGER IF EXISTS appointments_message_fts_insert',
+    'DROP TRIGGER IF EXISTS appointments_message_fts_delete',
+    'DROP TRIGGER IF EXISTS appointments_message_fts_update',
+    'DROP TABLE IF EXISTS appointments_message_fts',
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0017_message_thread_id_index'),
+    ]
+
+    def run_on_sqlite(statements):
+        def run(apps, schema_editor):
+            # Other databases search without an index
+            if schema_editor.connection.vendor == 'sqlite':
+                for statement in statements:
+                    schema_editor.execute(statement)
+        return run
+
+    operations = [
+        migrations.RunPython(run_on_sqlite(CREATE_INDEX), run_on_sqlite(DROP_INDEX)),
+    ]
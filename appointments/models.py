@@ -1,27 +1,87 @@
-﻿from django.db import models
+﻿from django.db import models, transaction
 from django.conf import settings
 from django.utils import timezone
 
 class Doctor(models.Model):
+    """Canonical doctor record: directory profile, booking data and rating aggregates"""
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
-    specialization = models.CharField(max_length=100)
-    bio = models.TextField()
-    license_number = models.CharField(max_length=50)
+    specialization = models.CharField(max_length=200, help_text='Medical specialization')
+    bio = models.TextField(help_text='Professional biography')
+    license_number = models.CharField(max_length=50, help_text='Medical license number')
     consultation_fee = models.DecimalField(max_digits=10, decimal_places=2)
+    years_of_experience = models.PositiveIntegerField(default=0)
+    education = models.TextField(blank=True, help_text='Educational background')
+    is_available = models.BooleanField(default=True, help_text='Currently accepting patients')
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    # Rating aggregates, kept in sync by appointments.signals
+    average_rating = models.FloatField(default=0.0)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_1_count = models.PositiveIntegerField(default=0)
+    rating_2_count = models.PositiveIntegerField(default=0)
+    rating_3_count = models.PositiveIntegerField(default=0)
+    rating_4_count = models.PositiveIntegerField(default=0)
+    rating_5_count = models.PositiveIntegerField(default=0)
+    
+    RATING_FIELDS = ['average_rating', 'rating_count'] + [f'rating_{i}_count' for i in range(1, 6)]
     
     def __str__(self):
         return f"Dr. {self.user.get_full_name()}"
     
+    @classmethod
+    def ensure_for_user(cls, user):
+        """Get or create the Doctor record for a doctor user with placeholder details"""
+        doctor, _ = cls.objects.get_or_create(
+            user=user,
+            defaults={
+                'specialization': 'General Practice',
+                'bio': 'Professional healthcare provider',
+                'license_number': f'LIC-{user.id}',
+                'education': 'To be updated',
+                'consultation_fee': 500.00
+            }
+        )
+        return doctor
+    
     def get_average_rating(self):
-        """Calculate average rating for this doctor"""
-        ratings = self.ratings.all()
-        if ratings.exists():
-            return round(sum(r.rating for r in ratings) / ratings.count(), 1)
-        return 0.0
+        """Average rating for this doctor, rounded to one decimal"""
+        return round(self.average_rating, 1)
     
     def get_rating_count(self):
         """Get total number of ratings"""
-        return self.ratings.count()
+        return self.rating_count
+    
+    @property
+    def rating_histogram(self):
+        """Number of ratings per star level, highest first"""
+        return {i: getattr(self, f'rating_{i}_count') for i in range(5, 0, -1)}
+    
+    def _recalculate_average(self):
+        histogram = self.rating_histogram
+        total = sum(stars * count for stars, count in histogram.items())
+        self.rating_count = sum(histogram.values())
+        self.average_rating = total / self.rating_count if self.rating_count else 0.0
+    
+    def apply_rating_change(self, removed=None, added=None):
+        """Adjust the stored aggregates for one rating being removed and/or added"""
+        if removed:
+            field = f'rating_{removed}_count'
+            setattr(self, field, max(getattr(self, field) - 1, 0))
+        if added:
+            field = f'rating_{added}_count'
+            setattr(self, field, getattr(self, field) + 1)
+        self._recalculate_average()
+        self.save(update_fields=self.RATING_FIELDS)
+    
+    def refresh_rating_stats(self):
+        """Recompute the stored aggregates from the DoctorRating table"""
+        counts = dict(self.ratings.values_list('rating').annotate(n=models.Count('id')).order_by())
+        for stars in range(1, 6):
+            setattr(self, f'rating_{stars}_count', counts.get(stars, 0))
+        self._recalculate_average()
+        self.save(update_fields=self.RATING_FIELDS)
 
 class Appointment(models.Model):
     STATUS_CHOICES = [
@@ -30,6 +90,8 @@ class Appointment(models.Model):
         ('completed', 'Completed'),
         ('cancelled', 'Cancelled'),
     ]
+    # Appointments in these states occupy their slot
+    ACTIVE_STATUSES = ('pending', 'confirmed')
     
     patient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='appointments')
     doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='appointments')
@@ -41,15 +103,76 @@ class Appointment(models.Model):
     patient_confirmed_completion = models.BooleanField(default=False, help_text="Patient confirmed the appointment was completed")
     patient_acknowledged = models.BooleanField(default=False, help_text="Patient marked completed appointment as done")
     doctor_acknowledged = models.BooleanField(default=False, help_text="Doctor marked completed appointment as done")
+    # Reminder scheduling, maintained by save(); see appointments.reminders
+    reminder_due_at = models.DateTimeField(null=True, blank=True, editable=False)
+    reminder_sent_window = models.PositiveIntegerField(null=True, blank=True, editable=False, help_text="Minutes before the appointment of the last reminder sent")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-date', '-time']
+        indexes = [
+            # Doctor dashboard/appointment list and slot lookups
+            models.Index(fields=['doctor', 'date', 'time'], name='appt_doctor_date_time_idx'),
+            # Patient dashboard, appointment list and completed history
+            models.Index(fields=['patient', 'status', 'date'], name='appt_patient_status_date_idx'),
+            # Admin appointment list and today's schedule
+            models.Index(fields=['date', 'time'], name='appt_date_time_idx'),
+            models.Index(fields=['status', 'date'], name='appt_status_date_idx'),
+            # Reminder scheduler; partial, so it only holds appointments still owed a reminder
+            models.Index(fields=['reminder_due_at'], condition=models.Q(reminder_due_at__isnull=False), name='appt_reminder_due_idx'),
+        ]
+        constraints = [
+            # One active booking per doctor and slot; cancelled/completed rows may repeat
+            models.UniqueConstraint(
+                fields=['doctor', 'date', 'time'],
+                condition=models.Q(status__in=['pending', 'confirmed']),
+                name='unique_active_appointment_slot',
+                violation_error_message='This time slot has just been booked. Please choose another.',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.patient.get_full_name()} - {self.doctor} on {self.date}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded slot so save() can tell a reschedule apart
+        instance._loaded_start = (instance.__dict__.get('date'), instance.__dict__.get('time'))
+        return instance
+
+    def save(self, *args, **kwargs):
+        """Keep the reminder schedule in step with status, date and time"""
+        from .reminders import schedule_reminder
+        loaded = self.__dict__
+        if all(field in loaded for field in ('status', 'date', 'time')):
+            rescheduled = getattr(self, '_loaded_start', (self.date, self.time)) != (self.date, self.time)
+            schedule_reminder(self, rescheduled=rescheduled)
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'reminder_due_at', 'reminder_sent_window'}
+        super().save(*args, **kwargs)
+        self._loaded_start = (self.date, self.time)
+
+class DoctorAvailability(models.Model):
+    """Free slots of one doctor on one day, as a bitmap over the slot grid
+
+    Bit ``i`` is set when the slot starting ``i * APPOINTMENT_SLOT_MINUTES``
+    after midnight is in the doctor's schedule and not booked. Rows are built
+    on demand by ``appointments.availability`` and kept current by signals.
+    """
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='availability')
+    date = models.DateField()
+    free_slots = models.BigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['doctor', 'date']
+        verbose_name_plural = 'Doctor availability'
+
+    def __str__(self):
+        return f"{self.doctor} on {self.date}"
+
 class DoctorRating(models.Model):
     """Rating given by patient to doctor after appointment completion"""
     appointment = models.OneToOneField(Appointment, on_delete=models.CASCADE, related_name='rating')
@@ -62,24 +185,14 @@ class DoctorRating(models.Model):
     class Meta:
         ordering = ['-created_at']
         unique_together = ['appointment', 'patient']
+        indexes = [
+            # Review lists on doctor profiles and the ratings page
+            models.Index(fields=['doctor', '-created_at'], name='rating_doctor_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.patient.get_full_name()} rated {self.doctor} {self.rating}/5"
 
-class Notification(models.Model):
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
-    title = models.CharField(max_length=200)
-    message = models.TextField()
-    is_read = models.BooleanField(default=False)
-    created_at = models.DateTimeField(auto_now_add=True)
-    
-    class Meta:
-        ordering = ['-created_at']
-    
-    def __str__(self):
-        return self.title
-
-
 class AppointmentMessage(models.Model):
     """Simple messaging thread tied to an appointment"""
     appointment = models.ForeignKey(Appointment, on_delete=models.CASCADE, related_name='messages')
@@ -91,6 +204,45 @@ class AppointmentMessage(models.Model):
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # Unread message badge; partial, so it only holds unread rows
+            models.Index(fields=['recipient'], condition=models.Q(is_read=False), name='msg_recipient_unread_idx'),
+            # Conversation threads
+            models.Index(fields=['appointment', 'created_at'], name='msg_appointment_created_idx'),
+            # Thread pages and "since id" polling
+            models.Index(fields=['appointment', 'id'], name='msg_appointment_id_idx'),
+        ]
 
     def __str__(self):
         return f"Message from {self.sender.get_full_name()} about appointment {self.appointment.id}"
+
+    def save(self, *args, **kwargs):
+        # The conversation summary is updated by a post_save signal; keep it in this transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+class Conversation(models.Model):
+    """Inbox summary of an appointment's message thread, kept by appointments.conversations"""
+    appointment = models.OneToOneField(Appointment, on_delete=models.CASCADE, related_name='conversation')
+    # Copied from the appointment so each inbox is one indexed query
+    patient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='patient_conversations')
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='conversations')
+    last_message = models.ForeignKey(AppointmentMessage, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_sender = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_message_at = models.DateTimeField()
+    preview = models.CharField(max_length=200, blank=True)
+    message_count = models.PositiveIntegerField(default=0)
+    patient_unread = models.PositiveIntegerField(default=0)
+    doctor_unread = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-last_message_at']
+        indexes = [
+            # Patient and doctor inboxes
+            models.Index(fields=['patient', '-last_message_at'], name='conv_patient_recent_idx'),
+            models.Index(fields=['doctor', '-last_message_at'], name='conv_doctor_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f"Conversation about appointment {self.appointment_id}"
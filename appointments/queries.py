@@ -0,0 +1,98 @@
+"""Querysets behind the busiest appointment and rating pages.
+
+The views take their lists from these functions, filtered and in page
+order, and ``QueryPlanTests`` checks the query plans of the same
+functions, so a view change that moves a list off its index fails there.
+"""
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import Appointment, DoctorRating
+
+# Page order of appointment lists; also their keyset pagination order
+APPOINTMENT_ORDERING = ['-date', '-time', '-id']
+
+
+def doctor_day(doctor, day):
+    """A doctor's appointments on one day, by time"""
+    return Appointment.objects.filter(doctor=doctor, date=day).select_related('patient').order_by('time')
+
+
+def doctor_pending(doctor):
+    return Appointment.objects.filter(doctor=doctor, status='pending').select_related('patient').order_by('date', 'time')
+
+
+def doctor_upcoming(doctor, today, days=7):
+    """Open appointments after ``today`` and up to ``days`` ahead, soonest first"""
+    return Appointment.objects.filter(
+        doctor=doctor,
+        date__gt=today,
+        date__lte=today + timedelta(days=days),
+        status__in=['pending', 'confirmed'],
+    ).select_related('patient').order_by('date', 'time')
+
+
+def doctor_appointments(doctor, status=None, when=None):
+    """A doctor's appointment list; ``when`` is 'today' or 'upcoming'"""
+    appointments = Appointment.objects.filter(doctor=doctor).select_related('patient')
+    if status:
+        appointments = appointments.filter(status=status)
+    today = timezone.now().date()
+    if when == 'today':
+        appointments = appointments.filter(date=today)
+    elif when == 'upcoming':
+        appointments = appointments.filter(date__gte=today, status__in=['pending', 'confirmed'])
+    return appointments.order_by(*APPOINTMENT_ORDERING)
+
+
+def all_appointments(status=None):
+    """Every appointment, for the admin list"""
+    appointments = Appointment.objects.select_related('patient', 'doctor', 'doctor__user')
+    if status:
+        appointments = appointments.filter(status=status)
+    return appointments.order_by(*APPOINTMENT_ORDERING)
+
+
+def day_schedule(day):
+    """Every appointment on one day, by time"""
+    return Appointment.objects.filter(date=day).select_related('patient', 'doctor', 'doctor__user').order_by('time')
+
+
+def patient_upcoming(patient, today):
+    """Open appointments from ``today`` on, soonest first"""
+    return Appointment.objects.filter(
+        patient=patient, date__gte=today, status__in=['confirmed', 'pending'],
+    ).select_related('doctor', 'doctor__user').order_by('date', 'time')
+
+
+def patient_unacknowledged(patient):
+    """Completed appointments the patient has not acknowledged, latest first"""
+    return Appointment.objects.filter(
+        patient=patient, status='completed', patient_acknowledged=False,
+    ).select_related('doctor', 'doctor__user').order_by('-date', '-time')
+
+
+def patient_appointments(patient, status=None):
+    appointments = Appointment.objects.filter(patient=patient).select_related('doctor', 'doctor__user')
+    if status:
+        appointments = appointments.filter(status=status)
+    return appointments.order_by(*APPOINTMENT_ORDERING)
+
+
+def doctor_ratings(doctor, since=None):
+    """A doctor's ratings, newest first, optionally only those from ``since`` on"""
+    ratings = DoctorRating.objects.filter(doctor=doctor)
+    if since is not None:
+        ratings = ratings.filter(created_at__gte=since)
+    return ratings.order_by('-created_at', '-id')
+
+
+def thread(appointment):
+    """An appointment's messages, newest first"""
+    return appointment.messages.select_related('sender').order_by('-id')
+
+
+def thread_since(appointment, after):
+    """Messages after id ``after``, oldest first"""
+    return appointment.messages.filter(id__gt=after).select_related('sender').order_by('id')
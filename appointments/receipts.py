@@ -0,0 +1,288 @@
+"""PDF receipts, rendered once and served from a disk cache.
+
+A receipt is cached under ``RECEIPT_CACHE_DIR`` as
+``<appointment id>-<version>.pdf``. The version joins the appointment's
+``updated_at`` with a hash of the receipt's text, so edits to the
+appointment, the doctor or the patient render a new file. Older versions
+of the same receipt are removed when a new one is written. The version is
+also the ETag, and the cached file's modification time, which moves on
+with every new version, is the Last-Modified date.
+
+Batch exports (a ZIP of every receipt in a date range) never run in a
+web worker. ``start_export()`` launches ``manage.py render_receipts --zip``
+as a separate process, which renders cache misses in one bounded process
+pool (``RECEIPT_RENDER_WORKERS``) and writes the archive under
+``exports/``; the admin page then serves the finished file. A lock file
+allows one export at a time. Cron can run the same command at month end.
+"""
+import hashlib
+import os
+import re
+import secrets
+import subprocess
+import sys
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from pathlib import Path
+
+from django.conf import settings
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+# Appointments rendered per trip to the process pool
+BATCH_SIZE = 200
+
+
+def cache_dir():
+    return Path(getattr(settings, 'RECEIPT_CACHE_DIR', Path(settings.BASE_DIR) / 'var' / 'receipts'))
+
+
+def queryset():
+    """Appointments with everything a receipt shows, in one query"""
+    from .models import Appointment
+    return Appointment.objects.select_related('patient', 'doctor__user')
+
+
+def lines(appointment):
+    """The receipt's text lines, plain data a worker process can render"""
+    return [
+        f"Appointment ID: {appointment.id}",
+        f"Patient: {appointment.patient.get_full_name()} ({appointment.patient.email})",
+        f"Doctor: Dr. {appointment.doctor.user.get_full_name()} - {appointment.doctor.specialization}",
+        f"Date & Time: {appointment.date.strftime('%B %d, %Y')} at {appointment.time.strftime('%I:%M %p')}",
+        f"Status: {appointment.get_status_display()}",
+        f"Consultation Fee: ₱{appointment.doctor.consultation_fee}",
+        f"Notes: {appointment.notes or 'N/A'}",
+    ]
+
+
+def render(text_lines):
+    """PDF bytes for a receipt; runs in pool workers, so it touches no models"""
+    buffer = BytesIO()
+    p = canvas.Canvas(buffer, pagesize=letter)
+    width, height = letter
+
+    p.setFont("Helvetica-Bold", 16)
+    p.drawString(50, height - 50, "MedLynk Consultation Receipt")
+
+    p.setFont("Helvetica", 12)
+    y = height - 100
+    for line in text_lines:
+        p.drawString(50, y, line)
+        y -= 20
+    y -= 20
+    p.drawString(50, y, "Thank you for choosing MedLynk.")
+
+    p.showPage()
+    p.save()
+    return buffer.getvalue()
+
+
+def version(appointment, text_lines):
+    digest = hashlib.sha256('\n'.join(text_lines).encode()).hexdigest()[:16]
+    return f'{appointment.updated_at.strftime("%Y%m%d%H%M%S%f")}-{digest}'
+
+
+def last_modified(path):
+    """Last-Modified timestamp of a cached receipt, in whole seconds"""
+    return int(path.stat().st_mtime)
+
+
+def filename(appointment):
+    """Name of the receipt when downloaded"""
+    return f"appointment_{appointment.id}_receipt.pdf"
+
+
+def _path(appointment_id, receipt_version):
+    return cache_dir() / f'{appointment_id}-{receipt_version}.pdf'
+
+
+def _store(appointment_id, receipt_version, pdf):
+    """Write a rendered receipt atomically and drop its older versions"""
+    path = _path(appointment_id, receipt_version)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as out:
+        out.write(pdf)
+    os.replace(temp, path)
+    older = [old for old in path.parent.glob(f'{appointment_id}-*.pdf') if old != path]
+    if older:
+        # Last-Modified has one-second precision; keep it ahead of the replaced version's
+        previous = max(last_modified(old) for old in older)
+        if last_modified(path) <= previous:
+            os.utime(path, (previous + 1, previous + 1))
+    for old in older:
+        old.unlink(missing_ok=True)
+    return path
+
+
+def get(appointment):
+    """(path, version) of an appointment's receipt, rendering it if not cached"""
+    text_lines = lines(appointment)
+    receipt_version = version(appointment, text_lines)
+    path = _path(appointment.id, receipt_version)
+    if not path.exists():
+        path = _store(appointment.id, receipt_version, render(text_lines))
+    return path, receipt_version
+
+
+def render_batch(appointments, workers=None):
+    """Yield (appointment, path) for each appointment, rendering cache misses in a process pool"""
+    workers = workers or getattr(settings, 'RECEIPT_RENDER_WORKERS', None)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        batch = []
+        for appointment in appointments.iterator(chunk_size=BATCH_SIZE):
+            batch.append(appointment)
+            if len(batch) == BATCH_SIZE:
+                yield from _render_batch(pool, batch)
+                batch = []
+        yield from _render_batch(pool, batch)
+
+
+def _render_batch(pool, appointments):
+    receipts = []
+    for appointment in appointments:
+        text_lines = lines(appointment)
+        receipts.append((appointment, version(appointment, text_lines), text_lines))
+    missing = [receipt for receipt in receipts if not _path(receipt[0].id, receipt[1]).exists()]
+
+    rendered = pool.map(render, [text_lines for _appointment, _version, text_lines in missing])
+    for (appointment, receipt_version, _lines), pdf in zip(missing, rendered):
+        _store(appointment.id, receipt_version, pdf)
+
+    for appointment, receipt_version, _lines in receipts:
+        yield appointment, _path(appointment.id, receipt_version)
+
+
+def for_dates(start, end):
+    return queryset().filter(date__range=(start, end)).order_by('date', 'time', 'id')
+
+
+# Batch exports
+
+EXPORT_NAME = 'receipts_{start}_{end}.zip'
+EXPORT_PATTERN = r'receipts_\d{4}-\d{2}-\d{2}_\d{4}-\d{2}-\d{2}\.zip'
+
+
+def exports_dir():
+    return cache_dir() / 'exports'
+
+
+def _lock_path():
+    return exports_dir() / 'export.lock'
+
+
+def export_path(start, end):
+    return exports_dir() / EXPORT_NAME.format(start=start, end=end)
+
+
+def find_export(name):
+    """Path of a finished export by file name, or None; never outside the exports directory"""
+    path = exports_dir() / name
+    return path if re.fullmatch(EXPORT_PATTERN, name) and path.exists() else None
+
+
+def finished_exports():
+    """Finished export archives, newest first"""
+    if not exports_dir().exists():
+        return []
+    return sorted(exports_dir().glob('receipts_*.zip'), key=lambda path: path.stat().st_mtime, reverse=True)
+
+
+def _read_lock():
+    """(pid, token, description) from the lock file, or None if there is no live holder"""
+    try:
+        pid, token, description = _lock_path().read_text().split(' ', 2)
+        os.kill(int(pid), 0)
+    except (OSError, ValueError):
+        # No lock, or its process died without removing it
+        return None
+    return int(pid), token, description
+
+
+def running_export():
+    """Description of the export in progress, or None"""
+    lock = _read_lock()
+    return lock and lock[2]
+
+
+class ExportRunning(Exception):
+    pass
+
+
+def _write_lock(pid, token, description):
+    temp = _lock_path().with_suffix(f'.{pid}.tmp')
+    temp.write_text(f'{pid} {token} {description}')
+    os.replace(temp, _lock_path())
+
+
+class export_lock:
+    """Held by the process building an export; raises ExportRunning if another holds it
+
+    ``start_export()`` takes the lock on behalf of the process it launches
+    and passes that process the lock's ``token`` to take it over.
+    """
+
+    def __init__(self, description, token=None):
+        self.description = description
+        self.token = token or secrets.token_hex(8)
+
+    def __enter__(self):
+        exports_dir().mkdir(parents=True, exist_ok=True)
+        lock = _read_lock()
+        if lock is not None and lock[1] == self.token:
+            _write_lock(os.getpid(), self.token, self.description)
+            return self
+        if lock is None:
+            _lock_path().unlink(missing_ok=True)
+        try:
+            fd = os.open(_lock_path(), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            raise ExportRunning(running_export() or 'another export')
+        with os.fdopen(fd, 'w') as lock_file:
+            lock_file.write(f'{os.getpid()} {self.token} {self.description}')
+        return self
+
+    def __exit__(self, *exc_info):
+        _lock_path().unlink(missing_ok=True)
+
+
+def build_export(start, end, workers=None, lock_token=None):
+    """Write the ZIP of receipts for appointments from ``start`` to ``end``; returns (path, count)"""
+    path = export_path(start, end)
+    with export_lock(f'{start} to {end}', token=lock_token):
+        fd, temp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        count = 0
+        # PDFs are already compressed
+        with os.fdopen(fd, 'wb') as out, zipfile.ZipFile(out, 'w', compression=zipfile.ZIP_STORED) as archive:
+            for appointment, receipt in render_batch(for_dates(start, end), workers=workers):
+                archive.write(receipt, filename(appointment))
+                count += 1
+        os.replace(temp, path)
+    return path, count
+
+
+def start_export(start, end):
+    """Build an export in a separate process; False if one is already running"""
+    description = f'{start} to {end}'
+    lock = export_lock(description)
+    try:
+        # Hold the lock until the new process takes it over
+        lock.__enter__()
+    except ExportRunning:
+        return False
+    try:
+        process = subprocess.Popen(
+            [sys.executable, str(Path(settings.BASE_DIR) / 'manage.py'), 'render_receipts',
+             '--start', start.isoformat(), '--end', end.isoformat(), '--zip', '--lock-token', lock.token],
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+    except OSError:
+        _lock_path().unlink(missing_ok=True)
+        raise
+    # Name the new process as holder, so the lock clears if it dies early
+    _write_lock(process.pid, lock.token, description)
+    return True
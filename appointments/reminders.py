@@ -0,0 +1,101 @@
+"""Appointment reminders for patients.
+
+Each confirmed appointment carries ``reminder_due_at``, the moment its next
+reminder window (``APPOINTMENT_REMINDER_WINDOWS``, minutes before the
+start) opens, and ``reminder_sent_window``, the last window already sent.
+``Appointment.save()`` keeps both in step with the status and slot, so a
+tick of ``send_due_reminders()`` is one range query on the partial
+``appt_reminder_due_idx`` index, however many appointments there are.
+
+Reminders are written in the same transaction that advances each
+appointment's schedule, so a crashed or restarted scheduler resends
+nothing and misses nothing. Concurrent schedulers skip each other's rows
+on databases with ``SELECT ... FOR UPDATE SKIP LOCKED``.
+"""
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from notifications import services
+
+
+def windows():
+    """Reminder windows in minutes, largest first"""
+    return sorted(set(getattr(settings, 'APPOINTMENT_REMINDER_WINDOWS', [24 * 60, 60])), reverse=True)
+
+
+def starts_at(appointment):
+    return timezone.make_aware(datetime.combine(appointment.date, appointment.time))
+
+
+def _remaining(sent_window):
+    return [window for window in windows() if sent_window is None or window < sent_window]
+
+
+def next_due(start, sent_window):
+    """When the next unsent window opens, or None once all have been sent"""
+    remaining = _remaining(sent_window)
+    return start - timedelta(minutes=remaining[0]) if remaining else None
+
+
+def current_window(start, sent_window, now):
+    """The narrowest unsent window already open at ``now``, if any"""
+    open_windows = [window for window in _remaining(sent_window) if start - timedelta(minutes=window) <= now]
+    return open_windows[-1] if open_windows else None
+
+
+def schedule_reminder(appointment, rescheduled=False):
+    """Set an appointment's reminder fields from its status and slot"""
+    if appointment.status != 'confirmed':
+        appointment.reminder_due_at = appointment.reminder_sent_window = None
+        return
+    if rescheduled:
+        appointment.reminder_sent_window = None
+    appointment.reminder_due_at = next_due(starts_at(appointment), appointment.reminder_sent_window)
+
+
+def _reminder(appointment, start, now):
+    return services.render(
+        appointment.patient_id, 'appointment_reminder',
+        appointment=appointment, doctor=appointment.doctor, starts_at=start, now=now,
+    )
+
+
+def due(now):
+    """Appointments with a reminder due by ``now``, soonest first"""
+    from .models import Appointment
+    return Appointment.objects.filter(reminder_due_at__lte=now).order_by('reminder_due_at')
+
+
+def send_due_reminders(now=None, batch_size=None):
+    """Send every reminder due by ``now``; returns how many were sent"""
+    from .models import Appointment
+
+    now = now or timezone.now()
+    batch_size = batch_size or services.batch_size()
+    sent = 0
+    while True:
+        with transaction.atomic():
+            appointments = list(
+                due(now).select_related('doctor__user').select_for_update(skip_locked=True)[:batch_size]
+            )
+            if not appointments:
+                return sent
+
+            reminders = []
+            for appointment in appointments:
+                start = starts_at(appointment)
+                if start <= now:
+                    # Too late to remind; stop tracking it
+                    appointment.reminder_due_at = None
+                    continue
+                window = current_window(start, appointment.reminder_sent_window, now)
+                if window is not None:
+                    reminders.append(_reminder(appointment, start, now))
+                    appointment.reminder_sent_window = window
+                appointment.reminder_due_at = next_due(start, appointment.reminder_sent_window)
+
+            sent += services.create_many(reminders)
+            Appointment.objects.bulk_update(appointments, ['reminder_due_at', 'reminder_sent_window'])
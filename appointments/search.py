@@ -0,0 +1,125 @@
+"""Full-text search over the messages a user can see.
+
+On SQLite, message text is indexed in the FTS5 table
+``appointments_message_fts`` (migration 0018). It is an external-content
+index over ``AppointmentMessage``, kept in step by triggers on insert,
+update and delete, so bulk deletes and cascades are covered too. A search
+is a lookup of its terms in that index, ranked by bm25 and joined to the
+appointments the user takes part in, so it grows with the number of
+matches rather than with the number of messages.
+
+SQLite rebuilds a table when some migrations alter it, which drops its
+triggers; such a migration must create them again and ``rebuild()`` the
+index (``MessageSearchTests`` fails while they are missing). Other databases fall back to a ``LIKE`` scan, newest first.
+"""
+import re
+from types import SimpleNamespace
+
+from django.db import connection
+from django.db.models import Q
+from django.urls import reverse
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from medicalapp.pagination import KeysetPaginator
+
+FTS_TABLE = 'appointments_message_fts'
+SEARCH_LIMIT = 50
+MAX_TERMS = 8
+SNIPPET_TOKENS = 16
+
+# Highlight markers: control characters that never survive escaping
+_START, _END = '\x02', '\x03'
+
+
+def terms(text):
+    return re.findall(r'\w+', text.lower())[:MAX_TERMS]
+
+
+def uses_index():
+    return connection.vendor == 'sqlite'
+
+
+def rebuild():
+    """Reindex every message, e.g. after the table has been rebuilt"""
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def _highlight(snippet):
+    return mark_safe(escape(snippet).replace(_START, '<mark>').replace(_END, '</mark>'))
+
+
+def _indexed_query(user, words, limit):
+    """SQL and params selecting (message id, snippet) from the FTS index, best match first"""
+    from .models import Appointment, AppointmentMessage, Doctor
+
+    # Every term as a quoted prefix, so user input is never FTS syntax
+    match = ' '.join(f'"{word}"*' for word in words)
+    sql = f"""
+        SELECT m.id, snippet({FTS_TABLE}, 0, %s, %s, '…', %s)
+        FROM {FTS_TABLE}
+        JOIN {AppointmentMessage._meta.db_table} m ON m.id = {FTS_TABLE}.rowid
+        JOIN {Appointment._meta.db_table} a ON a.id = m.appointment_id
+        WHERE {FTS_TABLE} MATCH %s
+          AND (a.patient_id = %s OR a.doctor_id IN (SELECT id FROM {Doctor._meta.db_table} WHERE user_id = %s))
+        ORDER BY bm25({FTS_TABLE}), m.id DESC
+        LIMIT %s
+    """
+    return sql, [_START, _END, SNIPPET_TOKENS, match, user.pk, user.pk, limit]
+
+
+def _indexed_matches(user, words, limit):
+    with connection.cursor() as cursor:
+        cursor.execute(*_indexed_query(user, words, limit))
+        return cursor.fetchall()
+
+
+def _scanned_matches(user, words, limit):
+    from .models import AppointmentMessage
+
+    messages = AppointmentMessage.objects.filter(Q(appointment__patient=user) | Q(appointment__doctor__user=user))
+    for word in words:
+        messages = messages.filter(message__icontains=word)
+    pattern = re.compile('|'.join(map(re.escape, words)), re.IGNORECASE)
+    return [
+        (pk, pattern.sub(lambda found: _START + found.group(0) + _END, text))
+        for pk, text in messages.order_by('-id').values_list('id', 'message')[:limit]
+    ]
+
+
+def thread_url(message):
+    """Link to the thread page that ends with ``message``, scrolled to it"""
+    from .models import AppointmentMessage
+
+    # The thread pages by '-id'; a cursor just past the message starts a page with it
+    cursor = KeysetPaginator(AppointmentMessage.objects.all(), ['-id']).encode_cursor(
+        SimpleNamespace(id=message.id + 1)
+    )
+    url = reverse('appointments:appointment_messages', args=[message.appointment_id])
+    return f'{url}?cursor={cursor}#message-{message.id}'
+
+
+def search(user, text, limit=SEARCH_LIMIT):
+    """Messages in ``user``'s conversations matching ``text``, best first
+
+    Each has ``snippet`` (safe HTML with matches in ``<mark>``) and ``url``.
+    """
+    from .models import AppointmentMessage
+
+    words = terms(text)
+    if not words or user.role not in ('patient', 'doctor'):
+        return []
+    matches = (_indexed_matches if uses_index() else _scanned_matches)(user, words, limit)
+
+    found = AppointmentMessage.objects.select_related(
+        'sender', 'appointment__patient', 'appointment__doctor__user'
+    ).in_bulk([pk for pk, _snippet in matches])
+    results = []
+    for pk, snippet in matches:
+        message = found.get(pk)
+        if message is not None:
+            message.snippet = _highlight(snippet)
+            message.url = thread_url(message)
+            results.append(message)
+    return results
@@ -0,0 +1,130 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from doctors.models import DoctorSchedule
+from notifications import pubsub
+from . import availability, chat, conversations
+from .models import Appointment, AppointmentMessage, Doctor, DoctorRating
+from .slots import ACTIVE_STATUSES
+
+
+def _update_doctor(doctor_id, removed=None, added=None):
+    """Apply a rating change to the doctor's stored aggregates under a row lock"""
+    with transaction.atomic():
+        doctor = Doctor.objects.select_for_update().filter(pk=doctor_id).first()
+        if doctor:
+            doctor.apply_rating_change(removed=removed, added=added)
+
+
+def _refresh_doctor(doctor_id):
+    """Fall back to a full recount when the previous rating is unknown"""
+    with transaction.atomic():
+        doctor = Doctor.objects.select_for_update().filter(pk=doctor_id).first()
+        if doctor:
+            doctor.refresh_rating_stats()
+
+
+@receiver(post_init, sender=DoctorRating)
+def remember_original_rating(sender, instance, **kwargs):
+    """Keep the loaded doctor/rating so edits can be applied as a delta"""
+    loaded = instance.__dict__
+    if instance.pk and 'doctor_id' in loaded and 'rating' in loaded:
+        instance._original_rating = (loaded['doctor_id'], loaded['rating'])
+    else:
+        # New instance, or loaded with only()/defer() - nothing to diff against
+        instance._original_rating = None
+
+
+@receiver(post_save, sender=DoctorRating)
+def rating_saved(sender, instance, created, **kwargs):
+    current = (instance.doctor_id, instance.rating)
+    original = instance._original_rating
+
+    if created:
+        _update_doctor(instance.doctor_id, added=instance.rating)
+    elif original is None:
+        _refresh_doctor(instance.doctor_id)
+    elif original != current:
+        old_doctor_id, old_rating = original
+        if old_doctor_id == instance.doctor_id:
+            _update_doctor(instance.doctor_id, removed=old_rating, added=instance.rating)
+        else:
+            _update_doctor(old_doctor_id, removed=old_rating)
+            _update_doctor(instance.doctor_id, added=instance.rating)
+
+    instance._original_rating = current
+
+
+@receiver(post_delete, sender=DoctorRating)
+def rating_deleted(sender, instance, **kwargs):
+    if instance._original_rating:
+        doctor_id, rating = instance._original_rating
+        _update_doctor(doctor_id, removed=rating)
+    elif 'doctor_id' in instance.__dict__:
+        _refresh_doctor(instance.doctor_id)
+
+
+# Availability bitmaps
+
+def _booking(loaded):
+    """(doctor_id, date, time) of an active booking, or None"""
+    if loaded.get('status') in ACTIVE_STATUSES:
+        return loaded['doctor_id'], loaded['date'], loaded['time']
+    return None
+
+
+@receiver(post_init, sender=Appointment)
+def remember_original_booking(sender, instance, **kwargs):
+    loaded = instance.__dict__
+    fields = ('doctor_id', 'date', 'time', 'status')
+    if instance.pk and all(field in loaded for field in fields):
+        instance._original_booking = _booking(loaded)
+    else:
+        instance._original_booking = None if not instance.pk else False
+
+
+@receiver(post_save, sender=Appointment)
+def booking_saved(sender, instance, created, **kwargs):
+    original = None if created else instance._original_booking
+    current = _booking(instance.__dict__)
+
+    if original is False:
+        # Loaded with only()/defer(); the old slot is unknown
+        if current:
+            availability.slot_released(instance.doctor_id, instance.date)
+    elif original != current:
+        if original:
+            availability.slot_released(original[0], original[1])
+        if current:
+            availability.slot_taken(*current)
+        if original and original[0] != instance.doctor_id:
+            conversations.doctor_changed(instance)
+
+    instance._original_booking = current
+
+
+@receiver(post_delete, sender=Appointment)
+def booking_deleted(sender, instance, **kwargs):
+    if instance._original_booking or instance._original_booking is False:
+        availability.slot_released(instance.doctor_id, instance.date)
+
+
+@receiver([post_save, post_delete], sender=DoctorSchedule)
+def schedule_changed(sender, instance, **kwargs):
+    availability.schedule_changed(instance.doctor_id)
+
+
+# Conversation summaries
+
+@receiver(post_save, sender=AppointmentMessage)
+def message_saved(sender, instance, created, **kwargs):
+    if created:
+        conversations.message_added(instance)
+        pubsub.publish(chat.topic(instance.appointment_id), chat.MESSAGE, chat.message_data(instance))
+    else:
+        conversations.refresh(instance.appointment_id)
+
+
+@receiver(post_delete, sender=AppointmentMessage)
+def message_deleted(sender, instance, **kwargs):
+    conversations.refresh(instance.appointment_id)
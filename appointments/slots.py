@@ -0,0 +1,164 @@
+"""Bookable appointment slots computed from a doctor's weekly schedule.
+
+A doctor's ``DoctorSchedule`` rows describe recurring working hours per
+weekday. ``get_available_slots`` expands them into fixed-length slots over
+a date range and removes every slot that overlaps an active booking.
+Bookings for each day are kept in ``BookedIntervals``, a sorted list of
+disjoint intervals, so each candidate slot is checked with one bisect.
+
+Everything is computed from two queries (schedule rows and bookings in
+the range); the rest is arithmetic on minutes since midnight.
+"""
+from bisect import bisect_left, bisect_right
+from datetime import time, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from doctors.models import DoctorSchedule
+
+from .models import Appointment
+
+SLOT_MINUTES = getattr(settings, 'APPOINTMENT_SLOT_MINUTES', 30)
+
+ACTIVE_STATUSES = Appointment.ACTIVE_STATUSES
+
+# Weekday index (date.weekday()) for each DoctorSchedule.day_of_week value
+WEEKDAYS = {day: index for index, (day, _label) in enumerate(DoctorSchedule.DAYS_OF_WEEK)}
+
+# Hours offered for doctors that have not set up a schedule yet; these are
+# the times the booking form used to list for every doctor.
+DEFAULT_HOURS = ((time(9, 0), time(12, 0)), (time(14, 0), time(17, 0)))
+
+MAX_DAYS = 62
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def _as_time(minutes):
+    return time(minutes // 60, minutes % 60)
+
+
+class BookedIntervals:
+    """Disjoint busy intervals for one day, sorted by start (in minutes)"""
+
+    def __init__(self, intervals=()):
+        self.starts = []
+        self.ends = []
+        for start, end in sorted(intervals):
+            self.add(start, end)
+
+    def add(self, start, end):
+        """Insert [start, end), merging it with any interval it touches"""
+        lo = bisect_left(self.ends, start)
+        hi = bisect_right(self.starts, end)
+        if lo < hi:
+            start = min(start, self.starts[lo])
+            end = max(end, self.ends[hi - 1])
+        self.starts[lo:hi] = [start]
+        self.ends[lo:hi] = [end]
+
+    def overlaps(self, start, end):
+        """True if [start, end) intersects a busy interval"""
+        # Only the last interval starting before `end` can reach past `start`
+        index = bisect_left(self.starts, end) - 1
+        return index >= 0 and self.ends[index] > start
+
+    def __len__(self):
+        return len(self.starts)
+
+
+def weekly_hours_for(user_ids):
+    """{user_id: {weekday: [(start_minute, end_minute), ...]}} for doctor users"""
+    rows = DoctorSchedule.objects.filter(
+        doctor_id__in=user_ids, is_active=True
+    ).values_list('doctor_id', 'day_of_week', 'start_time', 'end_time')
+
+    hours = {user_id: {} for user_id in user_ids}
+    for user_id, day, start, end in rows:
+        hours[user_id].setdefault(WEEKDAYS[day], []).append((_minutes(start), _minutes(end)))
+
+    default = [(_minutes(start), _minutes(end)) for start, end in DEFAULT_HOURS]
+    for user_id, weekly in hours.items():
+        if not weekly:
+            hours[user_id] = {weekday: default for weekday in range(7)}
+    return hours
+
+
+def get_weekly_hours(doctor):
+    """{weekday: [(start_minute, end_minute), ...]} for a Doctor"""
+    return weekly_hours_for([doctor.user_id])[doctor.user_id]
+
+
+def active_bookings(doctor_ids, start_date, end_date, exclude=None):
+    """(doctor_id, date, time) rows of active appointments, in no particular order"""
+    appointments = Appointment.objects.filter(
+        doctor_id__in=doctor_ids,
+        date__range=(start_date, end_date),
+        status__in=ACTIVE_STATUSES,
+    )
+    if exclude is not None:
+        appointments = appointments.exclude(pk=exclude)
+    return appointments.values_list('doctor_id', 'date', 'time').order_by()
+
+
+def bookings_for(doctor_ids, start_date, end_date, exclude=None):
+    """{(doctor_id, date): BookedIntervals} of active appointments"""
+    booked = {}
+    for doctor_id, day, start in active_bookings(doctor_ids, start_date, end_date, exclude=exclude):
+        minute = _minutes(start)
+        booked.setdefault((doctor_id, day), BookedIntervals()).add(minute, minute + SLOT_MINUTES)
+    return booked
+
+
+def get_bookings(doctor, start_date, end_date, exclude=None):
+    """{date: BookedIntervals} of active appointments between two dates"""
+    booked = bookings_for([doctor.pk], start_date, end_date, exclude=exclude)
+    return {day: intervals for (_doctor_id, day), intervals in booked.items()}
+
+
+def expand_day(blocks, booked=None, not_before=None):
+    """Free slot start minutes for one day's schedule blocks
+
+    Slots sit on a fixed grid from midnight, so a block starting off the
+    grid begins at its next slot boundary.
+    """
+    slots = set()
+    for block_start, block_end in blocks:
+        minute = -(-block_start // SLOT_MINUTES) * SLOT_MINUTES
+        while minute + SLOT_MINUTES <= block_end:
+            if not_before is None or minute >= not_before:
+                if booked is None or not booked.overlaps(minute, minute + SLOT_MINUTES):
+                    slots.add(minute)
+            minute += SLOT_MINUTES
+    return sorted(slots)
+
+
+def get_available_slots(doctor, start_date, days=14, exclude=None, now=None):
+    """Map each date in the range to the list of free slot times"""
+    days = max(1, min(days, MAX_DAYS))
+    end_date = start_date + timedelta(days=days - 1)
+    now = timezone.localtime(now)
+
+    hours = get_weekly_hours(doctor)
+    booked = get_bookings(doctor, start_date, end_date, exclude=exclude)
+
+    slots = {}
+    for offset in range(days):
+        day = start_date + timedelta(days=offset)
+        if day < now.date():
+            continue
+        not_before = _minutes(now) + 1 if day == now.date() else None
+        free = expand_day(hours.get(day.weekday(), ()), booked.get(day), not_before)
+        if free:
+            slots[day] = [_as_time(minute) for minute in free]
+    return slots
+
+
+def is_slot_available(doctor, day, start, exclude=None, now=None):
+    """True if `start` on `day` is one of the doctor's free slots"""
+    start = time(start.hour, start.minute)
+    return start in get_available_slots(doctor, day, days=1, exclude=exclude, now=now).get(day, ())
+
@@ -1,3 +1,702 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import zipfile
+from datetime import time, timedelta
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from accounts.models import User
+from medicalapp.testing import QueryPlanMixin
+from notifications import counters, pubsub
+from notifications.models import Notification
+from .forms import AppointmentForm
+from . import chat, conversations, queries, receipts, reminders, search, slots
+from doctors import caching
+from doctors.middleware import cache_key
+from doctors.models import DoctorSchedule
+from .models import Appointment, AppointmentMessage, Conversation, Doctor, DoctorAvailability, DoctorRating
+from .reminders import send_due_reminders, starts_at
+
+
+class BookingTestMixin:
+
+    def make_doctor(self):
+        user = User.objects.create_user(
+            email='doctor@example.com', first_name='Ada', last_name='Lovelace', role='doctor'
+        )
+        User.objects.filter(pk=user.pk).update(is_approved=True, is_active=True)
+        return Doctor.objects.create(
+            user=user, specialization='Cardiology', license_number='LIC-1', consultation_fee=500
+        )
+
+    def make_patient(self, number):
+        return User.objects.create_user(
+            email=f'patient{number}@example.com', first_name='Patient', last_name=str(number), role='patient'
+        )
+
+    def booking_form(self, day, slot='09:00'):
+        return AppointmentForm(data={
+            'doctor': self.doctor.pk,
+            'date': day.isoformat(),
+            'time': slot,
+            'reason': 'Check-up',
+        })
+
+    def book(self, form, patient):
+        """Run the booking view's save path; True if the slot was claimed"""
+        if not form.is_valid():
+            return False
+        appointment = form.save(commit=False)
+        appointment.patient = patient
+        appointment.status = 'pending'
+        return form.claim_slot(appointment)
+
+
+class ConcurrentBookingTests(BookingTestMixin, TransactionTestCase):
+    """Hundreds of patients racing for one slot: exactly one booking wins"""
+
+    attempts = 200
+
+    def setUp(self):
+        self.doctor = self.make_doctor()
+        self.patients = [self.make_patient(i) for i in range(self.attempts)]
+        self.day = timezone.localdate() + timedelta(days=1)
+
+    def _attempt(self, patient, barrier, results):
+        try:
+            form = self.booking_form(self.day)
+            barrier.wait()
+            results.append((self.book(form, patient), form.errors.get('time')))
+        except Exception as exc:
+            results.append((None, exc))
+        finally:
+            connection.close()
+
+    def test_only_one_concurrent_booking_wins(self):
+        barrier = threading.Barrier(self.attempts)
+        results = []
+        threads = [
+            threading.Thread(target=self._attempt, args=(patient, barrier, results))
+            for patient in self.patients
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([outcome for booked, outcome in results if booked is None], [])
+        self.assertEqual(len(results), self.attempts)
+        self.assertEqual(sum(1 for booked, _errors in results if booked), 1)
+        # Every loser got a form error rather than an exception
+        self.assertTrue(all(errors for booked, errors in results if not booked))
+        self.assertEqual(
+            Appointment.objects.filter(
+                doctor=self.doctor, date=self.day, time=time(9, 0),
+                status__in=Appointment.ACTIVE_STATUSES,
+            ).count(),
+            1,
+        )
+
+
+class SlotConstraintTests(BookingTestMixin, TransactionTestCase):
+
+    def setUp(self):
+        self.doctor = self.make_doctor()
+        self.first, self.second = self.make_patient(1), self.make_patient(2)
+        self.day = timezone.localdate() + timedelta(days=1)
+
+    def test_constraint_violation_becomes_form_error(self):
+        Appointment.objects.create(
+            patient=self.first, doctor=self.doctor, date=self.day, time=time(9, 0), reason='x'
+        )
+        form = self.booking_form(self.day)
+        # Skip the availability checks so only the database constraint can stop the insert
+        with mock.patch('appointments.forms.is_slot_available', return_value=True):
+            self.assertFalse(self.book(form, self.second))
+        self.assertIn('time', form.errors)
+        self.assertEqual(Appointment.objects.count(), 1)
+
+    def test_cancelled_booking_frees_the_slot(self):
+        first = Appointment.objects.create(
+            patient=self.first, doctor=self.doctor, date=self.day, time=time(9, 0), reason='x'
+        )
+        self.assertFalse(self.book(self.booking_form(self.day), self.second))
+
+        first.status = 'cancelled'
+        first.save()
+        self.assertTrue(self.book(self.booking_form(self.day), self.second))
+
+    def test_rescheduling_keeps_own_slot(self):
+        appointment = Appointment.objects.create(
+            patient=self.first, doctor=self.doctor, date=self.day, time=time(9, 0), reason='x'
+        )
+        form = AppointmentForm(instance=appointment, data={
+            'doctor': self.doctor.pk, 'date': self.day.isoformat(), 'time': '09:00', 'reason': 'Updated',
+        })
+        self.assertTrue(form.is_valid())
+        self.assertTrue(form.claim_slot(form.save(commit=False)))
+
+
+# Reminders are sent at simulated times, so keep them from merging in real time
+@override_settings(APPOINTMENT_REMINDER_WINDOWS=[24 * 60, 60], NOTIFICATION_COALESCE_MINUTES=0)
+class ReminderTests(BookingTestMixin, TestCase):
+
+    def setUp(self):
+        self.doctor = self.make_doctor()
+        self.patient = self.make_patient(1)
+        self.appointment = Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, date=timezone.localdate() + timedelta(days=3),
+            time=time(9, 0), reason='x', status='confirmed',
+        )
+        self.start = starts_at(self.appointment)
+
+    def reminders(self):
+        return Notification.objects.filter(user=self.patient, notification_type='appointment_reminder')
+
+    def test_each_window_is_sent_once(self):
+        self.assertEqual(send_due_reminders(now=self.start - timedelta(days=2)), 0)
+        self.assertEqual(send_due_reminders(now=self.start - timedelta(hours=23)), 1)
+        # A restarted scheduler finds nothing left to send for that window
+        self.assertEqual(send_due_reminders(now=self.start - timedelta(hours=22)), 0)
+        self.assertEqual(send_due_reminders(now=self.start - timedelta(minutes=30)), 1)
+        self.assertEqual(send_due_reminders(now=self.start - timedelta(minutes=10)), 0)
+        self.assertEqual(self.reminders().count(), 2)
+        self.appointment.refresh_from_db()
+        self.assertIsNone(self.appointment.reminder_due_at)
+
+    def test_late_scheduler_sends_only_the_narrowest_window(self):
+        self.assertEqual(send_due_reminders(now=self.start - timedelta(minutes=30)), 1)
+        self.assertEqual(send_due_reminders(now=self.start - timedelta(minutes=10)), 0)
+
+    def test_only_confirmed_appointments_are_reminded(self):
+        self.appointment.status = 'cancelled'
+        self.appointment.save(update_fields=['status'])
+        self.assertEqual(send_due_reminders(now=self.start - timedelta(hours=1)), 0)
+        self.assertFalse(self.reminders().exists())
+
+    def test_rescheduling_resets_reminders(self):
+        send_due_reminders(now=self.start - timedelta(hours=23))
+        self.appointment.date += timedelta(days=7)
+        self.appointment.save()
+        self.assertEqual(self.appointment.reminder_due_at, starts_at(self.appointment) - timedelta(days=1))
+        self.assertEqual(send_due_reminders(now=starts_at(self.appointment) - timedelta(hours=23)), 1)
+
+
+class ConversationTests(BookingTestMixin, TestCase):
+
+    def setUp(self):
+        self.doctor = self.make_doctor()
+        self.patient = self.make_patient(1)
+        self.appointment = Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, date=timezone.localdate(), time=time(9, 0), reason='x'
+        )
+
+    def send(self, sender, recipient, text):
+        return AppointmentMessage.objects.create(
+            appointment=self.appointment, sender=sender, recipient=recipient, message=text
+        )
+
+    def summary(self):
+        return Conversation.objects.get(appointment=self.appointment)
+
+    def test_summary_follows_inserts_reads_and_deletes(self):
+        self.send(self.patient, self.doctor.user, 'Hello doctor')
+        self.send(self.patient, self.doctor.user, 'Are you there?')
+        reply = self.send(self.doctor.user, self.patient, 'Yes')
+
+        summary = self.summary()
+        self.assertEqual((summary.last_message, summary.preview, summary.message_count), (reply, 'Yes', 3))
+        self.assertEqual((summary.patient_unread, summary.doctor_unread), (1, 2))
+
+        self.client.force_login(self.doctor.user)
+        self.client.get(f'/appointments/{self.appointment.pk}/messages/')
+        self.assertEqual((self.summary().patient_unread, self.summary().doctor_unread), (1, 0))
+
+        reply.delete()
+        summary = self.summary()
+        self.assertEqual((summary.preview, summary.message_count, summary.patient_unread), ('Are you there?', 2, 0))
+
+        self.appointment.messages.all().delete()
+        self.assertFalse(Conversation.objects.exists())
+
+    def test_late_message_does_not_replace_newer_last_message(self):
+        latest = self.send(self.patient, self.doctor.user, 'Newer')
+        with mock.patch('django.utils.timezone.now', return_value=latest.created_at - timedelta(minutes=1)):
+            self.send(self.doctor.user, self.patient, 'Older, saved late')
+
+        summary = self.summary()
+        self.assertEqual((summary.last_message, summary.preview, summary.message_count), (latest, 'Newer', 2))
+        self.assertEqual(summary.patient_unread, 1)
+
+    def test_since_returns_newer_messages_and_marks_them_read(self):
+        first = self.send(self.patient, self.doctor.user, 'First')
+        second = self.send(self.patient, self.doctor.user, 'Second')
+        self.client.force_login(self.doctor.user)
+
+        response = self.client.get(f'/appointments/{self.appointment.pk}/messages/since/', {'after': first.pk})
+        data = response.json()
+        self.assertEqual([message['message'] for message in data['messages']], ['Second'])
+        self.assertEqual(data['last_id'], second.pk)
+        self.assertEqual(list(self.appointment.messages.filter(is_read=False)), [first])
+        self.assertEqual(self.summary().doctor_unread, 1)
+
+        # Nothing new: no writes
+        with self.assertNumQueries(4):
+            data = self.client.get(
+                f'/appointments/{self.appointment.pk}/messages/since/', {'after': second.pk}
+            ).json()
+        self.assertEqual(data['messages'], [])
+
+    def test_since_requires_a_participant(self):
+        self.client.force_login(self.make_patient(2))
+        response = self.client.get(f'/appointments/{self.appointment.pk}/messages/since/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_inbox_is_one_query(self):
+        for i in range(5):
+            appointment = Appointment.objects.create(
+                patient=self.patient, doctor=self.doctor, date=timezone.localdate(), time=time(10 + i, 0), reason='x'
+            )
+            AppointmentMessage.objects.create(
+                appointment=appointment, sender=self.doctor.user, recipient=self.patient, message=f'Message {i}'
+            )
+        with self.assertNumQueries(1):
+            inbox = list(conversations.inbox(self.patient))
+        self.assertEqual([conversation.preview for conversation in inbox][:2], ['Message 4', 'Message 3'])
+        self.assertEqual(inbox[0].unread_count, 1)
+
+
+class MessageSearchTests(BookingTestMixin, TestCase):
+
+    def setUp(self):
+        self.doctor = self.make_doctor()
+        self.patient = self.make_patient(1)
+        self.other_patient = self.make_patient(2)
+        self.appointment = Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, date=timezone.localdate(), time=time(9, 0), reason='x'
+        )
+        self.other_appointment = Appointment.objects.create(
+            patient=self.other_patient, doctor=self.doctor, date=timezone.localdate(), time=time(10, 0), reason='x'
+        )
+
+    def send(self, appointment, text):
+        return AppointmentMessage.objects.create(
+            appointment=appointment, sender=appointment.patient, recipient=self.doctor.user, message=text
+        )
+
+    def test_index_triggers_survive_migrations(self):
+        """A later migration that rebuilds the message table must recreate the triggers"""
+        if not search.uses_index():
+            self.skipTest('The message index is SQLite only')
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT type, name FROM sqlite_master WHERE tbl_name IN (%s, %s)",
+                [search.FTS_TABLE, AppointmentMessage._meta.db_table],
+            )
+            objects = set(cursor.fetchall())
+        self.assertIn(('table', search.FTS_TABLE), objects)
+        for event in ('insert', 'delete', 'update'):
+            self.assertIn(('trigger', f'{search.FTS_TABLE}_{event}'), objects)
+
+    def test_results_are_ranked_highlighted_and_scoped(self):
+        once = self.send(self.appointment, 'My blood pressure was fine this morning')
+        twice = self.send(self.appointment, 'Pressure again: the <b>pressure</b> is high')
+        self.send(self.appointment, 'Unrelated')
+        self.send(self.other_appointment, 'Pressure is someone else\'s business')
+
+        results = search.search(self.patient, 'PRESSURE')
+        self.assertEqual(results, [twice, once])
+        self.assertIn('<mark>pressure</mark>', results[0].snippet)
+        self.assertIn('&lt;b&gt;', results[0].snippet)
+        self.assertTrue(results[0].url.endswith(f'#message-{twice.pk}'))
+
+        # The doctor sees both patients' threads; prefixes match
+        self.assertEqual(len(search.search(self.doctor.user, 'press')), 3)
+        self.assertEqual(search.search(self.patient, '"*) OR'), [])
+
+    def test_index_follows_edits_and_deletes(self):
+        message = self.send(self.appointment, 'Bring the referral letter')
+        message.message = 'Bring the prescription'
+        message.save()
+        self.assertEqual(search.search(self.patient, 'referral'), [])
+        self.assertEqual(search.search(self.patient, 'prescription'), [message])
+
+        self.appointment.delete()
+        self.assertEqual(search.search(self.patient, 'prescription'), [])
+
+    def test_result_link_opens_the_page_holding_the_message(self):
+        first = self.send(self.appointment, 'Needle in the haystack')
+        for i in range(40):
+            self.send(self.appointment, f'Filler {i}')
+        self.client.force_login(self.patient)
+
+        result = self.client.get('/appointments/messages/search/', {'q': 'needle'}).context['results'][0]
+        response = self.client.get(result.url)
+        self.assertEqual(response.context['messages_thread'][-1], first)
+        self.assertContains(response, f'id="message-{first.pk}"')
+
+
+class ChatSocketTests(BookingTestMixin, TransactionTestCase):
+    """Drives chat.serve with in-memory ASGI receive/send queues"""
+
+    def setUp(self):
+        self.doctor = self.make_doctor()
+        self.patient = self.make_patient(1)
+        self.appointment = Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, date=timezone.localdate(), time=time(9, 0), reason='x'
+        )
+        broker = mock.patch('notifications.pubsub.get_broker', return_value=pubsub.LocalBroker())
+        broker.start()
+        self.addCleanup(broker.stop)
+
+    def cookie(self, user):
+        client = Client()
+        client.force_login(user)
+        return f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+
+    async def connect(self, cookie, appointment_id=None, origin='http://testserver'):
+        """Open a socket; returns (incoming, outgoing, task)"""
+        incoming, outgoing = asyncio.Queue(), asyncio.Queue()
+        headers = [(b'host', b'testserver'), (b'origin', origin.encode()), (b'cookie', cookie.encode())]
+        scope = {'type': 'websocket', 'path': '', 'headers': headers}
+        task = asyncio.create_task(
+            chat.serve(scope, incoming.get, outgoing.put, appointment_id or self.appointment.pk)
+        )
+        incoming.put_nowait({'type': 'websocket.connect'})
+        return incoming, outgoing, task
+
+    async def next_frame(self, outgoing):
+        message = await asyncio.wait_for(outgoing.get(), 5)
+        return json.loads(message['text']) if message['type'] == 'websocket.send' else message
+
+    def test_messages_typing_and_reads_reach_the_other_participant(self):
+        patient_cookie, doctor_cookie = self.cookie(self.patient), self.cookie(self.doctor.user)
+
+        async def scenario():
+            patient_in, patient_out, patient_task = await self.connect(patient_cookie)
+            doctor_in, doctor_out, doctor_task = await self.connect(doctor_cookie)
+            self.assertEqual(await self.next_frame(patient_out), {'type': 'websocket.accept'})
+            self.assertEqual(await self.next_frame(doctor_out), {'type': 'websocket.accept'})
+
+            patient_in.put_nowait({'type': 'websocket.receive', 'text': json.dumps({'type': 'typing'})})
+            typing = await self.next_frame(doctor_out)
+            self.assertEqual((typing['type'], typing['name']), ('typing', 'Patient 1'))
+
+            patient_in.put_nowait({
+                'type': 'websocket.receive', 'text': json.dumps({'type': 'message', 'message': ' Hello '}),
+            })
+            sent, received = await self.next_frame(patient_out), await self.next_frame(doctor_out)
+            self.assertEqual((sent['message'], sent['mine']), ('Hello', True))
+            self.assertEqual((received['id'], received['mine']), (sent['id'], False))
+
+            doctor_in.put_nowait({
+                'type': 'websocket.receive', 'text': json.dumps({'type': 'read', 'last_id': received['id']}),
+            })
+            self.assertEqual(await self.next_frame(patient_out), {
+                'type': 'read', 'user_id': self.doctor.user.pk, 'last_id': received['id'],
+            })
+
+            for socket in (patient_in, doctor_in):
+                socket.put_nowait({'type': 'websocket.disconnect', 'code': 1000})
+            await asyncio.wait_for(asyncio.gather(patient_task, doctor_task), 5)
+            # The patient's own typing and read events were not echoed back
+            self.assertTrue(patient_out.empty())
+
+        asyncio.run(scenario())
+        message = AppointmentMessage.objects.get()
+        self.assertEqual((message.sender, message.recipient, message.is_read), (self.patient, self.doctor.user, True))
+        self.assertEqual(Conversation.objects.get().doctor_unread, 0)
+
+    def test_form_posts_reach_open_sockets(self):
+        doctor_cookie = self.cookie(self.doctor.user)
+        self.client.force_login(self.patient)
+        url = f'/appointments/{self.appointment.pk}/messages/'
+
+        async def scenario():
+            doctor_in, doctor_out, task = await self.connect(doctor_cookie)
+            await self.next_frame(doctor_out)
+            await sync_to_async(self.client.post)(url, {'message': 'From the form'})
+            frame = await self.next_frame(doctor_out)
+            doctor_in.put_nowait({'type': 'websocket.disconnect', 'code': 1000})
+            await asyncio.wait_for(task, 5)
+            return frame
+
+        frame = asyncio.run(scenario())
+        self.assertEqual((frame['type'], frame['message'], frame['mine']), ('message', 'From the form', False))
+
+    def test_rejects_outsiders(self):
+        outsider_cookie, patient_cookie = self.cookie(self.make_patient(2)), self.cookie(self.patient)
+
+        async def close_code(cookie, **kwargs):
+            _incoming, outgoing, task = await self.connect(cookie, **kwargs)
+            await asyncio.wait_for(task, 5)
+            return (await self.next_frame(outgoing))['code']
+
+        self.assertEqual(asyncio.run(close_code('')), chat.FORBIDDEN)
+        self.assertEqual(asyncio.run(close_code(patient_cookie, origin='https://elsewhere.example')), chat.FORBIDDEN)
+        self.assertEqual(asyncio.run(close_code(outsider_cookie)), chat.NOT_FOUND)
+        self.assertEqual(asyncio.run(close_code(patient_cookie, appointment_id=self.appointment.pk + 1)), chat.NOT_FOUND)
+
+
+class ReceiptTests(BookingTestMixin, TestCase):
+
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        self.cache_dir = Path(cache_dir.name)
+        cache_setting = override_settings(RECEIPT_CACHE_DIR=self.cache_dir, RECEIPT_RENDER_WORKERS=2)
+        cache_setting.enable()
+        self.addCleanup(cache_setting.disable)
+
+        self.doctor = self.make_doctor()
+        self.patient = self.make_patient(1)
+        self.today = timezone.localdate()
+        self.appointment = Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, date=self.today, time=time(9, 0), reason='x'
+        )
+        self.url = f'/appointments/{self.appointment.pk}/receipt/'
+
+    def test_receipt_is_cached_and_revalidated(self):
+        self.client.force_login(self.patient)
+        response = self.client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+        etag, cached = response['ETag'], list(self.cache_dir.glob('*.pdf'))
+        self.assertEqual(len(cached), 1)
+
+        # Session, user and one query for the appointment with its patient and doctor
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url, headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(self.url, headers={'if-modified-since': response['Last-Modified']})
+        self.assertEqual(response.status_code, 304)
+
+        self.appointment.notes = 'Follow up in two weeks'
+        self.appointment.save()
+        response = self.client.get(self.url, headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertNotIn(cached[0], list(self.cache_dir.glob('*.pdf')))
+
+    def test_name_change_is_modified_since(self):
+        self.client.force_login(self.patient)
+        modified = self.client.get(self.url)['Last-Modified']
+
+        User.objects.filter(pk=self.patient.pk).update(last_name='Renamed')
+        response = self.client.get(self.url, headers={'if-modified-since': modified})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['Last-Modified'], modified)
+
+    def test_receipt_requires_a_participant(self):
+        self.client.force_login(self.make_patient(2))
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_admin_export_is_built_in_the_background(self):
+        later = Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, date=self.today + timedelta(days=1), time=time(9, 0), reason='x'
+        )
+        Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, date=self.today + timedelta(days=5), time=time(9, 0), reason='x'
+        )
+        receipts.get(self.appointment)
+        admin = User.objects.create_user(email='admin@example.com', first_name='Ad', last_name='Min', role='admin')
+        self.client.force_login(admin)
+        dates = {'start': self.today.isoformat(), 'end': (self.today + timedelta(days=1)).isoformat()}
+
+        # The view only launches the command, holding the lock for it
+        with mock.patch('appointments.receipts.subprocess.Popen') as popen:
+            popen.return_value.pid = os.getpid()
+            response = self.client.post('/appointments/receipts/', dates)
+        self.assertEqual(response.status_code, 302)
+        self.assertIsNotNone(receipts.running_export())
+        command = popen.call_args.args[0]
+        self.assertEqual(command[2:8], ['render_receipts', '--start', dates['start'], '--end', dates['end'], '--zip'])
+
+        # ...which runs in its own process, as here
+        call_command(*command[2:], stdout=StringIO())
+        name = f"receipts_{dates['start']}_{dates['end']}.zip"
+        self.assertContains(self.client.get('/appointments/receipts/'), name)
+
+        response = self.client.get(f'/appointments/receipts/{name}/')
+        archive = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(archive.namelist(), [receipts.filename(self.appointment), receipts.filename(later)])
+        self.assertTrue(archive.read(receipts.filename(later)).startswith(b'%PDF'))
+        self.assertEqual(len(list(self.cache_dir.glob('*.pdf'))), 2)
+        self.assertEqual(self.client.get('/appointments/receipts/..%2Fdb.zip/').status_code, 404)
+
+        self.client.force_login(self.patient)
+        self.assertEqual(self.client.get(f'/appointments/receipts/{name}/').status_code, 302)
+
+    def test_one_export_at_a_time(self):
+        admin = User.objects.create_user(email='admin@example.com', first_name='Ad', last_name='Min', role='admin')
+        self.client.force_login(admin)
+        with receipts.export_lock('the last month'):
+            with mock.patch('appointments.receipts.subprocess.Popen') as popen:
+                self.client.post('/appointments/receipts/', {'start': self.today, 'end': self.today})
+            popen.assert_not_called()
+            with self.assertRaises(CommandError):
+                call_command('render_receipts', '--zip', stdout=StringIO())
+            self.assertContains(self.client.get('/appointments/receipts/'), 'the last month')
+        self.assertIsNone(receipts.running_export())
+
+
+class DoctorRatingTests(BookingTestMixin, TestCase):
+
+    def test_admin_approval_keeps_concurrent_ratings(self):
+        doctor = self.make_doctor()
+        User.objects.filter(pk=doctor.user_id).update(is_approved=False)
+        stale = Doctor.objects.get(pk=doctor.pk)
+        # A rating lands after the approval loaded the row
+        Doctor.objects.filter(pk=doctor.pk).update(average_rating=4.0, rating_count=1, rating_4_count=1)
+
+        admin = User.objects.create_superuser(email='admin@example.com', password='x', role='admin')
+        self.client.force_login(admin)
+        with mock.patch.object(Doctor, 'ensure_for_user', return_value=stale):
+            self.client.post('/admin/accounts/user/', {
+                'action': 'approve_doctors', '_selected_action': [doctor.user_id],
+            })
+
+        doctor.refresh_from_db()
+        self.assertTrue(doctor.user.is_approved)
+        self.assertEqual((doctor.average_rating, doctor.rating_count, doctor.rating_4_count), (4.0, 1, 1))
+
+    def test_rating_filter_matches_the_shown_rating(self):
+        doctor = self.make_doctor()
+        Doctor.objects.filter(pk=doctor.pk).update(average_rating=3.96, rating_count=25)
+
+        for query in ('min_rating=4', 'rating=high', 'min_rating=nan', 'min_rating=inf'):
+            response = self.client.get(f'/doctors/?{query}')
+            self.assertContains(response, 'Lovelace', msg_prefix=query)
+        self.assertNotContains(self.client.get('/doctors/?min_rating=4.1'), 'Lovelace')
+
+    def test_recompute_drops_cached_doctors(self):
+        doctor = self.make_doctor()
+        version = caching.get_version()
+        cache.set(cache_key(doctor.user_id), doctor)
+
+        call_command('recompute_doctor_ratings', stdout=StringIO())
+
+        self.assertNotEqual(caching.get_version(), version)
+        self.assertIsNone(cache.get(cache_key(doctor.user_id)))
+
+
+class AvailabilityTests(BookingTestMixin, TestCase):
+
+    def setUp(self):
+        self.doctor = self.make_doctor()
+        self.day = timezone.localdate() + timedelta(days=1)
+        DoctorSchedule.objects.create(
+            doctor=self.doctor.user, day_of_week=self.day.strftime('%A').lower(),
+            start_time=time(9, 0), end_time=time(12, 0),
+        )
+
+    def test_schedule_edit_builds_rows(self):
+        self.assertTrue(DoctorAvailability.objects.filter(doctor=self.doctor, date=self.day).exists())
+
+    def test_search_does_not_write(self):
+        DoctorAvailability.objects.all().delete()
+        response = self.client.get('/doctors/first-available/')
+        first = response.json()['results'][0]
+        self.assertEqual((first['doctor'], first['date'], first['time']), (self.doctor.pk, self.day.isoformat(), '09:00'))
+        self.assertFalse(DoctorAvailability.objects.exists())
+
+        call_command('build_availability', stdout=StringIO())
+        self.assertTrue(DoctorAvailability.objects.filter(doctor=self.doctor, date=self.day).exists())
+
+
+class QueryPlanTests(BookingTestMixin, QueryPlanMixin, TestCase):
+    """The hot appointment, message and rating queries stay on their indexes
+
+    Each test runs the function the view takes its queryset from, sliced
+    like the view's first page.
+    """
+
+    def setUp(self):
+        self.doctor = self.make_doctor()
+        self.patient = self.make_patient(1)
+        self.today = timezone.localdate()
+
+    # doctors.views
+
+    def test_doctor_dashboard(self):
+        self.assertUsesIndex(queries.doctor_day(self.doctor, self.today), 'appt_doctor_date_time_idx')
+        self.assertUsesIndex(queries.doctor_pending(self.doctor), 'appt_doctor_date_time_idx')
+        self.assertUsesIndex(queries.doctor_upcoming(self.doctor, self.today)[:6], 'appt_doctor_date_time_idx')
+
+    def test_doctor_appointment_list(self):
+        for when in (None, 'today', 'upcoming'):
+            self.assertUsesIndex(
+                queries.doctor_appointments(self.doctor, when=when)[:21], 'appt_doctor_date_time_idx'
+            )
+
+    def test_doctor_ratings(self):
+        since = timezone.now() - timedelta(days=30)
+        for ratings in (queries.doctor_ratings(self.doctor), queries.doctor_ratings(self.doctor, since=since)):
+            self.assertUsesIndex(ratings[:11], 'rating_doctor_created_idx')
+
+    # appointments.views and appointments.slots
+
+    def test_slot_bookings(self):
+        self.assertUsesIndex(
+            slots.active_bookings([self.doctor.pk], self.today, self.today + timedelta(days=13)),
+            'appt_doctor_date_time_idx',
+        )
+
+    def test_patient_appointment_list(self):
+        self.assertNoFullScan(queries.patient_appointments(self.patient)[:21])
+        self.assertUsesIndex(
+            queries.patient_appointments(self.patient, status='completed')[:21], 'appt_patient_status_date_idx'
+        )
+
+    def test_due_reminders(self):
+        self.assertUsesIndex(reminders.due(timezone.now())[:500], 'appt_reminder_due_idx')
+
+    def test_message_thread(self):
+        appointment = Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, date=self.today, time=time(9, 0), reason='x'
+        )
+        self.assertUsesIndex(conversations.newest_messages(appointment.pk)[:1], 'msg_appointment_created_idx')
+        self.assertUsesIndex(queries.thread(appointment)[:31], 'msg_appointment_id_idx')
+        self.assertUsesIndex(queries.thread_since(appointment, 1)[:100], 'msg_appointment_id_idx')
+
+    def test_messages_inbox(self):
+        self.assertUsesIndex(conversations.inbox(self.patient)[:21], 'conv_patient_recent_idx')
+        self.assertNoFullScan(conversations.inbox(self.doctor.user)[:21])
+
+    def test_message_search(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Query plan assertions are written against SQLite')
+        with connection.cursor() as cursor:
+            sql, params = search._indexed_query(self.patient, ['pressure'], search.SEARCH_LIMIT)
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = '\n'.join(str(row[-1]) for row in cursor.fetchall())
+        self.assertIn(f'SCAN {search.FTS_TABLE} VIRTUAL TABLE INDEX', plan)
+        self.assertNotRegex(plan, r'SCAN (m|a)\b(?! USING)')
+
+    # accounts.views and accounts.context_processors
+
+    def test_patient_dashboard(self):
+        self.assertUsesIndex(queries.patient_upcoming(self.patient, self.today)[:5], 'appt_patient_status_date_idx')
+        self.assertUsesIndex(queries.patient_unacknowledged(self.patient)[:5], 'appt_patient_status_date_idx')
+
+    def test_admin_dashboard_and_list(self):
+        self.assertUsesIndex(queries.day_schedule(self.today), 'appt_date_time_idx')
+        self.assertUsesIndex(queries.all_appointments()[:21], 'appt_date_time_idx')
+        self.assertUsesIndex(queries.all_appointments(status='pending')[:21], 'appt_status_date_idx')
+
+    def test_unread_message_count(self):
+        self.assertUsesIndex(
+            counters.unread(counters.MESSAGES, self.patient.pk).order_by(), 'msg_recipient_unread_idx'
+        )
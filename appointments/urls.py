@@ -6,6 +6,7 @@ app_name = 'appointments'
 urlpatterns = [
     path('', views.appointment_list, name='appointment_list'),
     path('create/', views.appointment_create, name='appointment_create'),
+    path('slots/<int:doctor_id>/', views.appointment_slots, name='appointment_slots'),
     path('<int:pk>/', views.appointment_detail, name='appointment_detail'),
     path('<int:pk>/edit/', views.appointment_edit, name='appointment_edit'),
     path('<int:pk>/delete/', views.appointment_delete, name='appointment_delete'),
@@ -13,9 +14,13 @@ urlpatterns = [
     path('<int:pk>/acknowledge/', views.acknowledge_appointment, name='acknowledge_appointment'),
     path('<int:pk>/rate/', views.rate_appointment, name='rate_appointment'),
     path('<int:pk>/messages/', views.appointment_messages, name='appointment_messages'),
+    path('<int:pk>/messages/since/', views.appointment_messages_since, name='appointment_messages_since'),
     path('messages/inbox/', views.messages_inbox, name='messages_inbox'),
+    path('messages/search/', views.messages_search, name='messages_search'),
     path('messages/<int:message_id>/delete/', views.delete_message, name='delete_message'),
     path('messages/conversation/<int:appointment_id>/delete/', views.delete_conversation, name='delete_conversation'),
     path('history/completed/', views.completed_history, name='completed_history'),
     path('<int:pk>/receipt/', views.download_receipt, name='download_receipt'),
+    path('receipts/', views.receipt_exports, name='receipt_exports'),
+    path('receipts/<str:name>/', views.download_receipt_export, name='download_receipt_export'),
 ]
\ No newline at end of file
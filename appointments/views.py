@@ -1,21 +1,31 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import FileResponse, Http404
-from io import BytesIO
-from datetime import datetime
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
+from django.http import FileResponse, Http404, JsonResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from datetime import datetime, date
 from .models import Appointment, Doctor, DoctorRating, AppointmentMessage
 from .forms import AppointmentForm, RatingForm
+from medicalapp.pagination import paginate_keyset
+from notifications.services import notify
+from . import chat, conversations, queries, receipts, search
+from .slots import SLOT_MINUTES, get_available_slots
 
+# Messages shown per thread page, and returned per "since id" poll
+MESSAGE_PAGE_SIZE = 30
+MESSAGE_POLL_LIMIT = 100
 
-def _get_appointment_for_user(pk, user):
+
+def _get_appointment_for_user(pk, user, queryset=None):
     """Helper to fetch appointment ensuring user is participant"""
-    appointment = get_object_or_404(Appointment, pk=pk)
-    if user.role == 'patient' and appointment.patient != user:
+    if queryset is None:
+        queryset = Appointment.objects.select_related('doctor')
+    appointment = get_object_or_404(queryset, pk=pk)
+    if user.role == 'patient' and appointment.patient_id != user.pk:
         raise Http404("Appointment not found")
-    if user.role == 'doctor' and appointment.doctor.user != user:
+    if user.role == 'doctor' and appointment.doctor.user_id != user.pk:
         raise Http404("Appointment not found")
     if user.role not in ['patient', 'doctor']:
         raise Http404("Appointment not available")
@@ -25,15 +35,12 @@ def _get_appointment_for_user(pk, user):
 @login_required
 def appointment_list(request):
     """View all appointments for the logged-in patient"""
-    appointments = Appointment.objects.filter(patient=request.user).order_by('-date', '-time')
-    
     # Filter by status if provided
     status_filter = request.GET.get('status')
-    if status_filter:
-        appointments = appointments.filter(status=status_filter)
-    
+    page = paginate_keyset(request, queries.patient_appointments(request.user, status=status_filter))
     context = {
-        'appointments': appointments,
+        'appointments': page,
+        'page_obj': page,
         'current_status': status_filter,
         'title': 'My Appointments'
     }
@@ -54,12 +61,11 @@ def appointment_create(request):
             appointment = form.save(commit=False)
             appointment.patient = request.user
             appointment.status = 'pending'
-            appointment.save()
-            
-            messages.success(request, 'Appointment booked successfully! We will confirm shortly.')
-            return redirect('appointments:appointment_list')
-        else:
-            messages.error(request, 'Please correct the errors below.')
+            if form.claim_slot(appointment):
+                notify('appointment_requested', [appointment.doctor.user_id], appointment=appointment)
+                messages.success(request, 'Appointment booked successfully! We will confirm shortly.')
+                return redirect('appointments:appointment_list')
+        messages.error(request, 'Please correct the errors below.')
     else:
         form = AppointmentForm()
         # Pre-select doctor if provided in URL
@@ -69,6 +75,10 @@ def appointment_create(request):
                 form.initial['doctor'] = doctor_id
             except:
                 pass
+        # Pre-fill a slot picked from the "first available" search
+        for field in ('date', 'time'):
+            if request.GET.get(field):
+                form.initial[field] = request.GET[field]
     
     doctors = Doctor.objects.filter(user__is_approved=True, user__is_active=True).select_related('user')
     context = {
@@ -78,6 +88,39 @@ def appointment_create(request):
     }
     return render(request, 'pages/appointments/appointment_form.html', context)
 
+# Free slots for the booking form
+@login_required
+def appointment_slots(request, doctor_id):
+    """JSON list of a doctor's free slots, by day"""
+    doctor = get_object_or_404(Doctor, pk=doctor_id, user__is_approved=True, user__is_active=True)
+
+    try:
+        start = date.fromisoformat(request.GET['start'])
+    except (KeyError, ValueError):
+        start = timezone.localdate()
+    try:
+        days = int(request.GET.get('days', 14))
+    except ValueError:
+        days = 14
+
+    # When rescheduling, the patient's own booking should not block its slot
+    exclude = None
+    appointment_id = request.GET.get('appointment')
+    if appointment_id and appointment_id.isdigit():
+        exclude = Appointment.objects.filter(
+            pk=appointment_id, patient=request.user
+        ).values_list('pk', flat=True).first()
+
+    slots = get_available_slots(doctor, start, days=days, exclude=exclude)
+    return JsonResponse({
+        'doctor': doctor.pk,
+        'slot_minutes': SLOT_MINUTES,
+        'days': [
+            {'date': day.isoformat(), 'slots': [slot.strftime('%H:%M') for slot in day_slots]}
+            for day, day_slots in slots.items()
+        ],
+    })
+
 # View appointment detail
 @login_required
 def appointment_detail(request, pk):
@@ -171,8 +214,7 @@ def appointment_edit(request, pk):
     
     if request.method == 'POST':
         form = AppointmentForm(request.POST, instance=appointment)
-        if form.is_valid():
-            form.save()
+        if form.is_valid() and form.claim_slot(form.save(commit=False)):
             messages.success(request, 'Appointment updated successfully!')
             return redirect('appointments:appointment_detail', pk=pk)
     else:
@@ -223,22 +265,47 @@ def appointment_messages(request, pk):
             return redirect('appointments:appointment_messages', pk=pk)
         messages.error(request, 'Please enter a message before sending.')
     
-    messages_thread = appointment.messages.select_related('sender').all()
+    # Latest messages first, with cursors to older ones
+    page = paginate_keyset(request, queries.thread(appointment), per_page=MESSAGE_PAGE_SIZE)
 
-    # Mark all messages in this conversation as read for the current user
-    appointment.messages.filter(
-        recipient=request.user,
-        is_read=False
-    ).update(is_read=True)
+    # Mark the conversation read for the current user, unless nothing is unread
+    if conversations.unread_for(appointment, request.user):
+        conversations.mark_read(appointment, request.user)
 
     context = {
         'appointment': appointment,
-        'messages_thread': messages_thread,
+        'messages_thread': page.object_list[::-1],
+        'page_obj': page,
+        'last_message_id': page.object_list[0].id if page and not page.has_previous else 0,
         'title': 'Appointment Messages'
     }
     return render(request, 'pages/appointments/appointment_messages.html', context)
 
 
+def _message_json(message, user):
+    return {**chat.message_data(message), 'mine': message.sender_id == user.pk}
+
+
+@login_required
+def appointment_messages_since(request, pk):
+    """JSON list of a thread's messages newer than ?after=<id>, marking them read"""
+    appointment = _get_appointment_for_user(pk, request.user)
+    try:
+        after = max(int(request.GET.get('after', 0)), 0)
+    except ValueError:
+        after = 0
+
+    new = list(queries.thread_since(appointment, after)[:MESSAGE_POLL_LIMIT])
+    if any(message.recipient_id == request.user.pk and not message.is_read for message in new):
+        conversations.mark_read(appointment, request.user, ids=(after, new[-1].id))
+
+    return JsonResponse({
+        'messages': [_message_json(message, request.user) for message in new],
+        'last_id': new[-1].id if new else after,
+        'more': len(new) == MESSAGE_POLL_LIMIT,
+    })
+
+
 @login_required
 def completed_history(request):
     """Display all completed appointments for the patient"""
@@ -246,98 +313,101 @@ def completed_history(request):
         messages.error(request, 'Only patients can view completed appointment history.')
         return redirect('home')
     
-    history = Appointment.objects.filter(
-        patient=request.user,
-        status='completed'
-    ).select_related('doctor', 'doctor__user').order_by('-date', '-time')
+    page = paginate_keyset(request, queries.patient_appointments(request.user, status='completed'))
     
     return render(request, 'pages/appointments/completed_history.html', {
-        'appointments': history,
+        'appointments': page,
+        'page_obj': page,
         'title': 'Completed Consultations'
     })
 
 
 @login_required
 def download_receipt(request, pk):
-    """Generate a simple PDF receipt for an appointment"""
-    appointment = _get_appointment_for_user(pk, request.user)
-    
-    buffer = BytesIO()
-    p = canvas.Canvas(buffer, pagesize=letter)
-    width, height = letter
-    
-    p.setFont("Helvetica-Bold", 16)
-    p.drawString(50, height - 50, "MedLynk Consultation Receipt")
-    
-    p.setFont("Helvetica", 12)
-    y = height - 100
-    p.drawString(50, y, f"Appointment ID: {appointment.id}")
-    y -= 20
-    p.drawString(50, y, f"Patient: {appointment.patient.get_full_name()} ({appointment.patient.email})")
-    y -= 20
-    p.drawString(50, y, f"Doctor: Dr. {appointment.doctor.user.get_full_name()} - {appointment.doctor.specialization}")
-    y -= 20
-    p.drawString(50, y, f"Date & Time: {appointment.date.strftime('%B %d, %Y')} at {appointment.time.strftime('%I:%M %p')}")
-    y -= 20
-    p.drawString(50, y, f"Status: {appointment.get_status_display()}")
-    y -= 20
-    p.drawString(50, y, f"Consultation Fee: ₱{appointment.doctor.consultation_fee}")
-    y -= 20
-    notes = appointment.notes or 'N/A'
-    p.drawString(50, y, f"Notes: {notes}")
-    y -= 40
-    p.drawString(50, y, "Thank you for choosing MedLynk.")
-    
-    p.showPage()
-    p.save()
-    buffer.seek(0)
-    filename = f"appointment_{appointment.id}_receipt.pdf"
-    return FileResponse(buffer, as_attachment=True, filename=filename)
+    """Serve an appointment's PDF receipt, rendered once and then cached on disk"""
+    appointment = _get_appointment_for_user(pk, request.user, queryset=receipts.queryset())
+    path, receipt_version = receipts.get(appointment)
+    etag = quote_etag(receipt_version)
+    last_modified = receipts.last_modified(path)
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = FileResponse(open(path, 'rb'), as_attachment=True, filename=receipts.filename(appointment))
+    response.headers['ETag'] = etag
+    response.headers['Last-Modified'] = http_date(last_modified)
+    # Receipts are personal: browsers may keep them but must revalidate
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@login_required
+def receipt_exports(request):
+    """Admin page to start a ZIP export of a date range's receipts and download finished ones"""
+    if request.user.role != 'admin' and not request.user.is_staff:
+        messages.error(request, 'Access denied. Admin only.')
+        return redirect('home')
+
+    if request.method == 'POST':
+        try:
+            start = date.fromisoformat(request.POST['start'])
+            end = date.fromisoformat(request.POST['end'])
+        except (KeyError, ValueError):
+            messages.error(request, 'Choose a start and end date for the receipts.')
+            return redirect('appointments:receipt_exports')
+        if end < start:
+            messages.error(request, 'The end date must not be before the start date.')
+        elif receipts.start_export(start, end):
+            messages.success(request, f'Preparing receipts from {start} to {end}. Refresh this page to download them.')
+        else:
+            messages.error(request, 'Another export is still running. Try again when it has finished.')
+        return redirect('appointments:receipt_exports')
+
+    context = {
+        'exports': receipts.finished_exports(),
+        'running': receipts.running_export(),
+        'title': 'Receipt Exports'
+    }
+    return render(request, 'pages/admin/receipt_exports.html', context)
+
+
+@login_required
+def download_receipt_export(request, name):
+    """Serve a finished receipt export"""
+    if request.user.role != 'admin' and not request.user.is_staff:
+        messages.error(request, 'Access denied. Admin only.')
+        return redirect('home')
+
+    path = receipts.find_export(name)
+    if path is None:
+        raise Http404("Export not found")
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=name)
 
 
 @login_required
 def messages_inbox(request):
     """View all message conversations for the logged-in user"""
-    from django.db.models import Q, Max
-
-    # Get all appointments where user is involved and has messages
-    if request.user.role == 'patient':
-        appointments_with_messages = Appointment.objects.filter(
-            patient=request.user,
-            messages__isnull=False
-        ).distinct().select_related('doctor', 'doctor__user').prefetch_related('messages')
-    elif request.user.role == 'doctor':
-        appointments_with_messages = Appointment.objects.filter(
-            doctor__user=request.user,
-            messages__isnull=False
-        ).distinct().select_related('patient', 'doctor__user').prefetch_related('messages')
-    else:
-        appointments_with_messages = Appointment.objects.none()
-
-    # Add last message info to each appointment
-    conversations = []
-    for appointment in appointments_with_messages:
-        last_message = appointment.messages.order_by('-created_at').first()
-        if last_message:
-            conversations.append({
-                'appointment': appointment,
-                'last_message': last_message,
-                'unread_count': appointment.messages.filter(
-                    recipient=request.user,
-                    sender=last_message.sender
-                ).count()
-            })
-
-    # Sort by most recent message
-    conversations.sort(key=lambda x: x['last_message'].created_at, reverse=True)
+    page = paginate_keyset(request, conversations.inbox(request.user))
 
     context = {
-        'conversations': conversations,
+        'conversations': page,
+        'page_obj': page,
         'title': 'Messages'
     }
     return render(request, 'pages/messages/inbox.html', context)
 
 
+@login_required
+def messages_search(request):
+    """Search the logged-in user's message history"""
+    query = request.GET.get('q', '').strip()
+    context = {
+        'query': query,
+        'results': search.search(request.user, query) if query else [],
+        'title': 'Search Messages'
+    }
+    return render(request, 'pages/messages/search.html', context)
+
+
 @login_required
 def delete_message(request, message_id):
     """Delete a single message"""
@@ -1,12 +1,14 @@
 ﻿from django.contrib import admin
-from .models import DoctorProfile, DoctorSchedule, DoctorSpecialization
+from appointments.models import Doctor
+from .models import DoctorSchedule, DoctorSpecialization
 
 
-@admin.register(DoctorProfile)
-class DoctorProfileAdmin(admin.ModelAdmin):
-    list_display = ['user', 'specialization', 'license_number', 'is_available']
+@admin.register(Doctor)
+class DoctorAdmin(admin.ModelAdmin):
+    list_display = ['user', 'specialization', 'license_number', 'is_available', 'average_rating', 'rating_count']
     search_fields = ['user__first_name', 'user__last_name', 'license_number', 'specialization']
     list_filter = ['is_available']
+    readonly_fields = Doctor.RATING_FIELDS
 
 
 @admin.register(DoctorSchedule)
@@ -0,0 +1,76 @@
+"""Rendered-page cache for the public doctor directory.
+
+Anonymous GET requests to ``doctor_list`` and ``doctor_detail`` are served
+from the cache, keyed by path and query string. Every key embeds a
+directory-wide version number; ``doctors.signals`` bumps it whenever a
+doctor, rating, specialization or doctor user changes, which
+retires all cached pages at once.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpResponse
+
+VERSION_KEY = 'doctors:directory:version'
+
+
+def get_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Seed from the clock so a restarted process never reuses old keys
+        version = int(time.time())
+        cache.add(VERSION_KEY, version, timeout=None)
+        version = cache.get(VERSION_KEY, version)
+    return version
+
+
+def bump_version():
+    """Invalidate every cached directory page"""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, int(time.time()), timeout=None)
+
+
+def page_cache_key(request):
+    query = request.GET.urlencode()
+    if query:
+        query = '&'.join(sorted(query.split('&')))
+    digest = hashlib.md5(f'{request.path}?{query}'.encode()).hexdigest()
+    return f'doctors:page:{get_version()}:{digest}'
+
+
+def _is_cacheable(request):
+    return (
+        request.method in ('GET', 'HEAD')
+        and not request.user.is_authenticated
+        and not len(get_messages(request))
+    )
+
+
+def cache_public_page(view):
+    """Serve anonymous GETs of a public directory view from the page cache"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not _is_cacheable(request):
+            return view(request, *args, **kwargs)
+
+        key = page_cache_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            return HttpResponse(content, content_type=content_type)
+
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming:
+            cache.set(
+                key,
+                (response.content, response['Content-Type']),
+                timeout=settings.DIRECTORY_CACHE_TIMEOUT
+            )
+        return response
+    return wrapper
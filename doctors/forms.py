@@ -1,6 +1,6 @@
 # doctors/forms.py
 from django import forms
-from .models import Doctor, DoctorSchedule
+from .models import DoctorSchedule
 
 class DoctorScheduleForm(forms.ModelForm):
     class Meta:
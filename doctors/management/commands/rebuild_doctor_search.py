@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from doctors import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text doctor search index'
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            self.stdout.write(self.style.WARNING('Doctor search index is not available on this database.'))
+            return
+        count = search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} doctor(s).'))
@@ -0,0 +1,53 @@
+"""Request-scoped access to the logged-in doctor's ``Doctor`` record.
+
+``CurrentDoctorMiddleware`` sets ``request.doctor`` to a lazy object that
+loads the record on first access, at most once per request. The record
+is also cached per user across requests and dropped by
+``doctors.signals`` whenever the Doctor row is saved or deleted.
+``request.doctor`` is falsy for non-doctors and for doctor users whose
+record has not been created yet.
+"""
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+from appointments.models import Doctor
+
+CACHE_KEY = 'doctors:current:{user_id}'
+CACHE_TIMEOUT = 60 * 30
+
+
+def cache_key(user_id):
+    return CACHE_KEY.format(user_id=user_id)
+
+
+def invalidate_current_doctor(user_id):
+    cache.delete(cache_key(user_id))
+
+
+def get_current_doctor(request):
+    if not hasattr(request, '_cached_doctor'):
+        request._cached_doctor = _load_doctor(request.user)
+    return request._cached_doctor
+
+
+def _load_doctor(user):
+    if not user.is_authenticated or user.role != 'doctor':
+        return None
+    key = cache_key(user.pk)
+    doctor = cache.get(key)
+    if doctor is None:
+        doctor = Doctor.objects.filter(user_id=user.pk).first()
+        if doctor is None:
+            return None
+        cache.set(key, doctor, CACHE_TIMEOUT)
+    # Reuse the already-loaded user instead of querying it again
+    doctor.user = user
+    return doctor
+
+
+class CurrentDoctorMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.doctor = SimpleLazyObject(lambda: get_current_doctor(request))
+        return self.get_response(request)
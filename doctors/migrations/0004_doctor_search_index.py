@@ -0,0 +1,39 @@
+# Full-text search index for the doctor directory (SQLite FTS5 only)
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS doctors_doctor_search USING fts5("
+        "name, specialization, bio, education, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    schema_editor.execute(
+        "INSERT INTO doctors_doctor_search (rowid, name, specialization, bio, education) "
+        "SELECT d.id, u.first_name || ' ' || u.last_name, d.specialization, "
+        "COALESCE(d.bio, ''), COALESCE(p.education, '') "
+        "FROM appointments_doctor d "
+        "JOIN accounts_user u ON u.id = d.user_id "
+        "LEFT JOIN doctors_doctorprofile p ON p.user_id = d.user_id"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS doctors_doctor_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctors', '0003_seed_specializations'),
+        ('appointments', '0008_doctor_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:16
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctors', '0004_doctor_search_index'),
+        ('appointments', '0009_merge_doctor_profile'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='DoctorProfile',
+        ),
+    ]
@@ -22,38 +22,6 @@ class DoctorSpecialization(models.Model):
         super().save(*args, **kwargs)
 
 
-class DoctorProfile(models.Model):
-    """Extended profile for doctors with medical information"""
-    
-    user = models.OneToOneField(
-        settings.AUTH_USER_MODEL,
-        on_delete=models.CASCADE,
-        related_name='doctor_profile',
-        limit_choices_to={'role': 'doctor'}
-    )
-    
-    specialization = models.CharField(max_length=200, help_text='Medical specialization')
-    license_number = models.CharField(max_length=50, unique=True, help_text='Medical license number')
-    years_of_experience = models.PositiveIntegerField(default=0)
-    education = models.TextField(help_text='Educational background')
-    
-    consultation_fee = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
-    bio = models.TextField(blank=True, null=True, help_text='Professional biography')
-    
-    is_available = models.BooleanField(default=True, help_text='Currently accepting patients')
-    
-    created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
-    
-    class Meta:
-        verbose_name = 'Doctor Profile'
-        verbose_name_plural = 'Doctor Profiles'
-        ordering = ['user__last_name', 'user__first_name']
-    
-    def __str__(self):
-        return f"Dr. {self.user.get_full_name()} - {self.specialization}"
-
-
 class DoctorSchedule(models.Model):
     """Model for doctor's weekly schedule"""
     
@@ -0,0 +1,108 @@
+"""Full-text search index for the public doctor directory.
+
+On SQLite the index is an FTS5 virtual table keyed by ``Doctor.id`` (the
+table's rowid) holding the doctor's name, specialization, bio and
+education. It is created by migration 0004 and kept in sync by
+``doctors.signals``. Other database backends have no index and
+``search_doctor_ids`` returns ``None`` so callers can fall back to
+``icontains`` filters.
+"""
+import re
+
+from django.db import connection
+
+TABLE = 'doctors_doctor_search'
+
+# Column weights for bm25(): name, specialization, bio, education
+RANK_WEIGHTS = (10.0, 5.0, 1.0, 1.0)
+
+MAX_RESULTS = 500
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+_available = None
+
+
+def is_available():
+    """True when the FTS5 table exists on the default database"""
+    global _available
+    if connection.vendor != 'sqlite':
+        return False
+    if _available is None:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [TABLE]
+            )
+            _available = cursor.fetchone() is not None
+    return _available
+
+
+def build_match_expression(query):
+    """Turn free text into an FTS5 query: every term must match as a prefix"""
+    terms = _TOKEN_RE.findall(query.lower())
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def search_doctor_ids(query, limit=MAX_RESULTS):
+    """Return doctor ids matching ``query``, best match first.
+
+    Returns ``None`` when the index is not available on this backend.
+    """
+    if not is_available():
+        return None
+    expression = build_match_expression(query)
+    if not expression:
+        return []
+    weights = ', '.join(str(weight) for weight in RANK_WEIGHTS)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s '
+            f'ORDER BY bm25({TABLE}, {weights}) LIMIT %s',
+            [expression, limit]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def index_doctor(doctor_id):
+    """(Re)index a single doctor, or drop it if the doctor no longer exists"""
+    if not is_available():
+        return
+    from appointments.models import Doctor
+
+    row = Doctor.objects.filter(pk=doctor_id).values_list(
+        'user__first_name', 'user__last_name', 'specialization', 'bio', 'education'
+    ).first()
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [doctor_id])
+        if row:
+            first_name, last_name, specialization, bio, education = row
+            cursor.execute(
+                f'INSERT INTO {TABLE} (rowid, name, specialization, bio, education) '
+                f'VALUES (%s, %s, %s, %s, %s)',
+                [doctor_id, f'{first_name} {last_name}', specialization, bio or '', education or '']
+            )
+
+
+def remove_doctor(doctor_id):
+    """Drop a doctor from the index"""
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [doctor_id])
+
+
+def rebuild_index():
+    """Repopulate the whole index from the doctor tables"""
+    if not is_available():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, name, specialization, bio, education) '
+            f"SELECT d.id, u.first_name || ' ' || u.last_name, d.specialization, "
+            f"COALESCE(d.bio, ''), COALESCE(d.education, '') "
+            f'FROM appointments_doctor d '
+            f'JOIN accounts_user u ON u.id = d.user_id'
+        )
+        cursor.execute(f'SELECT COUNT(*) FROM {TABLE}')
+        return cursor.fetchone()[0]
@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from appointments.models import Doctor, DoctorRating
+from . import caching, search
+from .middleware import invalidate_current_doctor
+from .models import DoctorSpecialization
+
+# User fields that end up in the search index
+INDEXED_USER_FIELDS = {'first_name', 'last_name'}
+
+
+@receiver(post_save, sender=Doctor)
+def index_doctor_on_save(sender, instance, update_fields=None, **kwargs):
+    # Rating aggregate updates don't touch indexed text
+    if update_fields and set(update_fields) <= set(Doctor.RATING_FIELDS):
+        return
+    search.index_doctor(instance.pk)
+
+
+@receiver(post_delete, sender=Doctor)
+def remove_doctor_from_index(sender, instance, **kwargs):
+    search.remove_doctor(instance.pk)
+
+
+@receiver(post_save, sender=Doctor)
+@receiver(post_delete, sender=Doctor)
+def drop_cached_current_doctor(sender, instance, **kwargs):
+    invalidate_current_doctor(instance.user_id)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def index_doctor_on_user_save(sender, instance, created, update_fields=None, **kwargs):
+    if created or instance.role != 'doctor':
+        return
+    if update_fields and not INDEXED_USER_FIELDS & set(update_fields):
+        return
+    for doctor_id in Doctor.objects.filter(user_id=instance.pk).values_list('pk', flat=True):
+        search.index_doctor(doctor_id)
+
+
+# Public directory page cache invalidation
+
+@receiver(post_save, sender=Doctor)
+@receiver(post_delete, sender=Doctor)
+@receiver(post_save, sender=DoctorRating)
+@receiver(post_delete, sender=DoctorRating)
+@receiver(post_save, sender=DoctorSpecialization)
+@receiver(post_delete, sender=DoctorSpecialization)
+def invalidate_directory_cache(sender, **kwargs):
+    caching.bump_version()
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_directory_cache_for_doctor_user(sender, instance, update_fields=None, **kwargs):
+    if instance.role != 'doctor':
+        return
+    # Logins only touch last_login, which the directory never shows
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    caching.bump_version()
@@ -6,6 +6,7 @@ app_name = 'doctors'
 urlpatterns = [
     path('', views.doctor_list, name='doctor_list'),  # Public doctor list
     path('<int:pk>/', views.doctor_detail, name='doctor_detail'),
+    path('first-available/', views.first_available, name='first_available'),
     path('dashboard/', views.doctor_dashboard, name='dashboard'),  # Doctor's own dashboard
     path('appointments/', views.doctor_appointments, name='appointments'),
     path('patients/', views.doctor_patients, name='patients'),
@@ -1,12 +1,23 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.http import JsonResponse
+from django.urls import reverse
 from django.utils import timezone
-from datetime import timedelta
-from django.db.models import Q
+from django.utils.http import urlencode
+import math
+from datetime import date, timedelta
+from django.db.models import Avg, Case, Count, Max, Min, Q, Value, When
+from django.db.models.functions import Coalesce, Round
 from accounts.models import User
 from appointments.models import Appointment, Doctor  # Import Doctor from appointments
-from .models import DoctorProfile, DoctorSpecialization
+from appointments import queries
+from appointments.availability import find_first_available
+from notifications.services import notify
+from .models import DoctorSpecialization
+from . import search
+from .caching import cache_public_page
+from medicalapp.pagination import paginate_keyset
 
 @login_required
 def doctor_dashboard(request):
@@ -16,51 +27,22 @@ def doctor_dashboard(request):
         messages.error(request, 'Access denied. This page is only for doctors.')
         return redirect('profile')
     
-    # Get or create Doctor instance (for appointments)
-    doctor, created = Doctor.objects.get_or_create(
-        user=request.user,
-        defaults={
-            'specialization': 'General Practice',
-            'bio': 'Professional healthcare provider',
-            'license_number': f'LIC-{request.user.id}',
-            'consultation_fee': 500.00
-        }
-    )
-    
-    # Also get or create DoctorProfile (for extended info)
-    doctor_profile, _ = DoctorProfile.objects.get_or_create(
-        user=request.user,
-        defaults={
-            'specialization': 'General Practice',
-            'license_number': f'LIC-{request.user.id}',
-            'years_of_experience': 0,
-            'education': 'To be updated',
-            'consultation_fee': 500.00
-        }
-    )
+    doctor = request.doctor
+    if not doctor:
+        messages.error(request, 'Doctor profile not found. Please contact an administrator.')
+        return redirect('profile')
     
     # Get all appointments for this doctor
     today = timezone.now().date()
     
     # Today's appointments
-    todays_appointments = Appointment.objects.filter(
-        doctor=doctor,  # Use Doctor instance
-        date=today
-    ).select_related('patient').order_by('time')
+    todays_appointments = queries.doctor_day(doctor, today)
     
     # Pending appointments
-    pending_appointments = Appointment.objects.filter(
-        doctor=doctor,
-        status='pending'
-    ).select_related('patient').order_by('date', 'time')
+    pending_appointments = queries.doctor_pending(doctor)
     
     # Upcoming appointments (next 7 days, excluding today)
-    upcoming_appointments = Appointment.objects.filter(
-        doctor=doctor,
-        date__gt=today,
-        date__lte=today + timedelta(days=7),
-        status__in=['pending', 'confirmed']
-    ).select_related('patient').order_by('date', 'time')[:6]
+    upcoming_appointments = queries.doctor_upcoming(doctor, today)[:6]
     
     # Statistics
     total_appointments = Appointment.objects.filter(doctor=doctor).count()
@@ -70,15 +52,14 @@ def doctor_dashboard(request):
     
     # Handle availability toggle
     if request.method == 'POST' and 'toggle_availability' in request.POST:
-        doctor_profile.is_available = not doctor_profile.is_available
-        doctor_profile.save()
-        status = 'available' if doctor_profile.is_available else 'unavailable'
+        doctor.is_available = not doctor.is_available
+        doctor.save(update_fields=['is_available', 'updated_at'])
+        status = 'available' if doctor.is_available else 'unavailable'
         messages.success(request, f'You are now {status}.')
         return redirect('doctors:dashboard')
     
     context = {
         'doctor': doctor,
-        'doctor_profile': doctor_profile,
         'todays_appointments': todays_appointments,
         'todays_count': todays_appointments.count(),
         'pending_appointments': pending_appointments,
@@ -98,41 +79,32 @@ def doctor_appointments(request):
         messages.error(request, 'Access denied.')
         return redirect('profile')
     
-    # Get or create Doctor instance
-    doctor, _ = Doctor.objects.get_or_create(
-        user=request.user,
-        defaults={
-            'specialization': 'General Practice',
-            'bio': 'Professional healthcare provider',
-            'license_number': f'LIC-{request.user.id}',
-            'consultation_fee': 500.00
-        }
-    )
-    
-    appointments = Appointment.objects.filter(
-        doctor=doctor
-    ).select_related('patient').order_by('-date', '-time')
-    
-    # Filter by status if provided
-    status = request.GET.get('status')
-    if status:
-        appointments = appointments.filter(status=status)
+    doctor = request.doctor
+    if not doctor:
+        messages.error(request, 'Doctor profile not found. Please contact an administrator.')
+        return redirect('profile')
     
-    # Filter by date
-    date_filter = request.GET.get('date')
-    if date_filter == 'today':
-        appointments = appointments.filter(date=timezone.now().date())
-    elif date_filter == 'upcoming':
-        appointments = appointments.filter(
-            date__gte=timezone.now().date(),
-            status__in=['pending', 'confirmed']
-        )
+    # Filter by status and date ('today' or 'upcoming') if provided
+    appointments = queries.doctor_appointments(
+        doctor, status=request.GET.get('status'), when=request.GET.get('date')
+    )
     
+    page = paginate_keyset(request, appointments)
     return render(request, 'pages/doctors/doctor_appointments.html', {
-        'appointments': appointments
+        'appointments': page,
+        'page_obj': page,
     })
 
 
+# Roster orderings for doctor_patients; each ends in id for keyset pagination
+PATIENT_SORTS = {
+    'name': ['last_name', 'first_name', 'id'],
+    'appointments': ['-appointment_count', 'last_name', 'id'],
+    'completed': ['-completed_count', 'last_name', 'id'],
+    'last_visit': ['-last_visit_key', 'last_name', 'id'],
+    'next_appointment': ['next_appointment_key', 'last_name', 'id'],
+}
+
 @login_required
 def doctor_patients(request):
     """List all patients who have appointments with this doctor"""
@@ -140,26 +112,52 @@ def doctor_patients(request):
         messages.error(request, 'Access denied.')
         return redirect('profile')
     
-    # Get or create Doctor instance
-    doctor, _ = Doctor.objects.get_or_create(
-        user=request.user,
-        defaults={
-            'specialization': 'General Practice',
-            'bio': 'Professional healthcare provider',
-            'license_number': f'LIC-{request.user.id}',
-            'consultation_fee': 500.00
-        }
+    doctor = request.doctor
+    if not doctor:
+        messages.error(request, 'Doctor profile not found. Please contact an administrator.')
+        return redirect('profile')
+    
+    # One row per patient of this doctor, with per-doctor appointment stats
+    today = timezone.now().date()
+    with_doctor = Q(appointments__doctor=doctor)
+    patients = User.objects.filter(
+        with_doctor, role='patient'
+    ).annotate(
+        appointment_count=Count('appointments', filter=with_doctor),
+        completed_count=Count('appointments', filter=with_doctor & Q(appointments__status='completed')),
+        last_visit=Max('appointments__date', filter=with_doctor & Q(
+            appointments__date__lte=today,
+            appointments__status__in=['confirmed', 'completed']
+        )),
+        next_appointment=Min('appointments__date', filter=with_doctor & Q(
+            appointments__date__gte=today,
+            appointments__status__in=['pending', 'confirmed']
+        )),
+        # Null-free copies of the dates so they can be used as keyset sort keys
+        last_visit_key=Coalesce('last_visit', Value(date.min)),
+        next_appointment_key=Coalesce('next_appointment', Value(date.max)),
     )
     
-    # Get unique patients from appointments
-    patient_ids = Appointment.objects.filter(
-        doctor=doctor
-    ).values_list('patient_id', flat=True).distinct()
+    # Server-side search
+    search_query = request.GET.get('search', '').strip()
+    if search_query:
+        patients = patients.filter(
+            Q(first_name__icontains=search_query) |
+            Q(last_name__icontains=search_query) |
+            Q(email__icontains=search_query) |
+            Q(phone_number__icontains=search_query)
+        )
     
-    patients = User.objects.filter(id__in=patient_ids, role='patient')
+    sort = request.GET.get('sort', 'name')
+    if sort not in PATIENT_SORTS:
+        sort = 'name'
+    page = paginate_keyset(request, patients, PATIENT_SORTS[sort])
     
     return render(request, 'pages/doctors/doctor_patients.html', {
-        'patients': patients
+        'patients': page,
+        'page_obj': page,
+        'search_query': search_query,
+        'current_sort': sort,
     })
 
 
@@ -170,16 +168,10 @@ def appointment_action(request, appointment_id, action):
         messages.error(request, 'Access denied.')
         return redirect('profile')
     
-    # Get or create Doctor instance
-    doctor, _ = Doctor.objects.get_or_create(
-        user=request.user,
-        defaults={
-            'specialization': 'General Practice',
-            'bio': 'Professional healthcare provider',
-            'license_number': f'LIC-{request.user.id}',
-            'consultation_fee': 500.00
-        }
-    )
+    doctor = request.doctor
+    if not doctor:
+        messages.error(request, 'Doctor profile not found. Please contact an administrator.')
+        return redirect('profile')
     
     appointment = get_object_or_404(
         Appointment, 
@@ -192,27 +184,15 @@ def appointment_action(request, appointment_id, action):
         appointment.save()
         messages.success(request, f'Appointment with {appointment.patient.get_full_name()} confirmed.')
 
-        # Create notification for patient
-        from notifications.models import Notification
-        Notification.objects.create(
-            user=appointment.patient,
-            notification_type='appointment_confirmed',
-            title='Appointment Confirmed',
-            message=f'Your appointment with Dr. {doctor.user.get_full_name()} on {appointment.date.strftime("%B %d, %Y")} at {appointment.time.strftime("%I:%M %p")} has been confirmed.'
-        )
+        # Notify the patient (written by the notification worker)
+        notify('appointment_confirmed', [appointment.patient_id], appointment=appointment, doctor=doctor)
     elif action == 'cancel':
         appointment.status = 'cancelled'
         appointment.save()
         messages.warning(request, f'Appointment with {appointment.patient.get_full_name()} cancelled.')
 
-        # Create notification for patient
-        from notifications.models import Notification
-        Notification.objects.create(
-            user=appointment.patient,
-            notification_type='appointment_cancelled',
-            title='Appointment Cancelled',
-            message=f'Your appointment with Dr. {doctor.user.get_full_name()} on {appointment.date.strftime("%B %d, %Y")} at {appointment.time.strftime("%I:%M %p")} has been cancelled.'
-        )
+        # Notify the patient (written by the notification worker)
+        notify('appointment_cancelled', [appointment.patient_id], appointment=appointment, doctor=doctor)
     elif action == 'complete':
         appointment.status = 'completed'
         appointment.save()
@@ -221,34 +201,86 @@ def appointment_action(request, appointment_id, action):
     return redirect('doctors:dashboard')
 
 
+# Date windows on the doctor ratings page: key -> (label, days back or None)
+RATING_WINDOWS = {
+    'all': ('All Time', None),
+    '30d': ('Last 30 Days', 30),
+    '90d': ('Last 90 Days', 90),
+    '1y': ('Last Year', 365),
+}
+
+RATING_SORTS = {
+    'rating': ['-average_rating', '-rating_count', 'user__last_name'],
+    'reviews': ['-rating_count', '-average_rating', 'user__last_name'],
+    'name': ['user__last_name', 'user__first_name'],
+}
+
+
+def _parse_number(value, cast, minimum, maximum):
+    """Parse a numeric query parameter, ignoring blank, invalid or non-finite values"""
+    try:
+        number = cast(value)
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(number):
+        return None
+    return min(max(number, minimum), maximum)
+
+
+def _apply_rating_filters(doctors, params):
+    """Filter and sort doctors on the stored rating columns (single SQL query)"""
+    min_rating = _parse_number(params.get('min_rating'), float, 0, 5)
+    if min_rating is None and params.get('rating') == 'high':
+        min_rating = 4.0
+    if min_rating:
+        # Compare the rating as the cards show it, rounded to one decimal
+        doctors = doctors.alias(shown_rating=Round('average_rating', 1)).filter(shown_rating__gte=min_rating)
+
+    min_reviews = _parse_number(params.get('min_reviews'), int, 0, 10 ** 6)
+    if min_reviews:
+        doctors = doctors.filter(rating_count__gte=min_reviews)
+
+    sort = params.get('sort')
+    if sort in RATING_SORTS:
+        doctors = doctors.order_by(*RATING_SORTS[sort])
+
+    return doctors, {'min_rating': min_rating, 'min_reviews': min_reviews, 'sort': sort}
+
+
+def _listed_doctors():
+    """Approved, active and available doctors"""
+    return Doctor.objects.filter(
+        user__role='doctor',
+        user__is_approved=True,
+        user__is_active=True,
+        is_available=True
+    )
+
+
+@cache_public_page
 def doctor_list(request):
     """List all approved and available doctors"""
-    # Get Doctor objects (from appointments app) for approved doctor users
-    doctor_users = User.objects.filter(
-        role='doctor', 
-        is_approved=True, 
-        is_active=True
-    )
-    
-    # Get Doctor instances for these users
-    doctors = Doctor.objects.filter(user__in=doctor_users).select_related('user')
+    # Approved, active and available doctors in one joined query
+    doctors = _listed_doctors().select_related('user')
     
-    # Filter by availability - only show available doctors
-    from .models import DoctorProfile
-    available_doctor_ids = DoctorProfile.objects.filter(
-        is_available=True,
-        user__in=doctor_users
-    ).values_list('user_id', flat=True)
-    doctors = doctors.filter(user_id__in=available_doctor_ids)
-    
-    # Search functionality
+    # Search functionality (full-text index, ranked; icontains on other backends)
     search_query = request.GET.get('search', '')
     if search_query:
-        doctors = doctors.filter(
-            Q(user__first_name__icontains=search_query) |
-            Q(user__last_name__icontains=search_query) |
-            Q(specialization__icontains=search_query)
-        )
+        ranked_ids = search.search_doctor_ids(search_query)
+        if ranked_ids is None:
+            doctors = doctors.filter(
+                Q(user__first_name__icontains=search_query) |
+                Q(user__last_name__icontains=search_query) |
+                Q(specialization__icontains=search_query) |
+                Q(bio__icontains=search_query) |
+                Q(education__icontains=search_query)
+            )
+        elif ranked_ids:
+            doctors = doctors.filter(pk__in=ranked_ids).order_by(
+                Case(*[When(pk=pk, then=position) for position, pk in enumerate(ranked_ids)])
+            )
+        else:
+            doctors = doctors.none()
     
     # Filter by specialization
     specialization_slug = request.GET.get('specialization')
@@ -261,15 +293,8 @@ def doctor_list(request):
         except DoctorSpecialization.DoesNotExist:
             pass
     
-    # Filter by high rating (4.0 and above)
-    rating_filter = request.GET.get('rating')
-    if rating_filter == 'high':
-        # Get doctors with average rating >= 4.0
-        high_rated_doctors = []
-        for doctor in doctors:
-            if doctor.get_average_rating() >= 4.0:
-                high_rated_doctors.append(doctor.id)
-        doctors = doctors.filter(id__in=high_rated_doctors)
+    # Rating filters (min stars, min review count) and sorting
+    doctors, rating_filters = _apply_rating_filters(doctors, request.GET)
     
     # Get specializations for dropdown
     specializations = DoctorSpecialization.objects.filter(is_active=True)
@@ -277,10 +302,47 @@ def doctor_list(request):
     return render(request, 'pages/doctors/doctor_list.html', {
         'doctors': doctors,
         'specializations': specializations,
-        'current_specialization': current_specialization
+        'current_specialization': current_specialization,
+        'rating_filters': rating_filters,
     })
 
 
+def first_available(request):
+    """Earliest free appointment slots among listed doctors, as JSON"""
+    doctors = _listed_doctors()
+
+    specialization = None
+    slug = request.GET.get('specialization')
+    if slug:
+        specialization = DoctorSpecialization.objects.filter(slug=slug, is_active=True).first()
+        if specialization:
+            doctors = doctors.filter(specialization__iexact=specialization.name)
+
+    try:
+        after = date.fromisoformat(request.GET['after'])
+    except (KeyError, ValueError):
+        after = None
+
+    results = []
+    for doctor, day, start in find_first_available(doctors, after=after):
+        booking_query = urlencode({'doctor': doctor.pk, 'date': day.isoformat(), 'time': start.strftime('%H:%M')})
+        results.append({
+            'doctor': doctor.pk,
+            'name': f"Dr. {doctor.user.get_full_name()}",
+            'specialization': doctor.specialization,
+            'date': day.isoformat(),
+            'time': start.strftime('%H:%M'),
+            'profile_url': reverse('doctors:doctor_detail', args=[doctor.pk]),
+            'booking_url': f"{reverse('appointments:appointment_create')}?{booking_query}",
+        })
+
+    return JsonResponse({
+        'specialization': specialization.name if specialization else None,
+        'results': results,
+    })
+
+
+@cache_public_page
 def doctor_detail(request, pk):
     """Public-facing profile for a doctor"""
     doctor = get_object_or_404(
@@ -289,14 +351,12 @@ def doctor_detail(request, pk):
         user__is_active=True,
         user__is_approved=True
     )
-    profile = DoctorProfile.objects.filter(user=doctor.user).first()
-    ratings = doctor.ratings.select_related('patient').all()
+    ratings = paginate_keyset(request, queries.doctor_ratings(doctor).select_related('patient'), per_page=10)
     total_appointments = doctor.appointments.count()
     total_patients = doctor.appointments.values('patient_id').distinct().count()
 
     context = {
         'doctor': doctor,
-        'profile': profile,
         'average_rating': doctor.get_average_rating(),
         'rating_count': doctor.get_rating_count(),
         'ratings': ratings,
@@ -315,38 +375,46 @@ def doctor_ratings_feedback(request):
         messages.error(request, 'Access denied. This page is only for doctors.')
         return redirect('profile')
 
-    # Get Doctor instance
-    try:
-        doctor = Doctor.objects.get(user=request.user)
-    except Doctor.DoesNotExist:
-        messages.error(request, 'Doctor profile not found.')
-        return redirect('doctors:dashboard')
+    doctor = request.doctor
+    if not doctor:
+        messages.error(request, 'Doctor profile not found. Please contact an administrator.')
+        return redirect('profile')
 
-    # Get all ratings with related patient and appointment info
-    from appointments.models import DoctorRating
-    ratings = DoctorRating.objects.filter(doctor=doctor).select_related(
-        'patient', 'appointment'
-    ).order_by('-created_at')
-
-    # Calculate statistics
-    total_ratings = ratings.count()
-    average_rating = doctor.get_average_rating()
-
-    # Count ratings by star level
-    ratings_breakdown = {
-        5: ratings.filter(rating=5).count(),
-        4: ratings.filter(rating=4).count(),
-        3: ratings.filter(rating=3).count(),
-        2: ratings.filter(rating=2).count(),
-        1: ratings.filter(rating=1).count(),
-    }
+    # Time window for the stats panel and review stream
+    window = request.GET.get('window', 'all')
+    if window not in RATING_WINDOWS:
+        window = 'all'
+    since = None
+    if RATING_WINDOWS[window][1]:
+        since = timezone.now() - timedelta(days=RATING_WINDOWS[window][1])
+    ratings = queries.doctor_ratings(doctor, since=since)
+
+    # Whole stats panel (total, average, per-star counts) in one query
+    stats = ratings.aggregate(
+        total=Count('id'),
+        average=Avg('rating'),
+        **{f'stars_{i}': Count('id', filter=Q(rating=i)) for i in range(1, 6)}
+    )
+    total_ratings = stats['total']
+    ratings_breakdown = {i: stats[f'stars_{i}'] for i in range(5, 0, -1)}
+
+    # Paginated review stream with only the columns the template renders
+    reviews = ratings.select_related('patient', 'appointment').only(
+        'rating', 'comment', 'created_at',
+        'patient__first_name', 'patient__last_name', 'patient__profile_picture',
+        'appointment__date'
+    )
+    page = paginate_keyset(request, reviews)
 
     context = {
         'doctor': doctor,
-        'ratings': ratings,
+        'ratings': page,
+        'page_obj': page,
         'total_ratings': total_ratings,
-        'average_rating': average_rating,
+        'average_rating': round(stats['average'] or 0, 1),
         'ratings_breakdown': ratings_breakdown,
+        'rating_windows': [(key, label) for key, (label, _days) in RATING_WINDOWS.items()],
+        'current_window': window,
         'title': 'My Ratings & Feedback'
     }
-    return render(request, 'pages/doctors/doctor_ratings.html', context)
\ No newline at end of file
+    return render(request, 'pages/doctors/doctor_ratings.html', context)
@@ -2,15 +2,39 @@
 ASGI config for medicalapp project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP goes to Django; WebSocket connections are routed by ``WEBSOCKET_ROUTES``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
 
 import os
+import re
 
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'medicalapp.settings')
 
-application = get_asgi_application()
+# Set up Django before importing anything that touches models
+django_application = get_asgi_application()
+
+from appointments import chat  # noqa: E402
+
+WEBSOCKET_ROUTES = [
+    (re.compile(r'^/ws/appointments/(?P<appointment_id>\d+)/chat/$'), chat.serve),
+]
+
+
+async def websocket_application(scope, receive, send):
+    for pattern, handler in WEBSOCKET_ROUTES:
+        match = pattern.match(scope['path'])
+        if match:
+            return await handler(scope, receive, send, **match.groupdict())
+    await receive()
+    await send({'type': 'websocket.close', 'code': chat.NOT_FOUND})
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        return await websocket_application(scope, receive, send)
+    return await django_application(scope, receive, send)
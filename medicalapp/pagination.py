@@ -0,0 +1,200 @@
+"""Keyset (cursor) pagination shared by the list views.
+
+Unlike offset pagination, each page is fetched with a ``WHERE`` clause on
+the ordering columns of the last row seen, so the cost of a page does not
+grow with how far into the list the user is. Cursors are opaque,
+URL-safe strings encoding the boundary row's ordering values.
+
+The ordering must end in a unique, non-null column (normally ``id``) so
+that ties are broken deterministically. It defaults to the queryset's own
+``order_by()``, so a function returning a list's queryset also fixes its
+page order.
+"""
+import base64
+import json
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from django.http import QueryDict
+
+DEFAULT_PER_PAGE = 20
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _split(ordering):
+    """'-date' -> ('date', True)"""
+    return (ordering[1:], True) if ordering.startswith('-') else (ordering, False)
+
+
+def _resolve_field(model, path):
+    """Find the model field behind an ordering path such as 'user__last_name'"""
+    parts = path.split('__')
+    for part in parts[:-1]:
+        model = model._meta.get_field(part).related_model
+    field = model._meta.get_field(parts[-1])
+    # Ordering by a foreign key orders by its primary key value
+    return field.target_field if field.is_relation else field
+
+
+def _serialize(value):
+    """JSON-safe form of an ordering value; Field.to_python() reverses it"""
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _value_of(obj, path):
+    """Read an ordering value from an object or an annotation"""
+    if hasattr(obj, path):
+        return getattr(obj, path)
+    for part in path.split('__'):
+        obj = getattr(obj, part)
+    return obj
+
+
+class KeysetPage:
+    """One page of results plus cursors to its neighbours"""
+
+    def __init__(self, object_list, next_cursor, previous_cursor, params, param_name):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self._params = params if params is not None else QueryDict(mutable=True)
+        self._param_name = param_name
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def _query_with(self, cursor):
+        params = self._params.copy()
+        params[self._param_name] = cursor
+        return params.urlencode()
+
+    @property
+    def next_query(self):
+        """Query string (without '?') for the next page, keeping other filters"""
+        return self._query_with(self.next_cursor) if self.has_next else ''
+
+    @property
+    def previous_query(self):
+        return self._query_with(self.previous_cursor) if self.has_previous else ''
+
+
+class KeysetPaginator:
+    """Paginate a queryset by the values of its ordering columns"""
+
+    def __init__(self, queryset, ordering=None, per_page=DEFAULT_PER_PAGE):
+        self.queryset = queryset
+        self.ordering = list(queryset.query.order_by if ordering is None else ordering)
+        if not self.ordering:
+            raise ValueError('Keyset pagination needs an ordering')
+        self.per_page = per_page
+        self._fields = [
+            (path, descending, self._field_for(path))
+            for path, descending in map(_split, self.ordering)
+        ]
+
+    def _field_for(self, path):
+        try:
+            return _resolve_field(self.queryset.model, path)
+        except FieldDoesNotExist:
+            # Annotation: look up its output field on the query
+            return self.queryset.query.annotations[path].output_field
+
+    # Cursor encoding
+
+    def encode_cursor(self, obj, backwards=False):
+        values = [_serialize(_value_of(obj, path)) for path, _descending, _field in self._fields]
+        payload = json.dumps(['p' if backwards else 'n', values], separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            direction, raw_values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            # Ordering columns are non-null, so a null value is never a real boundary
+            if direction not in ('n', 'p') or len(raw_values) != len(self._fields) or None in raw_values:
+                raise InvalidCursor(cursor)
+            values = [
+                field.to_python(raw) for raw, (_path, _descending, field) in zip(raw_values, self._fields)
+            ]
+        except (ValueError, TypeError, ValidationError) as exc:
+            raise InvalidCursor(cursor) from exc
+        return direction == 'p', values
+
+    # Query building
+
+    def _after(self, values, backwards):
+        """Q selecting rows strictly after (or before) the boundary values"""
+        clauses = []
+        for index, (path, descending, _field) in enumerate(self._fields):
+            forward_lookup = 'lt' if descending else 'gt'
+            if backwards:
+                forward_lookup = 'gt' if forward_lookup == 'lt' else 'lt'
+            equal = {prev_path: values[i] for i, (prev_path, _, _) in enumerate(self._fields[:index])}
+            clauses.append(Q(**equal, **{f'{path}__{forward_lookup}': values[index]}))
+        return reduce(or_, clauses)
+
+    def _reversed_ordering(self):
+        return [path if descending else f'-{path}' for path, descending, _ in self._fields]
+
+    def get_page(self, cursor=None, params=None, param_name='cursor'):
+        backwards, values = False, None
+        if cursor:
+            try:
+                backwards, values = self.decode_cursor(cursor)
+            except InvalidCursor:
+                backwards, values = False, None
+
+        queryset = self.queryset
+        if values is not None:
+            queryset = queryset.filter(self._after(values, backwards))
+        queryset = queryset.order_by(*(self._reversed_ordering() if backwards else self.ordering))
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if backwards:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+
+        next_cursor = self.encode_cursor(rows[-1]) if rows and has_next else None
+        previous_cursor = self.encode_cursor(rows[0], backwards=True) if rows and has_previous else None
+        return KeysetPage(rows, next_cursor, previous_cursor, params, param_name)
+
+
+def paginate_keyset(request, queryset, ordering=None, per_page=DEFAULT_PER_PAGE, param_name='cursor'):
+    """Return the KeysetPage for the cursor in ``request.GET``"""
+    paginator = KeysetPaginator(queryset, ordering, per_page=per_page)
+    params = request.GET.copy()
+    params.pop(param_name, None)
+    return paginator.get_page(request.GET.get(param_name), params=params, param_name=param_name)
@@ -41,6 +41,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'doctors.middleware.CurrentDoctorMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -71,9 +72,71 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Take the write lock when a transaction begins, so concurrent
+            # check-and-insert bookings queue up instead of failing with
+            # "database is locked" when a read lock cannot be upgraded
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        # A file (not shared-cache memory) so tests see the same locking
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
+# Cache - in-process by default; point at Redis/Memcached when running several workers
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'medicalapp',
+    }
+}
+
+# Seconds a rendered public doctor directory page stays cached.
+# Model changes invalidate entries immediately; this bounds staleness of
+# appointment counts shown on doctor profiles.
+DIRECTORY_CACHE_TIMEOUT = 300
+
+# Length of one bookable appointment slot, in minutes
+APPOINTMENT_SLOT_MINUTES = 30
+
+# Notifications are written by a background worker in bulk_create batches of
+# this size; set NOTIFICATION_DISPATCH_SYNC to deliver on commit in-process
+NOTIFICATION_BATCH_SIZE = 500
+NOTIFICATION_DISPATCH_SYNC = False
+
+# Unread notifications of the same type and subject within this many minutes
+# merge into one row. Types listed in NOTIFICATION_DIGEST_TYPES are instead
+# collected into one periodic digest by `manage.py send_notification_digests`
+NOTIFICATION_COALESCE_MINUTES = 30
+NOTIFICATION_DIGEST_TYPES = []
+
+# Read notifications older than this many days are moved to the archive
+# table by `manage.py archive_notifications`, this many rows per transaction
+NOTIFICATION_RETENTION_DAYS = 90
+NOTIFICATION_ARCHIVE_BATCH_SIZE = 200
+
+# Live events for open pages: the /notifications/stream/ event stream and the
+# appointment chat sockets. They need an ASGI server, e.g.
+#   pip install uvicorn && uvicorn medicalapp.asgi:application
+# so they are off by default; under runserver or WSGI pages poll instead.
+# LocalBroker only reaches this process; with several workers use
+# 'notifications.pubsub.RedisBroker' and set NOTIFICATION_BROKER_URL
+NOTIFICATION_LIVE_EVENTS = False
+NOTIFICATION_BROKER = 'notifications.pubsub.LocalBroker'
+NOTIFICATION_BROKER_URL = 'redis://localhost:6379/0'
+
+# Minutes before a confirmed appointment that the patient is reminded;
+# sent by `manage.py send_reminders`
+APPOINTMENT_REMINDER_WINDOWS = [24 * 60, 60]
+
+# Rendered PDF receipts are cached here (outside MEDIA_ROOT: they are private).
+# `manage.py render_receipts`, which the admin receipt exports page runs as a
+# background process one export at a time, renders in a pool of this many
+# processes (None: one per CPU)
+RECEIPT_CACHE_DIR = BASE_DIR / 'var' / 'receipts'
+RECEIPT_RENDER_WORKERS = 2
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
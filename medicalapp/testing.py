@@ -0,0 +1,27 @@
+"""Test helpers shared by the app test suites."""
+import re
+
+from django.db import connection
+
+
+class QueryPlanMixin:
+    """Assertions over SQLite's EXPLAIN QUERY PLAN for a queryset"""
+
+    def query_plan(self, queryset):
+        return queryset.explain()
+
+    def assertNoFullScan(self, queryset, table=None):
+        """Fail if the queryset reads ``table`` (default: its model's) without an index"""
+        if connection.vendor != 'sqlite':
+            self.skipTest('Query plan assertions are written against SQLite')
+        table = table or queryset.model._meta.db_table
+        plan = self.query_plan(queryset)
+        # "SCAN <table>" with no "USING ... INDEX" is a full table scan
+        full_scan = re.search(rf'\bSCAN {re.escape(table)}\b(?! USING)', plan)
+        self.assertIsNone(full_scan, f'Full scan of {table}:\n{plan}')
+        return plan
+
+    def assertUsesIndex(self, queryset, index_name, table=None):
+        plan = self.assertNoFullScan(queryset, table=table)
+        self.assertIn(index_name, plan, f'{index_name} not used:\n{plan}')
+        return plan
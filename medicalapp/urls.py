@@ -19,13 +19,11 @@ urlpatterns = [
     path('dashboard/', account_views.patient_dashboard, name='patient_dashboard'),
     path('admin-dashboard/', account_views.admin_dashboard, name='admin_dashboard'),
 
-    # Notifications
-    path('notifications/', account_views.notification_list, name='notification_list'),
-
     # Include other app URLs
     path('', include('accounts.urls')),  # Include all accounts URLs
     path('appointments/', include('appointments.urls')),
     path('doctors/', include('doctors.urls')),
+    path('notifications/', include('notifications.urls')),
 ]
 
 # Serve media files in development
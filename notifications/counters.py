@@ -0,0 +1,77 @@
+"""Per-user unread counters for the header badges.
+
+The counts of unread notifications and unread appointment messages are
+kept in the cache so that rendering a page normally costs no queries.
+``notifications.signals`` adjusts them when a row is created, read or
+deleted; bulk ``update()`` calls bypass signals, so the views doing those
+call ``adjust()`` with the number of rows they changed. A missing key is
+recounted from the database on the next read.
+
+Adjustments run on transaction commit so rolled-back writes never
+reach the cache, and then tell the user's open pages to refresh their
+badges through ``notifications.pubsub``.
+"""
+from django.core.cache import cache
+from django.db import transaction
+
+from . import pubsub
+
+NOTIFICATIONS = 'notifications'
+MESSAGES = 'messages'
+
+CACHE_KEY = 'unread:{kind}:{user_id}'
+# Bounds any drift from races between a recount and a concurrent change
+CACHE_TIMEOUT = 60 * 30
+
+
+def cache_key(kind, user_id):
+    return CACHE_KEY.format(kind=kind, user_id=user_id)
+
+
+def unread(kind, user_id):
+    """The unread rows a badge counts"""
+    if kind == NOTIFICATIONS:
+        from .models import Notification
+        return Notification.objects.filter(user_id=user_id, is_read=False)
+    from appointments.models import AppointmentMessage
+    return AppointmentMessage.objects.filter(recipient_id=user_id, is_read=False)
+
+
+def _count(kind, user_id):
+    return unread(kind, user_id).count()
+
+
+def get_unread_count(kind, user_id):
+    key = cache_key(kind, user_id)
+    count = cache.get(key)
+    if count is None:
+        count = _count(kind, user_id)
+        cache.add(key, count, CACHE_TIMEOUT)
+    return count
+
+
+def _apply(kind, user_id, delta):
+    key = cache_key(kind, user_id)
+    try:
+        count = cache.incr(key, delta)
+    except ValueError:
+        # Not cached: the next read counts from the database
+        count = None
+    if count is not None and count < 0:
+        cache.delete(key)
+    pubsub.send(pubsub.user_topic(user_id), pubsub.UNREAD, {'kind': kind})
+
+
+def _invalidate(kind, user_id):
+    cache.delete(cache_key(kind, user_id))
+    pubsub.send(pubsub.user_topic(user_id), pubsub.UNREAD, {'kind': kind})
+
+
+def adjust(kind, user_id, delta):
+    """Add ``delta`` to a cached counter once the transaction commits"""
+    if delta:
+        transaction.on_commit(lambda: _apply(kind, user_id, delta))
+
+
+def invalidate(kind, user_id):
+    transaction.on_commit(lambda: _invalidate(kind, user_id))
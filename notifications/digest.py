@@ -0,0 +1,32 @@
+"""Periodic notification digests.
+
+When ``NOTIFICATION_DIGEST_TYPES`` names notification types, ``dispatch``
+holds those notifications as ``PendingDigestItem`` rows instead of writing
+them. ``send_digests()``, run from cron by ``manage.py
+send_notification_digests``, turns each user's pending items into one
+notification and deletes them, a batch of users per transaction.
+"""
+from django.db import transaction
+
+from . import dispatch
+from .models import Notification, PendingDigestItem
+
+
+def send_digests(batch_size=None):
+    """Write one digest per user with pending items; returns how many were sent"""
+    batch_size = batch_size or dispatch.batch_size()
+    user_ids = list(PendingDigestItem.objects.order_by('user_id').values_list('user_id', flat=True).distinct())
+    sent = 0
+    for offset in range(0, len(user_ids), batch_size):
+        with transaction.atomic():
+            pending = {}
+            for item in PendingDigestItem.objects.filter(user_id__in=user_ids[offset:offset + batch_size]).order_by('created_at', 'id'):
+                pending.setdefault(item.user_id, []).append(item)
+
+            digests = [
+                Notification(user_id=user_id, **dispatch.render_event('digest', {'items': items[::-1]}))
+                for user_id, items in pending.items()
+            ]
+            sent += dispatch.write(digests, hold=False)
+            PendingDigestItem.objects.filter(pk__in=[item.pk for items in pending.values() for item in items]).delete()
+    return sent
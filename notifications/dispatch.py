@@ -0,0 +1,219 @@
+"""Notification fan-out off the request path.
+
+Views describe *what happened* with ``notify(event, recipients, **context)``;
+a local worker thread renders the event's message template once and writes
+one ``Notification`` per recipient with ``bulk_create`` in batches of
+``NOTIFICATION_BATCH_SIZE``. Recipients may be a list of users or user ids,
+or a User queryset that the worker streams, so a request enqueuing an
+announcement to every patient costs the same as one to a single patient.
+
+Events are handed to the worker when the surrounding transaction commits.
+With ``NOTIFICATION_DISPATCH_SYNC = True`` they are delivered in-process on
+commit instead, which management commands and scripts can rely on.
+
+Events with a subject coalesce: a new notification whose user, type and
+subject match an unread one from the last ``NOTIFICATION_COALESCE_MINUTES``
+updates that row (latest title and message, ``count`` incremented) instead
+of adding another. Concurrent writers may still race to create two rows;
+merging is best-effort. Types listed in ``NOTIFICATION_DIGEST_TYPES`` are
+held as ``PendingDigestItem`` rows for ``notifications.digest`` instead.
+"""
+import atexit
+import logging
+import queue
+import threading
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import QuerySet
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from . import counters
+from .models import Notification, PendingDigestItem
+from .signals import publish_created
+
+logger = logging.getLogger(__name__)
+
+# event -> (notification_type, title, subject); a None title is taken from
+# the context, the subject is formatted with it and a None subject never merges
+EVENTS = {
+    'appointment_requested': ('appointment_created', 'New Appointment Request', 'appointment_requests'),
+    'appointment_confirmed': ('appointment_confirmed', 'Appointment Confirmed', 'appointment:{appointment.pk}'),
+    'appointment_cancelled': ('appointment_cancelled', 'Appointment Cancelled', 'appointment:{appointment.pk}'),
+    'appointment_reminder': ('appointment_reminder', 'Appointment Reminder', 'appointment:{appointment.pk}'),
+    'announcement': ('general', None, None),
+    'digest': ('general', 'Your Notification Digest', None),
+}
+
+TEMPLATE = 'notifications/messages/{event}.txt'
+
+
+def batch_size():
+    return getattr(settings, 'NOTIFICATION_BATCH_SIZE', 500)
+
+
+def _recipient_ids(recipients):
+    if isinstance(recipients, QuerySet):
+        return recipients.values_list('pk', flat=True).iterator(chunk_size=batch_size())
+    return (getattr(recipient, 'pk', recipient) for recipient in recipients)
+
+
+def _batches(items, size):
+    items = iter(items)
+    while batch := list(islice(items, size)):
+        yield batch
+
+
+def coalesce_window():
+    return getattr(settings, 'NOTIFICATION_COALESCE_MINUTES', 30)
+
+
+def digest_types():
+    return set(getattr(settings, 'NOTIFICATION_DIGEST_TYPES', ()))
+
+
+def render_event(event, context):
+    """The Notification fields, other than the user, for an event"""
+    notification_type, title, subject = EVENTS[event]
+    return {
+        'notification_type': notification_type,
+        'title': title or context['title'],
+        'message': render_to_string(TEMPLATE.format(event=event), context).strip(),
+        'subject': subject.format(**context) if subject else '',
+    }
+
+
+def _hold_for_digest(notifications):
+    """Store digest-type notifications as pending items; returns the rest"""
+    held_types = digest_types()
+    held = [notification for notification in notifications if notification.notification_type in held_types]
+    if held:
+        PendingDigestItem.objects.bulk_create([
+            PendingDigestItem(
+                user_id=notification.user_id, notification_type=notification.notification_type,
+                title=notification.title, message=notification.message,
+            )
+            for notification in held
+        ])
+    return [notification for notification in notifications if notification.notification_type not in held_types]
+
+
+def _merge_targets(notifications, since):
+    """Unread rows created from ``since`` on that these notifications could merge into, oldest first"""
+    return Notification.objects.filter(
+        user_id__in={notification.user_id for notification in notifications},
+        notification_type__in={notification.notification_type for notification in notifications},
+        subject__in={notification.subject for notification in notifications},
+        is_read=False,
+        created_at__gte=since,
+    ).order_by('created_at')
+
+
+def _coalesce(notifications):
+    """Merge notifications into matching unread rows; returns the ones still to create"""
+    mergeable = [notification for notification in notifications if notification.subject]
+    if not mergeable or not coalesce_window():
+        return notifications
+
+    now = timezone.now()
+    latest = {}
+    for row in _merge_targets(mergeable, now - timedelta(minutes=coalesce_window())):
+        latest[row.user_id, row.notification_type, row.subject] = row
+
+    fresh, merged = [], {}
+    for notification in notifications:
+        key = (notification.user_id, notification.notification_type, notification.subject)
+        row = latest.get(key) if notification.subject else None
+        if row is None:
+            fresh.append(notification)
+            if notification.subject:
+                # Later events in this batch fold into the new row
+                latest[key] = notification
+            continue
+        row.title, row.message = notification.title, notification.message
+        row.count += notification.count
+        row.created_at = now
+        if row.pk:
+            merged[row.pk] = row
+
+    Notification.objects.bulk_update(merged.values(), ['title', 'message', 'count', 'created_at'])
+    for row in merged.values():
+        publish_created(row)
+    return fresh
+
+
+def write(notifications, hold=True):
+    """Store prepared notifications, merging or holding them for digests; returns how many were given"""
+    fresh = _coalesce(_hold_for_digest(notifications) if hold else notifications)
+    Notification.objects.bulk_create(fresh)
+    # bulk_create skips signals, so keep the unread badges and open pages in step here
+    for notification in fresh:
+        counters.adjust(counters.NOTIFICATIONS, notification.user_id, 1)
+        publish_created(notification)
+    return len(notifications)
+
+
+def deliver(event, recipients, context):
+    """Write the event's notifications now; returns how many were sent"""
+    fields = render_event(event, context)
+    sent = 0
+    for user_ids in _batches(_recipient_ids(recipients), batch_size()):
+        sent += write([Notification(user_id=user_id, **fields) for user_id in user_ids])
+    return sent
+
+
+class NotificationWorker:
+    """Single background thread draining a queue of notification events"""
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, event, recipients, context):
+        self._ensure_started()
+        self.queue.put((event, recipients, context))
+
+    def flush(self):
+        """Block until every queued event has been delivered"""
+        if self._thread is not None:
+            self.queue.join()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='notification-worker', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            event, recipients, context = self.queue.get()
+            try:
+                deliver(event, recipients, context)
+            except Exception:
+                logger.exception('Delivering %r notifications failed', event)
+            finally:
+                close_old_connections()
+                self.queue.task_done()
+
+
+worker = NotificationWorker()
+# Let queued events finish before the process exits
+atexit.register(worker.flush)
+
+
+def notify(event, recipients, **context):
+    """Queue an event for delivery once the current transaction commits"""
+    if event not in EVENTS:
+        raise ValueError(f'Unknown notification event: {event}')
+    if getattr(settings, 'NOTIFICATION_DISPATCH_SYNC', False):
+        transaction.on_commit(lambda: deliver(event, recipients, context))
+    else:
+        transaction.on_commit(lambda: worker.submit(event, recipients, context))
+
+
+def flush():
+    worker.flush()
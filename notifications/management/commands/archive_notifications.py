@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from notifications import retention
+
+
+class Command(BaseCommand):
+    help = 'Move read notifications past the retention period into the archive table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Archive read notifications older than this many days')
+        parser.add_argument('--batch-size', type=int, help='Rows moved per transaction')
+
+    def handle(self, *args, **options):
+        archived = retention.archive_read_notifications(days=options['days'], size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Archived {archived} notification(s).'))
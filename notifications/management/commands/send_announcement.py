@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from accounts.models import User
+from notifications import dispatch
+
+
+class Command(BaseCommand):
+    help = 'Send a general notification to every active user, or every active user with a role'
+
+    def add_arguments(self, parser):
+        parser.add_argument('title')
+        parser.add_argument('message')
+        parser.add_argument('--role', choices=[role for role, _label in User.ROLE_CHOICES],
+                            help='Only notify users with this role')
+
+    def handle(self, *args, **options):
+        recipients = User.objects.filter(is_active=True)
+        if options['role']:
+            recipients = recipients.filter(role=options['role'])
+
+        created = dispatch.deliver('announcement', recipients, {
+            'title': options['title'],
+            'message': options['message'],
+        })
+        self.stdout.write(self.style.SUCCESS(f'Sent {created} notification(s).'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from notifications import digest
+
+
+class Command(BaseCommand):
+    help = 'Send each user one notification summarising their pending digest items'
+
+    def handle(self, *args, **options):
+        sent = digest.send_digests()
+        self.stdout.write(self.style.SUCCESS(f'Sent {sent} digest(s).'))
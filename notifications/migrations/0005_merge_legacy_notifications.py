@@ -0,0 +1,30 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0014_appointment_reminders'),
+        ('notifications', '0004_notification_coalescing'),
+    ]
+
+    def merge_legacy_notifications(apps, schema_editor):
+        # Copy appointments.Notification rows across in one statement, keeping
+        # their timestamps (bulk_create would reset the auto_now_add field).
+        # Cached unread badges catch up when their cache entries expire.
+        Legacy = apps.get_model('appointments', 'Notification')
+        Notification = apps.get_model('notifications', 'Notification')
+        quote = schema_editor.quote_name
+        columns = ', '.join(quote(column) for column in (
+            'user_id', 'notification_type', 'title', 'message', 'subject', 'count', 'is_read', 'created_at',
+        ))
+        copied = ', '.join(quote(column) for column in ('title', 'message'))
+        schema_editor.execute(
+            f"INSERT INTO {quote(Notification._meta.db_table)} ({columns}) "
+            f"SELECT {quote('user_id')}, 'general', {copied}, '', 1, {quote('is_read')}, {quote('created_at')} "
+            f"FROM {quote(Legacy._meta.db_table)}"
+        )
+
+    operations = [
+        migrations.RunPython(merge_legacy_notifications, migrations.RunPython.noop),
+    ]
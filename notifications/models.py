@@ -22,8 +22,13 @@ class Notification(models.Model):
     title = models.CharField(max_length=200)
     message = models.TextField()
     
+    # Unread notifications of the same type and subject are merged (see notifications.dispatch)
+    subject = models.CharField(max_length=100, blank=True, default='')
+    count = models.PositiveIntegerField(default=1, help_text="Events merged into this notification")
+    
     is_read = models.BooleanField(default=False)
     
+    # Time of the latest merged event
     created_at = models.DateTimeField(auto_now_add=True)
     read_at = models.DateTimeField(blank=True, null=True)
     
@@ -31,6 +36,14 @@ class Notification(models.Model):
         verbose_name = 'Notification'
         verbose_name_plural = 'Notifications'
         ordering = ['-created_at']
+        indexes = [
+            # Notification list
+            models.Index(fields=['user', '-created_at'], name='notif_user_created_idx'),
+            # Unread badge and recent dropdown; partial, so it only holds unread rows
+            models.Index(fields=['user', '-created_at'], condition=models.Q(is_read=False), name='notif_user_unread_idx'),
+            # Retention sweep; partial, so it only holds rows that may be archived
+            models.Index(fields=['created_at'], condition=models.Q(is_read=True), name='notif_read_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.email} - {self.title}"
@@ -41,4 +54,54 @@ class Notification(models.Model):
         if not self.is_read:
             self.is_read = True
             self.read_at = timezone.now()
-            self.save()
\ No newline at end of file
+            self.save()
+
+
+class ArchivedNotification(models.Model):
+    """Read notification moved out of the hot table by notifications.retention"""
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='archived_notifications'
+    )
+
+    notification_type = models.CharField(max_length=30, choices=Notification.NOTIFICATION_TYPES, default='general')
+    title = models.CharField(max_length=200)
+    message = models.TextField()
+
+    created_at = models.DateTimeField()
+    read_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        verbose_name = 'Archived Notification'
+        verbose_name_plural = 'Archived Notifications'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='notif_archive_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.email} - {self.title}"
+
+
+class PendingDigestItem(models.Model):
+    """Notification held back for the user's next digest (NOTIFICATION_DIGEST_TYPES)"""
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='pending_digest_items'
+    )
+
+    notification_type = models.CharField(max_length=30, choices=Notification.NOTIFICATION_TYPES, default='general')
+    title = models.CharField(max_length=200)
+    message = models.TextField()
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f"{self.user.email} - {self.title}"
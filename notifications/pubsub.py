@@ -0,0 +1,141 @@
+"""Live events for open pages, published to topics.
+
+Each user has a topic (``user_topic()``): saves publish small events to it
+once their transaction commits: ``notification`` for a new notification,
+``message`` for a new appointment message and ``unread`` whenever an
+unread counter changes. The server-sent events view
+``notifications.views.notification_stream`` relays them to the user's open
+pages, so badges update without reloading. Appointment chat sockets
+(``appointments.chat``) share a topic per appointment the same way.
+
+Both need an ASGI server, so pages only open them when
+``NOTIFICATION_LIVE_EVENTS`` is on (``live_events_enabled()``).
+
+``NOTIFICATION_BROKER`` picks the backend by dotted path:
+
+* ``LocalBroker`` (the default) delivers within this process, which is
+  enough when the site runs as a single ASGI worker.
+* ``RedisBroker`` relays through Redis pub/sub so subscribers on every
+  worker see every event. It needs the ``redis`` package and
+  ``NOTIFICATION_BROKER_URL``.
+
+Any class with a ``publish(topic, event, data)`` method and a
+``subscribe(topic)`` async context manager yielding an ``asyncio.Queue``
+of ``(event, data)`` pairs can be used instead.
+"""
+import asyncio
+import json
+import logging
+import threading
+from contextlib import asynccontextmanager
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATION = 'notification'
+MESSAGE = 'message'
+UNREAD = 'unread'
+
+
+def live_events_enabled():
+    return getattr(settings, 'NOTIFICATION_LIVE_EVENTS', False)
+
+
+def user_topic(user_id):
+    return f'user:{user_id}'
+
+
+class LocalBroker:
+    """Delivers events to subscribers in this process"""
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def publish(self, topic, event, data):
+        with self._lock:
+            subscribers = list(self._subscribers.get(topic, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, (event, data))
+            except RuntimeError:
+                # The subscriber's event loop has already closed
+                pass
+
+    @asynccontextmanager
+    async def subscribe(self, topic):
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._subscribers.setdefault(topic, set()).add(subscriber)
+        try:
+            yield subscriber[1]
+        finally:
+            with self._lock:
+                subscribers = self._subscribers.get(topic, set())
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    self._subscribers.pop(topic, None)
+
+
+class RedisBroker:
+    """Relays events through Redis pub/sub, one channel per topic"""
+
+    CHANNEL = 'medlynk:{topic}'
+
+    def __init__(self):
+        import redis
+        self.url = settings.NOTIFICATION_BROKER_URL
+        self._client = redis.Redis.from_url(self.url)
+
+    def publish(self, topic, event, data):
+        self._client.publish(self.CHANNEL.format(topic=topic), json.dumps([event, data]))
+
+    @asynccontextmanager
+    async def subscribe(self, topic):
+        from redis import asyncio as aioredis
+
+        client = aioredis.Redis.from_url(self.url)
+        channel = client.pubsub(ignore_subscribe_messages=True)
+        await channel.subscribe(self.CHANNEL.format(topic=topic))
+        queue = asyncio.Queue()
+
+        async def relay():
+            async for message in channel.listen():
+                queue.put_nowait(tuple(json.loads(message['data'])))
+
+        task = asyncio.create_task(relay())
+        try:
+            yield queue
+        finally:
+            task.cancel()
+            await channel.aclose()
+            await client.aclose()
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            path = getattr(settings, 'NOTIFICATION_BROKER', 'notifications.pubsub.LocalBroker')
+            _broker = import_string(path)()
+        return _broker
+
+
+def send(topic, event, data=None):
+    """Publish an event now; a broker failure never breaks the caller"""
+    try:
+        get_broker().publish(topic, event, data or {})
+    except Exception:
+        logger.exception('Publishing %r to %s failed', event, topic)
+
+
+def publish(topic, event, data=None):
+    """Publish an event once the current transaction commits"""
+    transaction.on_commit(lambda: send(topic, event, data))
@@ -0,0 +1,57 @@
+"""Retention for the notification table.
+
+Read notifications older than ``NOTIFICATION_RETENTION_DAYS`` are moved to
+``ArchivedNotification``, so the hot table behind the badges, dropdown and
+list only grows with recent activity. Each batch of
+``NOTIFICATION_ARCHIVE_BATCH_SIZE`` rows is copied and deleted in its own
+short transaction, found through the partial ``notif_read_created_idx``
+index, so the sweep never holds SQLite's write lock for long and can be
+interrupted and rerun at any point.
+
+Only read rows are moved, so the unread counters are unaffected.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ArchivedNotification, Notification
+
+ARCHIVED_FIELDS = ('user_id', 'notification_type', 'title', 'message', 'created_at', 'read_at')
+
+
+def retention_days():
+    return getattr(settings, 'NOTIFICATION_RETENTION_DAYS', 90)
+
+
+def batch_size():
+    return getattr(settings, 'NOTIFICATION_ARCHIVE_BATCH_SIZE', 200)
+
+
+def archivable(cutoff):
+    return Notification.objects.filter(is_read=True, created_at__lt=cutoff).order_by('created_at')
+
+
+def archive_batch(cutoff, size):
+    """Move one batch of read notifications created before ``cutoff``; returns the count"""
+    with transaction.atomic():
+        batch = list(archivable(cutoff).only(*ARCHIVED_FIELDS)[:size])
+        if not batch:
+            return 0
+        ArchivedNotification.objects.bulk_create([
+            ArchivedNotification(**{field: getattr(notification, field) for field in ARCHIVED_FIELDS})
+            for notification in batch
+        ])
+        Notification.objects.filter(pk__in=[notification.pk for notification in batch]).delete()
+    return len(batch)
+
+
+def archive_read_notifications(days=None, size=None, now=None):
+    """Archive every read notification older than ``days``; returns the count"""
+    cutoff = (now or timezone.now()) - timedelta(days=retention_days() if days is None else days)
+    size = size or batch_size()
+    archived = 0
+    while moved := archive_batch(cutoff, size):
+        archived += moved
+    return archived
@@ -0,0 +1,89 @@
+"""The one way other apps create, read and mark notifications.
+
+Views, commands and other apps call these helpers instead of touching
+``Notification``, ``dispatch`` or ``counters`` directly, so every write
+goes through the dispatch pipeline (coalescing, digests, live events) and
+every bulk change keeps the cached unread counters in step. The unread
+message badge is kept here too.
+"""
+from django.utils import timezone
+
+from . import counters, dispatch
+from .dispatch import notify  # noqa: F401
+from .models import ArchivedNotification, Notification
+
+# notification_list filter -> queryset filter
+FILTERS = {
+    'unread': {'is_read': False},
+    'appointments': {'notification_type__startswith': 'appointment_'},
+    'updates': {'notification_type__in': ['appointment_confirmed', 'appointment_cancelled']},
+    'reminders': {'notification_type': 'appointment_reminder'},
+}
+
+
+def create(user, title, message, notification_type='general', subject=''):
+    """Write one notification now, outside the event templates"""
+    notification = Notification(
+        user_id=getattr(user, 'pk', user), notification_type=notification_type,
+        title=title, message=message, subject=subject,
+    )
+    dispatch.write([notification])
+    return notification
+
+
+def render(user, event, **context):
+    """An unsaved notification for a dispatch event, to pass to ``create_many()``"""
+    return Notification(user_id=getattr(user, 'pk', user), **dispatch.render_event(event, context))
+
+
+def create_many(notifications):
+    """Write prepared notifications in one batch; returns how many were given"""
+    return dispatch.write(notifications)
+
+
+def batch_size():
+    """Rows per batch for callers preparing many notifications"""
+    return dispatch.batch_size()
+
+
+def for_user(user, filter_type='all'):
+    """A user's notifications, newest first, narrowed by a notification_list filter name"""
+    return Notification.objects.filter(user=user, **FILTERS.get(filter_type, {})).order_by('-created_at', '-id')
+
+
+def archived_for_user(user):
+    return ArchivedNotification.objects.filter(user=user).order_by('-created_at', '-id')
+
+
+def recent_unread(user, limit=5):
+    """Lazy queryset for the header dropdown"""
+    return Notification.objects.filter(user=user, is_read=False)[:limit]
+
+
+def unread_count(user):
+    return counters.get_unread_count(counters.NOTIFICATIONS, user.pk)
+
+
+def mark_read(notification):
+    notification.mark_as_read()
+
+
+def mark_all_read(user):
+    """Mark all of a user's notifications read; returns how many were unread"""
+    marked = Notification.objects.filter(user=user, is_read=False).update(is_read=True, read_at=timezone.now())
+    # Bulk update skips signals, so adjust the badge counter directly
+    counters.adjust(counters.NOTIFICATIONS, user.pk, -marked)
+    return marked
+
+
+def delete(notification):
+    notification.delete()
+
+
+def unread_message_count(user):
+    return counters.get_unread_count(counters.MESSAGES, user.pk)
+
+
+def adjust_unread_messages(user, delta):
+    """Shift a user's unread message badge after a bulk update that skipped signals"""
+    counters.adjust(counters.MESSAGES, getattr(user, 'pk', user), delta)
@@ -0,0 +1,87 @@
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from appointments.models import AppointmentMessage
+from . import counters, pubsub
+from .models import Notification
+
+# Which user's counter each model feeds
+OWNERS = {
+    Notification: ('user_id', counters.NOTIFICATIONS),
+    AppointmentMessage: ('recipient_id', counters.MESSAGES),
+}
+
+
+def _unread_owner(instance, loaded):
+    """The user whose unread count includes this row, or None"""
+    owner_field, _kind = OWNERS[type(instance)]
+    if loaded.get('is_read') is False:
+        return loaded.get(owner_field)
+    return None
+
+
+@receiver(post_init, sender=Notification)
+@receiver(post_init, sender=AppointmentMessage)
+def remember_unread_owner(sender, instance, **kwargs):
+    loaded = instance.__dict__
+    owner_field, _kind = OWNERS[sender]
+    if instance.pk and ('is_read' not in loaded or owner_field not in loaded):
+        # Loaded with only()/defer(): changes cannot be diffed
+        instance._unread_owner = False
+    else:
+        instance._unread_owner = _unread_owner(instance, loaded) if instance.pk else None
+
+
+@receiver(post_save, sender=Notification)
+@receiver(post_save, sender=AppointmentMessage)
+def unread_saved(sender, instance, created, **kwargs):
+    owner_field, kind = OWNERS[sender]
+    original = None if created else instance._unread_owner
+    current = _unread_owner(instance, instance.__dict__)
+
+    if original is False:
+        counters.invalidate(kind, getattr(instance, owner_field))
+    elif original != current:
+        if original:
+            counters.adjust(kind, original, -1)
+        if current:
+            counters.adjust(kind, current, 1)
+    instance._unread_owner = current
+
+    if created:
+        publish_created(instance)
+
+
+def publish_created(instance):
+    """Tell the owner's open pages about a new notification or message"""
+    if isinstance(instance, Notification):
+        pubsub.publish(pubsub.user_topic(instance.user_id), pubsub.NOTIFICATION, {
+            'id': instance.pk,
+            'type': instance.notification_type,
+            'title': instance.title,
+            'message': instance.message,
+        })
+    else:
+        pubsub.publish(pubsub.user_topic(instance.recipient_id), pubsub.MESSAGE, {
+            'id': instance.pk,
+            'appointment': instance.appointment_id,
+            'sender': instance.sender_id,
+        })
+
+
+@receiver(pre_delete, sender=Notification)
+@receiver(pre_delete, sender=AppointmentMessage)
+def load_unread_owner(sender, instance, **kwargs):
+    if instance._unread_owner is False:
+        # Deferred fields can only be loaded while the row still exists
+        owner_field, _kind = OWNERS[sender]
+        instance.refresh_from_db(fields=[owner_field, 'is_read'])
+        instance._unread_owner = _unread_owner(instance, instance.__dict__)
+
+
+@receiver(post_delete, sender=Notification)
+@receiver(post_delete, sender=AppointmentMessage)
+def unread_deleted(sender, instance, **kwargs):
+    _owner_field, kind = OWNERS[sender]
+    if instance._unread_owner:
+        counters.adjust(kind, instance._unread_owner, -1)
@@ -1,3 +1,194 @@
-from django.test import TestCase
+import asyncio
+import base64
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from accounts.models import User
+from medicalapp.testing import QueryPlanMixin
+from . import counters, digest, dispatch, pubsub, retention, services
+from .models import ArchivedNotification, Notification, PendingDigestItem
+
+
+class NotificationViewTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='patient@example.com', first_name='Pat', last_name='Smith', role='patient'
+        )
+        self.client.force_login(self.user)
+        self.notification = services.create(self.user, 'Title', 'Message')
+
+    def test_list_leaves_notifications_unread(self):
+        response = self.client.get('/notifications/?filter=unread')
+        self.assertContains(response, 'Message')
+        self.assertEqual(services.for_user(self.user, 'unread').count(), 1)
+
+    def test_mark_all_as_read_sets_read_at(self):
+        self.client.get('/notifications/mark-all-read/')
+        self.notification.refresh_from_db()
+        self.assertTrue(self.notification.is_read)
+        self.assertIsNotNone(self.notification.read_at)
+
+    def test_null_cursor_falls_back_to_first_page(self):
+        cursor = base64.urlsafe_b64encode(b'["n",[null,null]]').decode().rstrip('=')
+        response = self.client.get('/notifications/', {'cursor': cursor})
+        self.assertContains(response, 'Message')
+
+
+class RetentionTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='patient@example.com', first_name='Pat', last_name='Smith', role='patient'
+        )
+
+    def notification(self, age, is_read):
+        notification = Notification.objects.create(user=self.user, title='Title', message='Message', is_read=is_read)
+        Notification.objects.filter(pk=notification.pk).update(created_at=timezone.now() - timedelta(days=age))
+        return notification
+
+    def test_only_old_read_notifications_are_archived(self):
+        old = [self.notification(100, is_read=True) for _ in range(5)]
+        kept = [self.notification(100, is_read=False), self.notification(10, is_read=True)]
+
+        self.assertEqual(retention.archive_read_notifications(days=90, size=2), 5)
+        self.assertQuerySetEqual(Notification.objects.order_by('pk'), [n.pk for n in kept], transform=lambda n: n.pk)
+        self.assertEqual(ArchivedNotification.objects.filter(user=self.user).count(), len(old))
+        # Rerunning finds nothing left to move
+        self.assertEqual(retention.archive_read_notifications(days=90), 0)
+
+
+@override_settings(NOTIFICATION_COALESCE_MINUTES=30, NOTIFICATION_DIGEST_TYPES=[])
+class CoalescingTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='patient@example.com', first_name='Pat', last_name='Smith', role='patient'
+        )
+
+    def announce(self, subject, message, notification_type='appointment_confirmed'):
+        return dispatch.write([Notification(
+            user=self.user, notification_type=notification_type, title='Title', message=message, subject=subject,
+        )])
+
+    def test_same_subject_merges_into_latest_message(self):
+        self.announce('appointment:1', 'first')
+        self.announce('appointment:1', 'second')
+        notification = Notification.objects.get()
+        self.assertEqual((notification.count, notification.message), (2, 'second'))
+
+    def test_batch_duplicates_merge(self):
+        dispatch.write([
+            Notification(user=self.user, notification_type='appointment_created', title='Title', message=str(i),
+                         subject='appointment_requests')
+            for i in range(5)
+        ])
+        notification = Notification.objects.get()
+        self.assertEqual((notification.count, notification.message), (5, '4'))
+
+    def test_distinct_subjects_read_rows_and_old_rows_stay_separate(self):
+        self.announce('appointment:1', 'first')
+        self.announce('appointment:2', 'other appointment')
+        self.announce('appointment:1', 'cancelled', notification_type='appointment_cancelled')
+        self.announce('', 'no subject')
+        self.announce('', 'no subject')
+        Notification.objects.update(is_read=True)
+        self.announce('appointment:1', 'after reading')
+        Notification.objects.filter(message='after reading').update(created_at=timezone.now() - timedelta(hours=1))
+        self.announce('appointment:1', 'much later')
+        self.assertEqual(Notification.objects.count(), 7)
+
+    @override_settings(NOTIFICATION_DIGEST_TYPES=['appointment_confirmed'])
+    def test_digest_types_are_held_for_the_digest(self):
+        self.announce('appointment:1', 'first')
+        self.announce('appointment:2', 'second')
+        self.assertFalse(Notification.objects.exists())
+
+        self.assertEqual(digest.send_digests(), 1)
+        notification = Notification.objects.get()
+        self.assertEqual(notification.title, 'Your Notification Digest')
+        self.assertIn('second', notification.message)
+        self.assertFalse(PendingDigestItem.objects.exists())
+
+
+class LiveEventTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='patient@example.com', first_name='Pat', last_name='Smith', role='patient'
+        )
+        self.broker = pubsub.LocalBroker()
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def received(self, queue):
+        events = []
+        while not queue.empty():
+            events.append(queue.get_nowait())
+        return events
+
+    def test_committed_notification_reaches_subscriber(self):
+        subscription = self.broker.subscribe(pubsub.user_topic(self.user.pk))
+        queue = self.loop.run_until_complete(subscription.__aenter__())
+        with mock.patch('notifications.pubsub.get_broker', return_value=self.broker):
+            with self.captureOnCommitCallbacks(execute=True):
+                notification = Notification.objects.create(user=self.user, title='Title', message='Message')
+            self.loop.run_until_complete(asyncio.sleep(0))
+
+        events = self.received(queue)
+        self.assertIn((pubsub.UNREAD, {'kind': 'notifications'}), events)
+        self.assertIn((pubsub.NOTIFICATION, {
+            'id': notification.pk, 'type': 'general', 'title': 'Title', 'message': 'Message',
+        }), events)
+
+        self.loop.run_until_complete(subscription.__aexit__(None, None, None))
+        self.assertEqual(self.broker._subscribers, {})
+
+    def test_stream_requires_login(self):
+        response = self.client.get('/notifications/stream/')
+        self.assertEqual(response.status_code, 302)
+
+    def test_stream_is_refused_outside_asgi(self):
+        self.client.force_login(self.user)
+        with self.settings(NOTIFICATION_LIVE_EVENTS=True):
+            self.assertEqual(self.client.get('/notifications/stream/').status_code, 204)
+        # Pages only open the stream when live events are on
+        self.assertNotContains(self.client.get('/notifications/'), 'EventSource')
+
+
+class QueryPlanTests(QueryPlanMixin, TestCase):
+    """The notification badge, dropdown and list stay on their indexes
+
+    Each test runs the function the view or writer takes its queryset from.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='patient@example.com', first_name='Pat', last_name='Smith', role='patient'
+        )
+
+    def test_unread_badge_and_dropdown(self):
+        self.assertUsesIndex(services.recent_unread(self.user), 'notif_user_unread_idx')
+        self.assertUsesIndex(
+            counters.unread(counters.NOTIFICATIONS, self.user.pk).order_by(), 'notif_user_unread_idx'
+        )
+
+    def test_notification_list(self):
+        for filter_type in ('all', 'appointments', 'updates', 'reminders'):
+            self.assertUsesIndex(services.for_user(self.user, filter_type)[:21], 'notif_user_created_idx')
+        self.assertUsesIndex(services.for_user(self.user, 'unread')[:21], 'notif_user_unread_idx')
+
+    def test_retention_sweep(self):
+        self.assertUsesIndex(retention.archivable(timezone.now())[:200], 'notif_read_created_idx')
+
+    def test_archive_list(self):
+        self.assertUsesIndex(services.archived_for_user(self.user)[:21], 'notif_archive_user_idx')
+
+    def test_coalescing_lookup(self):
+        pending = [Notification(
+            user=self.user, notification_type='appointment_confirmed', subject='appointment:1',
+        )]
+        self.assertUsesIndex(dispatch._merge_targets(pending, timezone.now()), 'notif_user_unread_idx')
@@ -4,6 +4,10 @@ from . import views
 urlpatterns = [
     # Notification list
     path('', views.notification_list, name='notification_list'),
+    path('archive/', views.notification_archive, name='notification_archive'),
+
+    # Live badge and notification events
+    path('stream/', views.notification_stream, name='notification_stream'),
     
     # Mark notifications as read
     path('<int:pk>/read/', views.mark_as_read, name='mark_notification_read'),
@@ -1,39 +1,49 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+from . import counters, pubsub, retention, services
 from .models import Notification
+from medicalapp.pagination import paginate_keyset
 
 @login_required
 def notification_list(request):
     """List all notifications for the current user"""
-    notifications = Notification.objects.filter(user=request.user).order_by('-created_at')
-
-    # Get filter parameter
     filter_type = request.GET.get('filter', 'all')
+    notifications = services.for_user(request.user, filter_type)
 
-    # Apply filtering based on type
-    if filter_type == 'unread':
-        notifications = notifications.filter(is_read=False)
-    elif filter_type == 'appointments':
-        notifications = notifications.filter(notification_type__startswith='appointment_')
-    elif filter_type == 'updates':
-        notifications = notifications.filter(notification_type__in=['appointment_confirmed', 'appointment_cancelled'])
-    elif filter_type == 'reminders':
-        notifications = notifications.filter(notification_type='appointment_reminder')
-    # 'all' shows everything (no additional filter)
-
+    page = paginate_keyset(request, notifications)
     context = {
-        'notifications': notifications,
+        'notifications': page,
+        'page_obj': page,
         'current_filter': filter_type,
         'title': 'Notifications'
     }
     return render(request, 'pages/notifications/notification_list.html', context)
 
+@login_required
+def notification_archive(request):
+    """View the logged-in user's archived notifications"""
+    page = paginate_keyset(request, services.archived_for_user(request.user))
+
+    context = {
+        'notifications': page,
+        'page_obj': page,
+        'retention_days': retention.retention_days(),
+        'title': 'Notification Archive'
+    }
+    return render(request, 'pages/notifications/notification_archive.html', context)
+
 @login_required
 def mark_as_read(request, pk):
     """Mark a single notification as read"""
     notification = get_object_or_404(Notification, pk=pk, user=request.user)
-    notification.mark_as_read()
+    services.mark_read(notification)
     
     messages.success(request, 'Notification marked as read.')
     return redirect('notification_list')
@@ -41,10 +51,7 @@ def mark_as_read(request, pk):
 @login_required
 def mark_all_as_read(request):
     """Mark all notifications as read for the current user"""
-    from django.utils import timezone
-    
-    notifications = Notification.objects.filter(user=request.user, is_read=False)
-    notifications.update(is_read=True, read_at=timezone.now())
+    services.mark_all_read(request.user)
     
     messages.success(request, 'All notifications marked as read.')
     return redirect('notification_list')
@@ -53,7 +60,53 @@ def mark_all_as_read(request):
 def delete_notification(request, pk):
     """Delete a notification"""
     notification = get_object_or_404(Notification, pk=pk, user=request.user)
-    notification.delete()
+    services.delete(notification)
     
     messages.success(request, 'Notification deleted.')
-    return redirect('notification_list')
\ No newline at end of file
+    return redirect('notification_list')
+
+
+# Seconds between keep-alive comments on an idle event stream
+STREAM_HEARTBEAT = 25
+
+
+def _sse(event, data):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+def _unread_counts(user_id):
+    return {
+        'notifications': counters.get_unread_count(counters.NOTIFICATIONS, user_id),
+        'messages': counters.get_unread_count(counters.MESSAGES, user_id),
+    }
+
+
+@login_required
+async def notification_stream(request):
+    """Server-sent events with the user's new notifications, messages and badge counts"""
+    if not pubsub.live_events_enabled() or not isinstance(request, ASGIRequest):
+        # An endless response would hold a WSGI worker forever; 204 tells
+        # EventSource not to reconnect
+        return HttpResponse(status=204)
+    user = await request.auser()
+    unread_counts = sync_to_async(_unread_counts)
+
+    async def events():
+        async with pubsub.get_broker().subscribe(pubsub.user_topic(user.pk)) as queue:
+            yield 'retry: 5000\n\n'
+            yield _sse(pubsub.UNREAD, await unread_counts(user.pk))
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), STREAM_HEARTBEAT)
+                except TimeoutError:
+                    yield ': keep-alive\n\n'
+                    continue
+                if event == pubsub.UNREAD:
+                    data = await unread_counts(user.pk)
+                yield _sse(event, data)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response